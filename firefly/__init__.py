@@ -1,2 +1,3 @@
-from .segment import FlightSegment
+from .segment import FlightSegment, set_memory_budget, memory_usage
 from .collection import FFlyRepo, FlightCollection
+from .aio import AsyncFlightSegment
@@ -0,0 +1,257 @@
+from abc import ABC, abstractmethod
+import numpy as np
+from .segment import FlightSegment
+
+# Summary attribute name parts different from the aircraft INS field name...
+_summary_names = {'latitude': 'lat', 'longitude': 'lon', 'g-force': 'gforce'}
+
+
+class Reducer(ABC):
+    """Base class of vectorized reducers for map-reduce over flights.
+
+    A reducer turns the values a map function returns for one flight into a
+    small partial result, combines partial results of different flights, and
+    converts the combined partial result into the final answer. Partial
+    results are computed where the flight data were read (a worker thread or
+    process) so only they are sent back. Subclasses must implement
+    :meth:`partial` and :meth:`combine`.
+    """
+
+    @abstractmethod
+    def partial(self, values):
+        """Reduce one flight's values (array-like) into a partial result."""
+
+    @abstractmethod
+    def combine(self, a, b):
+        """Combine two partial results."""
+
+    def result(self, state):
+        """Final result from the combined partial result."""
+        return state
+
+    def summary(self, column, attrs):
+        """Partial result from flight's root summary attributes.
+
+        Parameters
+        ----------
+        column : str
+            Aircraft INS field name the values come from.
+        attrs : dict
+            Flight's root attributes.
+
+        Returns
+        -------
+        Partial result, or ``None`` when the attributes cannot answer.
+        """
+        return None
+
+
+class Count(Reducer):
+    """Number of values."""
+
+    def partial(self, values):
+        return int(np.size(values))
+
+    def combine(self, a, b):
+        return a + b
+
+
+class Sum(Reducer):
+    """Sum of values."""
+
+    def partial(self, values):
+        return np.sum(values)
+
+    def combine(self, a, b):
+        return a + b
+
+
+class Min(Reducer):
+    """Minimal value. Answered from ``min_<column>`` summary attributes."""
+
+    _prefix = 'min'
+    _func = staticmethod(np.nanmin)
+
+    def partial(self, values):
+        values = np.asarray(values)
+        return self._func(values) if values.size else None
+
+    def combine(self, a, b):
+        if a is None or b is None:
+            return b if a is None else a
+        return self._func([a, b])
+
+    def summary(self, column, attrs):
+        for name in (column, _summary_names.get(column)):
+            if name and f'{self._prefix}_{name}' in attrs:
+                return attrs[f'{self._prefix}_{name}']
+        return None
+
+
+class Max(Min):
+    """Maximal value. Answered from ``max_<column>`` summary attributes."""
+
+    _prefix = 'max'
+    _func = staticmethod(np.nanmax)
+
+
+class Histogram(Reducer):
+    """Histogram of values in fixed bins.
+
+    Parameters
+    ----------
+    bins : sequence of float
+        Monotonically increasing bin edges, as for ``numpy.histogram``.
+
+    The result is a tuple of bin counts and bin edges.
+    """
+
+    def __init__(self, bins):
+        self.bins = np.asarray(bins, dtype=float)
+        if self.bins.ndim != 1 or self.bins.size < 2:
+            raise ValueError('Histogram needs at least two bin edges')
+
+    def partial(self, values):
+        return np.histogram(values, bins=self.bins)[0]
+
+    def combine(self, a, b):
+        return a + b
+
+    def result(self, state):
+        return state, self.bins
+
+
+class QuantileSketch(Reducer):
+    """Approximate quantiles with a mergeable logarithmic bucket sketch.
+
+    Values are counted in buckets whose width grows with the magnitude of
+    the value (as in DDSketch), so every quantile is within the relative
+    accuracy of the true value regardless of the number of values.
+
+    Parameters
+    ----------
+    quantiles : float or sequence of float
+        Quantiles to compute, between 0 and 1.
+    accuracy : float, optional
+        Relative accuracy of the quantile values. Default is 0.01.
+    """
+
+    def __init__(self, quantiles, accuracy=0.01):
+        if not 0 < accuracy < 1:
+            raise ValueError(f'{accuracy}: Accuracy must be between 0 and 1')
+        self.quantiles = quantiles
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+
+    def partial(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        state = dict()
+        for sign in (1, -1):
+            v = values[sign * values > 0] * sign
+            keys = np.ceil(np.log(v) / np.log(self._gamma)).astype(np.int64)
+            keys, counts = np.unique(keys, return_counts=True)
+            state.update(zip(zip([sign] * keys.size, keys.tolist()),
+                             counts.tolist()))
+        nzero = int(np.count_nonzero(values == 0))
+        if nzero:
+            state[(0, 0)] = nzero
+        return state
+
+    def combine(self, a, b):
+        state = dict(a)
+        for k, n in b.items():
+            state[k] = state.get(k, 0) + n
+        return state
+
+    def result(self, state):
+        # Bucket values in increasing order...
+        keys = sorted(state, key=lambda k: (k[0], k[0] * k[1]))
+        value = np.array([k[0] * 2 * self._gamma ** k[1] / (self._gamma + 1)
+                          for k in keys])
+        rank = np.cumsum([state[k] for k in keys])
+        q = np.asarray(self.quantiles, dtype=float)
+        if rank.size == 0:
+            return np.full(q.shape, np.nan)[()]
+        i = np.searchsorted(rank, q * (rank[-1] - 1), side='right')
+        return value[np.minimum(i, rank.size - 1)][()]
+
+
+class FunctionReducer(Reducer):
+    """Reducer from a plain function combining two map values.
+
+    The function must be associative and commutative because flights are
+    combined in the order they finish.
+    """
+
+    def __init__(self, func):
+        self.func = func
+
+    def partial(self, values):
+        return values
+
+    def combine(self, a, b):
+        return self.func(a, b)
+
+
+class _Keyed(dict):
+    """Partial results per key, from map values returned as a dict."""
+
+
+def partial_result(reducer, values):
+    """Partial result of a map value, per key if the value is a dict."""
+    if isinstance(values, dict):
+        return _Keyed((k, reducer.partial(v)) for k, v in values.items())
+    return reducer.partial(values)
+
+
+def combine_results(reducer, a, b):
+    """Combine two partial results, per key if they are keyed."""
+    if a is None or b is None:
+        return b if a is None else a
+    if isinstance(a, _Keyed) != isinstance(b, _Keyed):
+        raise TypeError('Map function returned a dict for some flights and '
+                        'a value that is not a dict for others')
+    if isinstance(a, _Keyed):
+        state = _Keyed(a)
+        for k, v in b.items():
+            state[k] = reducer.combine(state[k], v) if k in state else v
+        return state
+    return reducer.combine(a, b)
+
+
+def final_result(reducer, state):
+    """Final result of the combined partial result."""
+    if isinstance(state, _Keyed):
+        return {k: reducer.result(v) for k, v in state.items()}
+    return reducer.result(state)
+
+
+def map_flight(domain, map_fn, reducer, cond, kwargs):
+    """Map one flight (or its filtered segments) into a partial result.
+
+    Runs in a worker thread or process. When ``map_fn`` is an aircraft INS
+    field name, no data condition is given, and the flight's summary
+    attributes answer the reducer, the flight's data are not read.
+    """
+    with FlightSegment(domain, mode='r', **kwargs) as flight:
+        if isinstance(map_fn, str) and not cond:
+            state = reducer.summary(map_fn, flight.metadata['global'])
+            if state is not None:
+                return state
+
+        # Filtered segments have their own connections to the domain...
+        segs = flight.filter(cond) if cond else [flight]
+        state = None
+        try:
+            for seg in segs:
+                if isinstance(map_fn, str):
+                    values = seg._flight[map_fn].values
+                else:
+                    values = map_fn(seg)
+                state = combine_results(reducer, state,
+                                        partial_result(reducer, values))
+        finally:
+            if cond:
+                for seg in segs:
+                    seg.close()
+        return state
@@ -0,0 +1,194 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import h5pyd
+from .segment import (FlightSegment, _records_frame, _compact_columns,
+                      _metadata_snapshot)
+
+
+class AsyncFlightSegment:
+    """Asynchronous access to one FIREfly flight.
+
+    Every HSDS request is run in a thread pool so many flights can be read
+    concurrently from one event loop. The number of requests in flight is
+    bounded by a semaphore that can be shared between flights.
+    """
+
+    def __init__(self, domain, mode='r', semaphore=None, executor=None,
+                 **kwargs):
+        """
+        Parameters
+        ----------
+        domain: str
+            HDF Kita domain endopoint.
+        mode: {'a', 'r'}, optional
+            Access mode. Only allowed: read and append. Default is ``'r'``.
+        semaphore: asyncio.Semaphore, optional
+            Bounds the number of concurrent HSDS requests. Default is a
+            semaphore of 8 just for this flight.
+        executor: concurrent.futures.Executor, optional
+            Where to run HSDS requests. Default is the event loop's default
+            executor.
+        kwargs: dict
+            Any other named argument is passed to the ``h5pyd.File`` class.
+        """
+        if mode not in ('a', 'r'):
+            raise ValueError('mode can only be "a" or "r"')
+        self._name = domain
+        self._mode = mode
+        self._sem = semaphore
+        self._executor = executor
+        self._other = kwargs
+        self._domain = None
+        self._meta = None
+        self._flight = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} "{self._name}" '
+                f'(mode "{self._mode}") at 0x{id(self):x}>')
+
+    async def _run(self, func, *args):
+        """Run blocking function in the executor within the request limit."""
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(8)
+        async with self._sem:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def open(self):
+        """Open FIREfly HDF5 file."""
+        if self._domain is None:
+            self._domain = await self._run(
+                lambda: h5pyd.File(self._name, self._mode, **self._other))
+
+    async def close(self):
+        """Close FIREfly HDF5 file."""
+        if self._domain is not None:
+            await self._run(self._domain.close)
+            self._domain = None
+
+    async def metadata(self):
+        """Snapshot of the flight's metadata.
+
+        See :attr:`firefly.FlightSegment.metadata`.
+        """
+        if self._meta is None:
+            await self.open()
+            self._meta = await self._run(_metadata_snapshot, self._domain)
+        return self._meta
+
+    async def attrs(self):
+        """Root group (global) attributes as a dictionary."""
+        return dict((await self.metadata())['global'])
+
+    async def tmats(self):
+        """A dictionary with TMATS attributes. Empty if no attributes."""
+        return dict((await self.metadata())['tmats'])
+
+    async def aircraft_ins(self):
+        """Aircraft INS data.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Aircraft INS data indexed by time.
+        """
+        if self._flight is None:
+            recs = await self.read('/derived/aircraft_ins')
+            self._flight = _records_frame(recs)
+        return self._flight
+
+    async def read(self, loc, **kwargs):
+        """Read all data of one flight data object.
+
+        Parameters
+        ----------
+        loc : str or int
+            Location of the flight data object. If a ``str``, it is treated as
+            an HDF5 path name of a dataset. If an ``int``, it is assumed to be
+            an IRIG106 packet type identifier.
+        kwargs : dict
+            Optional arguments depending on the IRIG106 packet type. See
+            :meth:`firefly.FlightSegment.chapter11_location`.
+
+        Returns
+        -------
+        numpy array
+            Dataset's values.
+        """
+        if isinstance(loc, int):
+            loc = FlightSegment.chapter11_location(loc, **kwargs) + '/data'
+        elif not isinstance(loc, str):
+            raise TypeError(f'{loc}: Unsupported flight data specifier')
+        await self.open()
+        return await self._run(lambda: self._domain[loc][...])
+
+    async def flight_segment(self, compact=False, float32=False):
+        """Synchronous flight segment with this flight's loaded data.
+
+        Parameters
+        ----------
+        compact : bool, optional
+            Keep the segment's aircraft INS data as contiguous NumPy columns.
+            See :class:`firefly.FlightSegment`. Default is ``False``.
+        float32 : bool, optional
+            In compact mode, store floating-point INS columns as ``float32``.
+            Default is ``False``.
+
+        Returns
+        -------
+        firefly.FlightSegment
+            Flight segment with its own connection to the FIREfly HDF5 file
+            that shares this flight's aircraft INS data and metadata.
+        """
+        if compact:
+            recs, meta = await asyncio.gather(
+                self.read('/derived/aircraft_ins'), self.metadata())
+            flight = _compact_columns(recs, float32)
+        else:
+            flight, meta = await asyncio.gather(self.aircraft_ins(),
+                                                self.metadata())
+        return await self._run(
+            lambda: FlightSegment._from_data(self._name, self._mode, flight,
+                                             meta=meta, compact=compact,
+                                             float32=float32, **self._other))
+
+
+async def gather_flights(domains, func, concurrency=16, **kwargs):
+    """Run a coroutine function on many flights concurrently.
+
+    Parameters
+    ----------
+    domains : iterable of str
+        HDF Kita domain endpoints of the flights.
+    func : coroutine function
+        Called with an open :class:`AsyncFlightSegment` for each flight.
+    concurrency : int, optional
+        Maximal number of concurrent HSDS requests. Default is 16.
+    kwargs : dict
+        Any other named argument is passed to the ``h5pyd.File`` class.
+
+    Returns
+    -------
+    list
+        ``func`` results in the same order as ``domains``.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def one(domain):
+        async with AsyncFlightSegment(domain, semaphore=sem, executor=pool,
+                                      **kwargs) as flt:
+            return await func(flt)
+
+    try:
+        return await asyncio.gather(*[one(d) for d in domains])
+    finally:
+        # Waiting for the pool's threads would block the event loop...
+        pool.shutdown(wait=False)
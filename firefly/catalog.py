@@ -0,0 +1,294 @@
+import re
+import json
+import time
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import h5pyd
+from .segment import filter_builder, _root_attributes
+from .collection import _DomainListing
+
+lggr = logging.getLogger(__name__)
+
+# Root attributes with their own indexed catalog columns...
+_text_columns = ('aircraft_type', 'aircraft_id', 'time_coverage_start',
+                 'time_coverage_end', 'takeoff_location', 'landing_location',
+                 'ch10_file', 'date_metadata_modified')
+_real_columns = tuple(f'{m}_{p}' for p in ('altitude', 'latitude', 'longitude',
+                                           'lat', 'lon', 'speed', 'pitch',
+                                           'roll', 'gforce')
+                      for m in ('min', 'max'))
+
+# Tokens of HSDS domain queries...
+_query_token = re.compile(r"""\s*(?:
+    (?P<str>'[^']*'|"[^"]*")
+    | (?P<num>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    | (?P<op>==|!=|<=|>=|<|>|\(|\))
+    | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+
+def _json_value(value):
+    """Convert an HDF5 attribute value into a JSON-compatible value."""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    elif isinstance(value, np.ndarray):
+        return [_json_value(v) for v in value.tolist()]
+    elif isinstance(value, (list, tuple)):
+        return [_json_value(v) for v in value]
+    elif isinstance(value, np.generic):
+        return _json_value(value.item())
+    elif value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def sql_where(query):
+    """Translate an HSDS domain query into an SQL condition on the catalog.
+
+    Parameters
+    ----------
+    query : str
+        Domain query as made by :func:`firefly.segment.filter_builder`, e.g.
+        ``"aircraft_type == 'F-16' AND max_altitude >= 30000.0"``.
+
+    Returns
+    -------
+    tuple
+        SQL condition with ``?`` placeholders and its parameter values, or
+        ``(None, None)`` if the query uses attributes without a catalog
+        column or unsupported syntax.
+    """
+    columns = set(_text_columns + _real_columns)
+    sql = list()
+    params = list()
+    pos = 0
+    query = query.strip()
+    while pos < len(query):
+        m = _query_token.match(query, pos)
+        if not m or m.end() == pos:
+            return None, None
+        pos = m.end()
+        if m.group('str') is not None:
+            sql.append('?')
+            params.append(m.group('str')[1:-1])
+        elif m.group('num') is not None:
+            sql.append('?')
+            params.append(float(m.group('num')))
+        elif m.group('op') is not None:
+            sql.append('=' if m.group('op') == '==' else m.group('op'))
+        elif m.group('name').upper() in ('AND', 'OR', 'NOT'):
+            sql.append(m.group('name').upper())
+        elif m.group('name') in columns:
+            sql.append(f'"{m.group("name")}"')
+        else:
+            return None, None
+    return ' '.join(sql), params
+
+
+class FlightCatalog:
+    """Local SQLite catalog of FIREfly flights' root attributes.
+
+    The catalog mirrors every flight domain's root attributes so flight
+    queries are answered locally with indexes instead of an HSDS domain
+    search. :meth:`sync` brings it up to date, fetching only flights whose
+    ``date_metadata_modified`` changed since the last synchronization.
+    """
+
+    def __init__(self, path, loc, max_age=3600., **kwargs):
+        """
+        Parameters
+        ----------
+        path : str
+            SQLite database file. Created if it does not exist.
+        loc : str
+            HSDS folder with the FIREfly flight domains, e.g.
+            ``'/FIREfly/h5/'``.
+        max_age : float, optional
+            Seconds after the last synchronization when the catalog is
+            considered stale and queries go to HSDS. Default is 3600.
+        kwargs : dict
+            Kita server access information (``endpoint``, ``bucket``, etc.).
+        """
+        self._path = str(path)
+        self._loc = loc
+        self.max_age = max_age
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self._path, check_same_thread=False)
+        cols = ', '.join([f'"{c}" TEXT' for c in _text_columns]
+                         + [f'"{c}" REAL' for c in _real_columns])
+        with self._db:
+            self._db.execute(f'CREATE TABLE IF NOT EXISTS flights '
+                             f'(domain TEXT PRIMARY KEY, {cols}, attrs TEXT)')
+            for c in _text_columns + _real_columns:
+                self._db.execute(f'CREATE INDEX IF NOT EXISTS "idx_{c}" ON '
+                                 f'flights ("{c}")')
+            self._db.execute('CREATE TABLE IF NOT EXISTS sync '
+                             '(loc TEXT PRIMARY KEY, synced_at REAL)')
+
+    def __repr__(self):
+        return (f'<{type(self).__name__} "{self._path}" with {len(self)} '
+                f'flight(s) at 0x{id(self):x}>')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            row = self._db.execute('SELECT COUNT(*) FROM flights').fetchone()
+        return row[0]
+
+    def close(self):
+        """Close the catalog database."""
+        self._db.close()
+
+    @property
+    def synced_at(self):
+        """Time of the last synchronization (seconds since epoch) or None."""
+        with self._lock:
+            row = self._db.execute('SELECT synced_at FROM sync WHERE loc = ?',
+                                   (self._loc,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def fresh(self):
+        """The catalog was synchronized within ``max_age`` seconds."""
+        synced = self.synced_at
+        return synced is not None and time.time() - synced <= self.max_age
+
+    def sync(self, max_workers=8):
+        """Bring the catalog up to date with the HSDS folder.
+
+        The folder's domain names are listed to find new and removed flights.
+        Root attributes are fetched concurrently, only for new flights and
+        flights with a ``date_metadata_modified`` not older than the
+        catalog's newest.
+
+        Parameters
+        ----------
+        max_workers : int, optional
+            Number of concurrent attribute requests. Default is 8.
+
+        Returns
+        -------
+        dict
+            Numbers of ``added``, ``updated``, and ``removed`` flights.
+        """
+        with self._lock:
+            known = dict(self._db.execute(
+                'SELECT domain, date_metadata_modified FROM flights'))
+        newest = max(filter(None, known.values()), default=None)
+
+        with h5pyd.Folder(self._loc, mode='r', **self._kwargs) as folder:
+            names = set(_DomainListing(folder))
+            changed = set()
+            if newest is not None:
+                changed = set(_DomainListing(
+                    folder, query=f"date_metadata_modified >= '{newest}'"))
+        added = names - set(known)
+        removed = set(known) - names
+        todo = sorted(added | (changed & names))
+
+        def fetch(domain):
+            with h5pyd.File(domain, 'r', **self._kwargs) as f:
+                return domain, _root_attributes(f)
+
+        rows = list()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for domain, attrs in pool.map(fetch, todo):
+                rows.append(self._row(domain, attrs))
+
+        ncols = 2 + len(_text_columns) + len(_real_columns)
+        with self._lock, self._db:
+            self._db.executemany(
+                f'INSERT OR REPLACE INTO flights VALUES '
+                f'({", ".join("?" * ncols)})', rows)
+            self._db.executemany('DELETE FROM flights WHERE domain = ?',
+                                 [(d,) for d in removed])
+            self._db.execute('INSERT OR REPLACE INTO sync VALUES (?, ?)',
+                             (self._loc, time.time()))
+        stats = {'added': len(added), 'updated': len(todo) - len(added),
+                 'removed': len(removed)}
+        lggr.info(f'{self._loc}: Catalog synchronized {stats}')
+        return stats
+
+    @staticmethod
+    def _row(domain, attrs):
+        """Catalog table row of one flight."""
+        attrs = {n: _json_value(v) for n, v in attrs.items()}
+        row = [domain]
+        row.extend(attrs.get(c) if isinstance(attrs.get(c), str) else None
+                   for c in _text_columns)
+        row.extend(attrs.get(c) if isinstance(attrs.get(c), (int, float))
+                   else None for c in _real_columns)
+        row.append(json.dumps(attrs))
+        return row
+
+    def query(self, query=None, pattern=None):
+        """Flight domains matching an HSDS domain query.
+
+        Parameters
+        ----------
+        query : str, optional
+            Domain query, as used by HSDS domain search. Default is all
+            flights.
+        pattern : str, optional
+            A Python regex for filtering FIREfly flight file names.
+
+        Returns
+        -------
+        list of str or None
+            Sorted flight domain names, or ``None`` if the catalog cannot
+            answer the query.
+        """
+        sql = 'SELECT domain FROM flights'
+        params = list()
+        if query:
+            where, params = sql_where(query)
+            if where is None:
+                return None
+            sql += f' WHERE {where}'
+        with self._lock:
+            try:
+                names = [r[0] for r in self._db.execute(
+                    sql + ' ORDER BY domain', params)]
+            except sqlite3.Error as e:
+                lggr.warning(f'{query!r}: Catalog query failed: {e}')
+                return None
+        if pattern:
+            regex = re.compile(pattern)
+            names = [n for n in names if regex.search(n.rsplit('/', 1)[-1])]
+        return names
+
+    def filter(self, **kwargs):
+        """Flight domains matching flight filtering parameters.
+
+        Other parameters
+        ----------------
+        kwargs : dict
+            Flight filtering parameters, see
+            :func:`firefly.segment.filter_builder`.
+
+        Returns
+        -------
+        list of str or None
+            Sorted flight domain names, or ``None`` if the catalog cannot
+            answer the query.
+        """
+        return self.query(filter_builder(dict(kwargs))[0])
+
+    def attributes(self, domain):
+        """Catalog copy of one flight's root attributes."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT attrs FROM flights WHERE domain = ?',
+                (domain,)).fetchone()
+        if row is None:
+            raise KeyError(f'{domain}: Not in the catalog')
+        return json.loads(row[0])
@@ -1,5 +1,213 @@
+import time
+import asyncio
+import functools
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                FIRST_COMPLETED, as_completed, wait)
 import h5pyd
-from .segment import FlightSegment, filter_builder
+from .segment import FlightSegment
+from .query import plan_query
+from .aio import AsyncFlightSegment
+from .table import FlightTable
+from .aggregate import (Reducer, FunctionReducer, map_flight, combine_results,
+                        final_result)
+
+lggr = logging.getLogger(__name__)
+
+
+class _DomainListing:
+    """Domain names in an HSDS folder, fetched one page at a time.
+
+    Pages are requested from the ``/domains`` endpoint with ``Limit`` and
+    ``Marker`` only when needed: while iterating, for ``len()``, or to reach
+    an index. Only domain names are kept. ``on_complete`` is called with the
+    list of all names once the last page is fetched.
+    """
+
+    def __init__(self, folder, pattern=None, query=None, page_size=1000,
+                 on_complete=None):
+        if page_size < 1:
+            raise ValueError(f'{page_size}: Invalid page size')
+        self._folder = folder
+        self._params = {'domain': folder.domain}
+        if pattern:
+            self._params['pattern'] = pattern
+        if query:
+            # As in h5pyd, query results are not paged since a short page
+            # may not be the last one, list all matches at once...
+            self._params['query'] = query
+            page_size = None
+        self._page_size = page_size
+        self._names = list()
+        self._marker = None
+        self._complete = False
+        self._on_complete = on_complete
+
+    def __repr__(self):
+        more = '' if self._complete else '+'
+        return f'<{type(self).__name__} {len(self._names)}{more} domain(s)>'
+
+    @property
+    def complete(self):
+        """All pages fetched."""
+        return self._complete
+
+    @property
+    def fetched(self):
+        """Number of domain names fetched so far."""
+        return len(self._names)
+
+    def _fetch_page(self):
+        """Fetch the next page of domain names. Returns their number."""
+        if self._complete:
+            return 0
+        params = dict(self._params)
+        if self._page_size:
+            params['Limit'] = self._page_size
+        if self._marker:
+            params['Marker'] = self._marker
+        rsp = self._folder._http_conn.GET('/domains', params=params)
+        if rsp.status_code != 200:
+            raise IOError(rsp.status_code, rsp.reason)
+        domains = rsp.json()['domains']
+        loc = self._folder.domain
+        self._names.extend(loc + d['name'].rsplit('/', 1)[-1]
+                           for d in domains)
+        if self._page_size and len(domains) == self._page_size:
+            self._marker = domains[-1]['name']
+        else:
+            self._complete = True
+            if self._on_complete is not None:
+                self._on_complete(list(self._names))
+        lggr.debug(f'{loc}: Fetched {len(domains)} domain names')
+        return len(domains)
+
+    def _fetch_all(self):
+        while self._fetch_page():
+            pass
+
+    def __iter__(self):
+        i = 0
+        while True:
+            if i == len(self._names) and not self._fetch_page():
+                return
+            yield self._names[i]
+            i += 1
+
+    def __len__(self):
+        self._fetch_all()
+        return len(self._names)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if (key.start or 0) < 0 or key.stop is None or key.stop < 0:
+                self._fetch_all()
+            else:
+                while len(self._names) < key.stop and self._fetch_page():
+                    pass
+            return self._names[key]
+        key = int(key)
+        if key < 0:
+            self._fetch_all()
+        while key >= len(self._names) and self._fetch_page():
+            pass
+        return self._names[key]
+
+
+class QueryCache:
+    """Time-limited cache of flight domain search results.
+
+    Results are kept for ``ttl`` seconds, so flights added to the server
+    show up in repeated searches within that delay, and at most ``maxsize``
+    results are kept, dropping the least recently used first.
+
+    Parameters
+    ----------
+    ttl : float, optional
+        Seconds a search result is valid. Default is 300.
+    maxsize : int, optional
+        Maximal number of cached search results. Default is 128.
+    """
+
+    def __init__(self, ttl=300., maxsize=128):
+        if maxsize < 1:
+            raise ValueError(f'{maxsize}: Invalid cache size')
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evicted = 0
+
+    def __repr__(self):
+        return (f'<{type(self).__name__} with {len(self)} result(s), '
+                f'ttl {self.ttl}s at 0x{id(self):x}>')
+
+    def __len__(self):
+        with self._lock:
+            return len(self._results)
+
+    @staticmethod
+    def key(folder, query=None, pattern=None, bucket=None):
+        """Cache key of a domain search, with the query's whitespace
+        normalized."""
+        query = ' '.join(query.split()) if query else ''
+        return (folder.rstrip('/'), bucket or '', query, pattern or '')
+
+    def get(self, key):
+        """Cached domain names of a search, or ``None``."""
+        with self._lock:
+            found = self._results.get(key)
+            if found is not None and found[0] < time.monotonic():
+                del self._results[key]
+                self._expired += 1
+                found = None
+            if found is None:
+                self._misses += 1
+                return None
+            self._results.move_to_end(key)
+            self._hits += 1
+            return list(found[1])
+
+    def put(self, key, names):
+        """Cache the domain names of a search."""
+        with self._lock:
+            self._results[key] = (time.monotonic() + self.ttl, list(names))
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+                self._evicted += 1
+
+    def invalidate(self, folder=None):
+        """Drop cached results, all or only those of one folder.
+
+        Parameters
+        ----------
+        folder : str, optional
+            HSDS folder, e.g. ``'/FIREfly/h5/'``.
+        """
+        with self._lock:
+            if folder is None:
+                self._results.clear()
+            else:
+                folder = folder.rstrip('/')
+                for key in [k for k in self._results if k[0] == folder]:
+                    del self._results[key]
+
+    @property
+    def stats(self):
+        """Cache statistics: ``hits``, ``misses``, ``hit_rate``, ``expired``,
+        ``evicted``, and ``size``."""
+        with self._lock:
+            total = self._hits + self._misses
+            return {'hits': self._hits, 'misses': self._misses,
+                    'hit_rate': self._hits / total if total else 0.,
+                    'expired': self._expired, 'evicted': self._evicted,
+                    'size': len(self._results)}
 
 
 class FFlyRepo:
@@ -16,12 +224,21 @@ class FFlyRepo:
         ----------------
         mode : {'r', 'r+', 'w', 'w-', 'x', 'a'}
             Access mode to ``loc``. Default is ``'r'``.
+        cache_ttl : float or None
+            Seconds flight search results are reused by :meth:`filter`.
+            Default is 300. ``None`` disables the cache.
+        cache_size : int
+            Maximal number of cached flight search results. Default is 128.
         kwargs : dict
             Any remaining named arguments with Kita server access information.
         """
         self._loc = loc
         self._mode = kwargs.pop('mode', 'r')
         self._bucket = kwargs.pop('bucket', None)
+        ttl = kwargs.pop('cache_ttl', 300.)
+        size = kwargs.pop('cache_size', 128)
+        self.cache = None if ttl is None else QueryCache(ttl=ttl,
+                                                          maxsize=size)
         self._kwargs = kwargs
 
     def __repr__(self):
@@ -40,7 +257,14 @@ class FFlyRepo:
             parameters.
         """
         return FlightCollection(self._loc, mode=self._mode, bucket=self._bucket,
-                                **{**kwargs, **self._kwargs})
+                                **{'cache': self.cache, **kwargs,
+                                   **self._kwargs})
+
+    def invalidate(self):
+        """Forget cached flight search results, e.g. after new flights were
+        converted."""
+        if self.cache is not None:
+            self.cache.invalidate()
 
 
 class FlightCollection:
@@ -62,6 +286,29 @@ class FlightCollection:
             A Python regex for filtering FIREfly flight file names.
         query : str
             A boolean expression for filtering FIREfly flights' data.
+        domains : sequence of str
+            Flight domain names to use instead of searching for the flights,
+            e.g. from :meth:`firefly.intervals.TimeCoverageIndex.overlapping`.
+            Only the flight data filter applies to them.
+        catalog : firefly.catalog.FlightCatalog
+            Local flight catalog to select the flights from, instead of an
+            HSDS domain search, when it is fresh and can answer the query.
+        time_index : firefly.intervals.TimeCoverageIndex
+            Flights' time coverage index to select the flights from when the
+            query has only ``time``, ``latitude``, or ``longitude``
+            parameters.
+        bbox_index : firefly.spatial.BBoxIndex
+            Flights' bounding box index, used like ``time_index``.
+        cache : firefly.collection.QueryCache
+            Cache of HSDS domain search results to reuse, and to store this
+            search's result in once all flight domains are listed.
+        page_size : int
+            Number of flight domain names to list per server request. Flight
+            domains are listed as they are needed. Default is 1000.
+        compact : bool
+            Open flights in compact mode. See :class:`firefly.FlightSegment`.
+        float32 : bool
+            Store compact mode floating-point data as ``float32``.
         kwargs : dict
             Any remaining named arguments are assumed to be flight data
             filtering parameters or Kita server access information.
@@ -69,8 +316,19 @@ class FlightCollection:
         self._mode = kwargs.pop('mode', 'r')
         pattern = kwargs.pop('pattern', None)
         query = kwargs.pop('query', None)
+        page_size = kwargs.pop('page_size', 1000)
+        catalog = kwargs.pop('catalog', None)
+        time_index = kwargs.pop('time_index', None)
+        bbox_index = kwargs.pop('bbox_index', None)
+        cache = kwargs.pop('cache', None)
+        domains = kwargs.pop('domains', None)
+        self._compact = {'compact': kwargs.pop('compact', False),
+                         'float32': kwargs.pop('float32', False)}
+        self._plan = None
         if query is None:
-            self._flight_filter, self._data_filter = filter_builder(kwargs)
+            self._plan = plan_query(kwargs)
+            self._flight_filter = self._plan.domain_query
+            self._data_filter = self._plan.data_filter
         else:
             self._flight_filter = query
             self._data_filter = None
@@ -78,13 +336,41 @@ class FlightCollection:
         self._loc = h5pyd.Folder(loc, mode=self._mode, pattern=pattern,
                                  query=self._flight_filter,
                                  **kwargs)
-        loc = self._loc.domain
-        self._domains = [loc + d for d in self._loc]
+        self._domains = None if domains is None else list(domains)
+        if self._domains is None and self._plan is not None:
+            self._domains = self._plan.select(catalog, time_index,
+                                              bbox_index, pattern=pattern)
+        elif self._domains is None and catalog is not None:
+            if catalog.fresh:
+                self._domains = catalog.query(self._flight_filter,
+                                              pattern=pattern)
+        if self._domains is None and any(
+                x is not None for x in (catalog, time_index, bbox_index)):
+            lggr.info('Flight catalog and indexes cannot answer the query, '
+                      'search HSDS domains')
+        store = None
+        if self._domains is None and cache is not None:
+            key = cache.key(self._loc.domain, self._flight_filter, pattern,
+                            kwargs.get('bucket'))
+            self._domains = cache.get(key)
+            store = functools.partial(cache.put, key)
+        if self._domains is None:
+            self._domains = _DomainListing(self._loc, pattern=pattern,
+                                           query=self._flight_filter,
+                                           page_size=page_size,
+                                           on_complete=store)
         self._kwargs = kwargs
+        self.errors = dict()
 
     def __repr__(self):
         if self._loc:
-            return (f'<{self.__class__.__name__} with {len(self._domains)}'
+            if isinstance(self._domains, _DomainListing):
+                nflights = self._domains.fetched
+                if not self._domains.complete:
+                    nflights = f'{nflights}+'
+            else:
+                nflights = len(self._domains)
+            return (f'<{self.__class__.__name__} with {nflights}'
                     f' flight(s) (repo: {self._loc.domain}) at 0x{id(self):x}>')
         else:
             return f'<Closed FIREfly {self.__class__.__name__}>'
@@ -118,7 +404,8 @@ class FlightCollection:
             A flight from the collection with all its data.
         """
         for flt in self._domains:
-            yield FlightSegment(flt, mode='r', **self._kwargs)
+            yield FlightSegment(flt, mode='r', **self._compact,
+                                **self._kwargs)
 
     @property
     def flight_filter(self):
@@ -128,16 +415,35 @@ class FlightCollection:
     @property
     def data_filter(self):
         """Data filtering statement to apply to each flight file."""
-        return self._data_filter
+        if self._data_filter is None:
+            return None
+        return str(self._data_filter)
 
-    def apply(self, cond=None):
+    def apply(self, cond=None, max_workers=None, prefetch=None, ordered=True,
+              errors='raise'):
         """Apply filtering condition on FIREfly flights in the collection.
 
+        By default flights are opened, loaded, and filtered one after another.
+        With ``max_workers`` the next flights are loaded and filtered in a
+        thread pool while the caller consumes the current flight segments.
+
         Parameters
         ----------
         cond : str, optional
             A filtering expression to apply on all selected flights in the
             collection.
+        max_workers : int, optional
+            Number of flights processed concurrently. Default is to process
+            one flight at a time in the calling thread.
+        prefetch : int, optional
+            Maximal number of flights processed ahead of the caller. Default
+            is ``2 * max_workers``.
+        ordered : bool, optional
+            Yield flight segments in the collection's flight order (the
+            default) or as soon as their flight is done.
+        errors : {'raise', 'capture'}, optional
+            Stop with the error of a failed flight (the default), or skip the
+            flight and record its exception in :attr:`errors`.
 
         Yields
         ------
@@ -145,8 +451,230 @@ class FlightCollection:
             Flight segment produced by applying filtering to the selected
             flight.
         """
+        if errors not in ('raise', 'capture'):
+            raise ValueError(f'{errors}: errors must be "raise" or "capture"')
+        cond = cond or self._data_filter
+        self.errors = dict()
+
+        def filter_flight(domain):
+            with FlightSegment(domain, mode='r', **self._compact,
+                               **self._kwargs) as flight:
+                return flight.filter(cond)
+
+        def result(domain, func, *args):
+            try:
+                return func(*args)
+            except Exception as e:
+                if errors == 'raise':
+                    raise
+                lggr.warning(f'{domain}: Skipped after error: {e!r}')
+                self.errors[domain] = e
+                return list()
+
+        if max_workers is None:
+            for d in self._domains:
+                yield from result(d, filter_flight, d)
+            return
+        if max_workers < 1:
+            raise ValueError(f'{max_workers}: Invalid number of workers')
+        prefetch = max(prefetch or 2 * max_workers, max_workers)
+
+        todo = iter(self._domains)
+        running = OrderedDict()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            try:
+                while True:
+                    # Keep the next flights loading...
+                    while len(running) < prefetch:
+                        d = next(todo, None)
+                        if d is None:
+                            break
+                        running[pool.submit(filter_flight, d)] = d
+                    if not running:
+                        break
+                    if ordered:
+                        fut = next(iter(running))
+                    else:
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        fut = next(f for f in running if f in done)
+                    d = running.pop(fut)
+                    yield from result(d, fut.result)
+            finally:
+                # Stopped early, don't start the remaining flights...
+                for fut in running:
+                    fut.cancel()
+
+    def aggregate(self, map_fn, reduce_fn, cond=None, executor='thread',
+                  max_workers=8, errors='raise'):
+        """Map every flight in the collection to values and reduce them.
+
+        Each flight is read and mapped in a worker thread or process, where
+        its values are also reduced into a small partial result. Partial
+        results are combined as flights finish.
+
+        Parameters
+        ----------
+        map_fn : str or callable
+            An aircraft INS field name (e.g. ``'altitude'``), or a function
+            taking a :class:`firefly.FlightSegment` and returning its values
+            (e.g. a NumPy array). A function can return a dict to reduce the
+            values per key (e.g. per aircraft tail number). With a field name
+            and no ``cond``, reducers that can answer from the flight's root
+            summary attributes (``max_altitude``, etc.) skip reading the data.
+        reduce_fn : firefly.aggregate.Reducer or callable
+            A reducer, e.g. :class:`~firefly.aggregate.Histogram`,
+            :class:`~firefly.aggregate.Sum`, :class:`~firefly.aggregate.Min`,
+            :class:`~firefly.aggregate.Max`, :class:`~firefly.aggregate.Count`,
+            or :class:`~firefly.aggregate.QuantileSketch`. A callable must
+            combine two map values into one, in any order.
+        cond : str, optional
+            Map the flight segments matching this data filtering expression
+            instead of whole flights.
+        executor : {'thread', 'process'}, optional
+            Kind of worker pool. With ``'process'``, ``map_fn`` and
+            ``reduce_fn`` must be picklable (e.g. module-level functions).
+            Default is ``'thread'``.
+        max_workers : int, optional
+            Number of workers. Default is 8.
+        errors : {'raise', 'capture'}, optional
+            Stop with the error of a failed flight (the default), or leave the
+            flight out and record its exception in :attr:`errors`.
+
+        Returns
+        -------
+        object
+            The reducer's result, or a dict of results per key if
+            ``map_fn`` returns dicts. ``None`` when no flight had values.
+        """
+        if errors not in ('raise', 'capture'):
+            raise ValueError(f'{errors}: errors must be "raise" or "capture"')
+        if executor == 'thread':
+            pool_cls = ThreadPoolExecutor
+        elif executor == 'process':
+            pool_cls = ProcessPoolExecutor
+        else:
+            raise ValueError(f'{executor}: executor must be "thread" or '
+                             f'"process"')
+        reducer = (reduce_fn if isinstance(reduce_fn, Reducer)
+                   else FunctionReducer(reduce_fn))
+        kwargs = {**self._compact, **self._kwargs}
+        self.errors = dict()
+
+        state = None
+        with pool_cls(max_workers=max_workers) as pool:
+            futs = {pool.submit(map_flight, d, map_fn, reducer, cond,
+                                kwargs): d
+                    for d in self._domains}
+            try:
+                for fut in as_completed(futs):
+                    try:
+                        part = fut.result()
+                    except Exception as e:
+                        if errors == 'raise':
+                            raise
+                        lggr.warning(f'{futs[fut]}: Skipped after error: '
+                                     f'{e!r}')
+                        self.errors[futs[fut]] = e
+                        continue
+                    state = combine_results(reducer, state, part)
+            finally:
+                for fut in futs:
+                    fut.cancel()
+        return None if state is None else final_result(reducer, state)
+
+    async def aapply(self, cond=None, concurrency=16):
+        """Apply filtering condition on flights concurrently (asyncio).
+
+        Flights are opened and loaded concurrently, with at most
+        ``concurrency`` HSDS requests in progress at any time.
+
+        Parameters
+        ----------
+        cond : str, optional
+            A filtering expression to apply on all selected flights in the
+            collection.
+        concurrency : int, optional
+            Maximal number of concurrent HSDS requests. Default is 16.
+
+        Yields
+        ------
+        firefly.FlightSegment
+            Flight segment produced by applying filtering to the selected
+            flight, in the order the flights finished loading.
+        """
         cond = cond or self._data_filter
-        for s in self._domains:
-            flight = FlightSegment(s, mode='r', **self._kwargs)
-            for seg in flight.filter(cond):
-                yield seg
+        loop = asyncio.get_running_loop()
+        sem = asyncio.Semaphore(concurrency)
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+
+        async def load(domain):
+            async with AsyncFlightSegment(domain, semaphore=sem,
+                                          executor=pool,
+                                          **self._kwargs) as flt:
+                flight = await flt.flight_segment(**self._compact)
+            with flight:
+                async with sem:
+                    return await loop.run_in_executor(pool, flight.filter,
+                                                      cond)
+
+        tasks = [asyncio.ensure_future(load(d)) for d in self._domains]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                for seg in await fut:
+                    yield seg
+        finally:
+            for t in tasks:
+                t.cancel()
+            # Waiting for the pool's threads would block the event loop...
+            pool.shutdown(wait=False)
+
+    def table(self, path='/derived/aircraft_ins', columns=None, **kwargs):
+        """One logical table of a dataset from all flights in the collection.
+
+        The flight data filter is not applied. Rows are read from the flights
+        only when the table is iterated in chunks or indexed.
+
+        Parameters
+        ----------
+        path : str, optional
+            HDF5 path name of the compound dataset. Default is
+            ``'/derived/aircraft_ins'``.
+        columns : sequence of str, optional
+            Dataset fields to read. Default is all fields.
+        kwargs : dict
+            Other arguments for :class:`firefly.table.FlightTable`.
+
+        Returns
+        -------
+        firefly.table.FlightTable
+        """
+        return FlightTable(list(self._domains), path=path, columns=columns,
+                           **{**self._kwargs, **kwargs})
+
+    def to_parquet(self, outdir, loc, **kwargs):
+        """Export the same data from all flights in the collection to Parquet.
+
+        Flights are exported one at a time into a partitioned Parquet dataset.
+        See :meth:`firefly.FlightSegment.to_parquet` for the output layout.
+
+        Parameters
+        ----------
+        outdir :  str
+            Top folder of the partitioned Parquet output.
+        loc : str or int
+            Location of the flight data object to export. If a ``str``, it is
+            treated as an HDF5 path name. If an ``int``, it is assumed to be an
+            IRIG106 packet type identifier.
+        kwargs : dict
+            Optional arguments for :meth:`firefly.FlightSegment.to_parquet`.
+
+        Returns
+        -------
+        list of pathlib.Path
+            Path names of the output Parquet files.
+        """
+        outfiles = list()
+        for flight in self.flights:
+            with flight:
+                outfiles.append(flight.to_parquet(outdir, loc, **kwargs))
+        return outfiles
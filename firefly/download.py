@@ -0,0 +1,343 @@
+import json
+import time
+import logging
+import threading
+import itertools
+from pathlib import Path
+from hashlib import sha256
+from urllib.request import Request, urlopen
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import h5py
+import h5pyd
+
+lggr = logging.getLogger(__name__)
+
+
+def _resource_info(url, timeout):
+    """Size, validator, and range support of an HTTP resource."""
+    with urlopen(Request(url, method='HEAD'), timeout=timeout) as resp:
+        size = resp.headers.get('Content-Length')
+        ranges = resp.headers.get('Accept-Ranges', 'none').lower() == 'bytes'
+        etag = resp.headers.get('ETag') or resp.headers.get('Last-Modified')
+    return (int(size) if size is not None else None), ranges, etag
+
+
+def _fetch_range(url, outfile, start, end, timeout, retries):
+    """Download bytes ``start`` to ``end`` (inclusive) into the output file.
+
+    Returns the downloaded bytes.
+    """
+    for attempt in range(retries + 1):
+        try:
+            req = Request(url, headers={'Range': f'bytes={start}-{end}'})
+            with urlopen(req, timeout=timeout) as resp:
+                if resp.status != 206:
+                    raise IOError(f'{url}: Byte range request not honored')
+                data = resp.read()
+            if len(data) != end - start + 1:
+                raise IOError(f'{url}: Got {len(data)} bytes for range '
+                              f'{start}-{end}')
+            break
+        except OSError as e:
+            if attempt == retries:
+                raise
+            lggr.warning(f'{url}: Retry range {start}-{end} after error: {e}')
+    with open(outfile, 'r+b') as f:
+        f.seek(start)
+        f.write(data)
+    return data
+
+
+def _stream_download(url, outfile, timeout):
+    """Download the whole resource with one request. Returns its SHA-256."""
+    cksum = sha256()
+    with urlopen(url, timeout=timeout) as resp, open(outfile, 'wb') as f:
+        for chunk in iter(lambda: resp.read(10_000_000), b''):
+            f.write(chunk)
+            cksum.update(chunk)
+    return cksum.hexdigest()
+
+
+def ranged_download(url, outfile, checksum=None, part_size=16_000_000,
+                    max_workers=8, timeout=60, retries=3):
+    """Download a file with concurrent HTTP byte range requests.
+
+    The output file is preallocated and each part is written at its offset as
+    soon as it arrives. The SHA-256 checksum is computed while downloading, in
+    file order, so the file is never read back in full. Progress is recorded
+    in a ``<outfile>.download`` file so an interrupted download resumes with
+    only the missing parts. Servers without byte range support are downloaded
+    with one request.
+
+    Parameters
+    ----------
+    url : str
+        HTTP(S) URL of the file.
+    outfile : str or pathlib.Path
+        Output file path name.
+    checksum : str, optional
+        Expected SHA-256 checksum as a hex string. When given, the downloaded
+        file must have the same checksum.
+    part_size : int, optional
+        Size in bytes of one byte range request. Default is 16 MB.
+    max_workers : int, optional
+        Maximal number of concurrent range requests. Default is 8.
+    timeout : float, optional
+        Socket timeout in seconds for each request. Default is 60.
+    retries : int, optional
+        How many times to retry a failed range request. Default is 3.
+
+    Returns
+    -------
+    str
+        SHA-256 checksum of the downloaded file as a hex string.
+    """
+    if part_size < 1:
+        raise ValueError(f'{part_size}: Invalid part size')
+    if max_workers < 1:
+        raise ValueError(f'{max_workers}: Invalid number of workers')
+    of = Path(outfile)
+    state_file = of.with_name(of.name + '.download')
+    size, ranges, etag = _resource_info(url, timeout)
+
+    if not ranges or not size:
+        lggr.info(f'{url}: No byte range support, download in one request')
+        digest = _stream_download(url, of, timeout)
+    else:
+        nparts = -(-size // part_size)
+        state = {'url': url, 'size': size, 'etag': etag,
+                 'part_size': part_size, 'done': []}
+        done = set()
+        if state_file.exists() and of.exists():
+            try:
+                prev = json.loads(state_file.read_text())
+            except ValueError:
+                prev = dict()
+            if all(prev.get(k) == state[k]
+                   for k in ('url', 'size', 'etag', 'part_size')):
+                done = set(prev['done'])
+                lggr.info(f'{url}: Resume download with {len(done)} of '
+                          f'{nparts} parts done')
+        if not done:
+            with of.open('wb') as f:
+                f.truncate(size)
+
+        def save_state():
+            state['done'] = sorted(done)
+            state_file.write_text(json.dumps(state))
+
+        save_state()
+        cksum = sha256()
+        next_hash = 0
+        pending = dict()
+        todo = iter([i for i in range(nparts) if i not in done])
+        running = dict()
+        # At most this many parts are downloaded but not yet checksummed...
+        window = 2 * max_workers
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while True:
+                # Checksum parts in file order as they become available...
+                while next_hash < nparts:
+                    if next_hash in pending:
+                        cksum.update(pending.pop(next_hash))
+                    elif next_hash in done:
+                        with of.open('rb') as f:
+                            f.seek(next_hash * part_size)
+                            cksum.update(f.read(part_size))
+                    else:
+                        break
+                    next_hash += 1
+
+                # Keep the pool busy within the checksum window...
+                while len(running) + len(pending) < window:
+                    i = next(todo, None)
+                    if i is None:
+                        break
+                    start = i * part_size
+                    end = min(start + part_size, size) - 1
+                    fut = pool.submit(_fetch_range, url, of, start, end,
+                                      timeout, retries)
+                    running[fut] = i
+
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    i = running.pop(fut)
+                    pending[i] = fut.result()
+                    done.add(i)
+                save_state()
+        digest = cksum.hexdigest()
+
+    if state_file.exists():
+        state_file.unlink()
+    if checksum is not None and checksum.lower() != digest:
+        raise IOError(f'{str(of)}: Different SHA-256 checksum than {checksum}')
+    return digest
+
+
+# HSDS compression filter names that are named differently in h5py...
+_h5py_compression = {'deflate': 'gzip', 'gzip': 'gzip', 'lzf': 'lzf',
+                     'szip': 'szip'}
+
+
+def _chunk_selections(shape, chunks):
+    """Selections of all chunks in a dataset, as tuples of slices."""
+    if not shape:
+        yield ()
+        return
+    if chunks is None:
+        chunks = shape
+    ranges = [range(0, n, c) for n, c in zip(shape, chunks)]
+    for corner in itertools.product(*ranges):
+        yield tuple(slice(i, min(i + c, n))
+                    for i, c, n in zip(corner, chunks, shape))
+
+
+def _dataset_options(dset):
+    """h5py dataset creation options matching the source dataset's."""
+    if dset.shape is None:
+        return {'data': h5py.Empty(dset.dtype)}
+    opts = {'shape': dset.shape, 'dtype': dset.dtype}
+    chunks = dset.chunks
+    if isinstance(chunks, tuple) and len(chunks) == len(dset.shape):
+        opts['chunks'] = chunks
+        opts['maxshape'] = dset.maxshape
+        compression = _h5py_compression.get(dset.compression)
+        if compression:
+            opts['compression'] = compression
+            opts['compression_opts'] = dset.compression_opts
+        elif dset.compression:
+            lggr.warning(f'{dset.name}: Compression {dset.compression!r} not '
+                         f'available, storing uncompressed')
+        opts['shuffle'] = dset.shuffle
+        opts['fletcher32'] = dset.fletcher32
+        if dset.scaleoffset is not None:
+            opts['scaleoffset'] = dset.scaleoffset
+    elif chunks is not None:
+        # Chunk layout h5py cannot reproduce, let h5py pick the chunks...
+        opts['chunks'] = True
+        opts['maxshape'] = dset.maxshape
+    return opts
+
+
+def copy_domain(domain, h5f, opener, max_workers=8, progress=None):
+    """Copy an HDF5 domain into a local HDF5 file with concurrent chunk reads.
+
+    Groups, attributes, and datasets (with their chunk shape and filters) are
+    created first. Dataset chunks are then read concurrently, each worker
+    thread with its own connection, and written into the local file as they
+    arrive. Objects linked from more than one location are copied once and
+    hard linked.
+
+    Parameters
+    ----------
+    domain : h5pyd.File
+        Source domain.
+    h5f : h5py.File
+        Destination HDF5 file open for writing.
+    opener : callable
+        Called without arguments in each worker thread to open the source
+        domain for reading. The opened domains are closed after the copy
+        unless they are ``domain`` itself.
+    max_workers : int, optional
+        Maximal number of concurrent chunk reads. Default is 8.
+    progress : callable, optional
+        Called after every written chunk with the number of written chunks,
+        the total number of chunks, the number of written bytes, and elapsed
+        seconds.
+
+    Returns
+    -------
+    dict
+        Copy statistics: ``chunks``, ``bytes``, ``seconds``, and ``MB/s``.
+    """
+    if max_workers < 1:
+        raise ValueError(f'{max_workers}: Invalid number of workers')
+
+    # Replicate the object hierarchy and collect chunk selections...
+    tasks = list()
+    copied = dict()
+
+    def copy_attrs(src, dst):
+        for n, v in src.attrs.items():
+            dst.attrs[n] = v
+
+    def copy_group(src, dst):
+        copy_attrs(src, dst)
+        for name in src:
+            obj = src[name]
+            key = getattr(obj.id, 'uuid', obj.id)
+            if key in copied:
+                dst[name] = h5f[copied[key]]
+                continue
+            if isinstance(obj, (h5py.Group, h5pyd.Group)):
+                grp = dst.create_group(name)
+                copied[key] = grp.name
+                copy_group(obj, grp)
+            elif isinstance(obj, (h5py.Dataset, h5pyd.Dataset)):
+                dset = dst.create_dataset(name, **_dataset_options(obj))
+                copied[key] = dset.name
+                copy_attrs(obj, dset)
+                if obj.shape is None or 0 in obj.shape:
+                    continue
+                chunks = obj.chunks if isinstance(obj.chunks, tuple) else None
+                tasks.extend((obj.name, dset.name, sel)
+                             for sel in _chunk_selections(obj.shape, chunks))
+
+    copy_group(domain, h5f)
+
+    # Per-thread source domain and its datasets. The opened domains are also
+    # kept in a list to close them when the pool is done...
+    local = threading.local()
+    opened = list()
+    lock = threading.Lock()
+
+    def read_chunk(src_name, sel):
+        if not hasattr(local, 'domain'):
+            local.domain = opener()
+            local.dsets = dict()
+            with lock:
+                opened.append(local.domain)
+        if src_name not in local.dsets:
+            local.dsets[src_name] = local.domain[src_name]
+        return local.dsets[src_name][sel]
+
+    nchunks = 0
+    nbytes = 0
+    start = time.perf_counter()
+    todo = iter(tasks)
+    running = dict()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while True:
+                # Bound the number of chunks held in memory...
+                while len(running) < 2 * max_workers:
+                    task = next(todo, None)
+                    if task is None:
+                        break
+                    fut = pool.submit(read_chunk, task[0], task[2])
+                    running[fut] = task
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    _, dst_name, sel = running.pop(fut)
+                    data = fut.result()
+                    h5f[dst_name][sel] = data
+                    nchunks += 1
+                    nbytes += data.nbytes
+                    if progress is not None:
+                        progress(nchunks, len(tasks), nbytes,
+                                 time.perf_counter() - start)
+    finally:
+        for f in opened:
+            if f is not domain:
+                f.close()
+
+    elapsed = time.perf_counter() - start
+    stats = {'chunks': nchunks, 'bytes': nbytes, 'seconds': elapsed,
+             'MB/s': nbytes / 1e6 / elapsed if elapsed > 0 else 0.}
+    lggr.info(f'{domain.filename}: Copied {nchunks} chunks, {nbytes} bytes '
+              f'in {elapsed:.1f} s ({stats["MB/s"]:.1f} MB/s)')
+    return stats
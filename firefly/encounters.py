@@ -0,0 +1,271 @@
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                as_completed)
+import numpy as np
+import pandas as pd
+from .segment import FlightSegment
+from .query import DataFilter, Range
+from .util import great_circle_distance
+
+# Kilometers in one nautical mile and great circle kilometers in one degree
+# (Earth radius 6371 km)...
+_KM_PER_NMI = 1.852
+_KM_PER_DEGREE = 6371. * np.pi / 180.
+
+
+def _window(start, end):
+    """Data filter of a time window given in nanoseconds."""
+    return DataFilter([Range('time', [int(start), int(end)])])
+
+
+class Encounter:
+    """Time window when two flights were close to each other.
+
+    Attributes
+    ----------
+    flight_a, flight_b : str
+        Flight domain names.
+    start, end : pandas.Timestamp
+        First and last time of the common time base within the distance and
+        separation limits.
+    min_distance : float
+        Closest horizontal distance in nautical miles.
+    min_separation : float
+        Smallest altitude difference in feet.
+    """
+
+    def __init__(self, flight_a, flight_b, start, end, min_distance,
+                 min_separation):
+        self.flight_a = flight_a
+        self.flight_b = flight_b
+        self.start = pd.Timestamp(start)
+        self.end = pd.Timestamp(end)
+        self.min_distance = min_distance
+        self.min_separation = min_separation
+
+    def __repr__(self):
+        return (f'<{type(self).__name__} {self.flight_a} & {self.flight_b} '
+                f'{self.start} to {self.end}, {self.min_distance:.2f} nmi, '
+                f'{self.min_separation:.0f} ft>')
+
+    @property
+    def duration(self):
+        """Encounter duration as ``pandas.Timedelta``."""
+        return self.end - self.start
+
+    def segments(self, **kwargs):
+        """Flight segments of both flights during the encounter.
+
+        Parameters
+        ----------
+        kwargs : dict
+            Any named argument is passed to the ``h5pyd.File`` class.
+
+        Returns
+        -------
+        tuple of firefly.FlightSegment
+            Segments of ``flight_a`` and ``flight_b``, ``None`` for a flight
+            without data in the window. Each segment has its own connection
+            to the flight's domain, closed by closing the segment.
+        """
+        window = _window(self.start.value, self.end.value)
+        segs = list()
+        for domain in (self.flight_a, self.flight_b):
+            with FlightSegment(domain, mode='r', **kwargs) as flight:
+                found = flight.filter(window)
+            segs.append(found[0] if found else None)
+            for seg in found[1:]:
+                seg.close()
+        return tuple(segs)
+
+
+def _track(domain, start, end, kwargs):
+    """Times (ns), latitude, longitude, and altitude of a flight in a time
+    window, or ``None``."""
+    with FlightSegment(domain, mode='r', **kwargs) as flight:
+        segs = flight.filter(_window(start, end))
+        try:
+            frames = [seg._flight for seg in segs]
+        finally:
+            for seg in segs:
+                seg.close()
+    if not frames:
+        return None
+    t = np.concatenate([f.index.asi8 for f in frames])
+    return (t,) + tuple(
+        np.concatenate([f[c].to_numpy(dtype=float) for f in frames])
+        for c in ('latitude', 'longitude', 'altitude'))
+
+
+def _resample(t, values, base, max_gap):
+    """Linearly interpolate values at base times. NaN outside the data and
+    inside data gaps longer than ``max_gap`` nanoseconds."""
+    if t.size < 2:
+        return np.full(base.shape, np.nan)
+    out = np.interp((base - base[0]).astype(float),
+                    (t - base[0]).astype(float), values,
+                    left=np.nan, right=np.nan)
+    after = np.searchsorted(t, base, 'left')
+    k = np.clip(after, 1, t.size - 1)
+    exact = t[np.minimum(after, t.size - 1)] == base
+    out[(t[k] - t[k - 1] > max_gap) & ~exact] = np.nan
+    return out
+
+
+def pair_encounters(flight_a, flight_b, start, end, distance, separation,
+                    step=1., max_gap=5., kwargs=None):
+    """Encounters of two flights in a time window.
+
+    Both tracks are read only within the window, interpolated on a common
+    time base, and compared in one vectorized pass.
+
+    Parameters
+    ----------
+    flight_a, flight_b : str
+        Flight domain names.
+    start, end : int
+        Time window in nanoseconds since 1970-01-01 UTC.
+    distance : float
+        Horizontal distance limit in nautical miles.
+    separation : float
+        Altitude difference limit in feet.
+    step : float, optional
+        Time base step in seconds. Default is 1.
+    max_gap : float, optional
+        Longest data gap in seconds to interpolate over. Default is 5.
+    kwargs : dict, optional
+        Named arguments for the ``h5pyd.File`` class.
+
+    Returns
+    -------
+    list of firefly.encounters.Encounter
+    """
+    kwargs = kwargs or dict()
+    track_a = _track(flight_a, start, end, kwargs)
+    track_b = _track(flight_b, start, end, kwargs)
+    if track_a is None or track_b is None:
+        return list()
+    lo = max(track_a[0][0], track_b[0][0])
+    hi = min(track_a[0][-1], track_b[0][-1])
+    if hi < lo:
+        return list()
+
+    base = np.arange(lo, hi + 1, int(step * 1e9), dtype='<i8')
+    gap = int(max_gap * 1e9)
+    lat_a, lon_a, alt_a = (_resample(track_a[0], v, base, gap)
+                           for v in track_a[1:])
+    lat_b, lon_b, alt_b = (_resample(track_b[0], v, base, gap)
+                           for v in track_b[1:])
+    dist = great_circle_distance(lat_a, lon_a, lat_b, lon_b) / _KM_PER_NMI
+    vsep = np.abs(alt_a - alt_b)
+    with np.errstate(invalid='ignore'):
+        close = (dist <= distance) & (vsep <= separation)
+
+    # Runs of close time base steps...
+    edges = np.diff(close.astype(np.int8), prepend=0, append=0)
+    found = list()
+    for i, j in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        found.append(Encounter(flight_a, flight_b, base[i], base[j - 1],
+                               float(np.min(dist[i:j])),
+                               float(np.min(vsep[i:j]))))
+    return found
+
+
+def candidate_pairs(time_index, distance, bbox_index=None, start=None,
+                    end=None):
+    """Flight pairs that could have an encounter.
+
+    Pairs must overlap in time and, with a bounding box index, have
+    bounding boxes within ``distance`` of each other.
+
+    Parameters
+    ----------
+    time_index : firefly.intervals.TimeCoverageIndex
+        Flights' time coverage index.
+    distance : float
+        Horizontal distance limit in nautical miles.
+    bbox_index : firefly.spatial.BBoxIndex, optional
+        Flights' bounding box index.
+    start, end : str, datetime, or int, optional
+        Time window to search. Default is any time.
+
+    Returns
+    -------
+    list of tuple
+        See :meth:`firefly.intervals.TimeCoverageIndex.pairs`.
+    """
+    pairs = time_index.pairs(start, end)
+    if bbox_index is None or not pairs:
+        return pairs
+
+    names_a, names_b = zip(*[p[:2] for p in pairs])
+    a = bbox_index.bounds(names_a)
+    b = bbox_index.bounds(names_b)
+    dlat = distance * _KM_PER_NMI / _KM_PER_DEGREE
+    # Longitude degrees are shortest at the highest latitude in reach...
+    top = np.minimum(np.fmax(np.abs(a[:, :2]), np.abs(b[:, :2])).max(axis=1)
+                     + dlat, 90.)
+    coslat = np.cos(np.radians(top))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dlon = np.where(coslat < 1e-9, 180., np.minimum(dlat / coslat, 180.))
+        near = ((a[:, 1] - dlat <= b[:, 0]) & (a[:, 0] + dlat >= b[:, 1])
+                & (a[:, 3] - dlon <= b[:, 2]) & (a[:, 2] + dlon >= b[:, 3]))
+    # Flights without a bounding box cannot be ruled out...
+    near |= np.isnan(a).any(axis=1) | np.isnan(b).any(axis=1)
+    return [p for p, ok in zip(pairs, near) if ok]
+
+
+def find_encounters(time_index, distance, separation, bbox_index=None,
+                    start=None, end=None, step=1., max_gap=5.,
+                    executor='process', max_workers=None, **kwargs):
+    """Find when pairs of flights were within a distance of each other.
+
+    Candidate pairs are pruned with the time coverage and bounding box
+    indexes, then each pair's tracks are compared in a worker process.
+
+    Parameters
+    ----------
+    time_index : firefly.intervals.TimeCoverageIndex
+        Flights' time coverage index.
+    distance : float
+        Horizontal distance limit in nautical miles.
+    separation : float
+        Altitude difference limit in feet.
+    bbox_index : firefly.spatial.BBoxIndex, optional
+        Flights' bounding box index to prune candidate pairs.
+    start, end : str, datetime, or int, optional
+        Time window to search. Default is any time.
+    step : float, optional
+        Common time base step in seconds. Default is 1.
+    max_gap : float, optional
+        Longest data gap in seconds to interpolate over. Default is 5.
+    executor : {'process', 'thread'}, optional
+        Compare pairs in a process pool (the default) or a thread pool.
+    max_workers : int, optional
+        Number of workers. Default is the executor's default.
+    kwargs : dict
+        Any other named argument is passed to the ``h5pyd.File`` class.
+
+    Returns
+    -------
+    list of firefly.encounters.Encounter
+        Encounters sorted by start time.
+    """
+    if executor == 'thread':
+        pool_cls = ThreadPoolExecutor
+    elif executor == 'process':
+        pool_cls = ProcessPoolExecutor
+    else:
+        raise ValueError(f'{executor}: executor must be "thread" or '
+                         f'"process"')
+    pairs = candidate_pairs(time_index, distance, bbox_index=bbox_index,
+                            start=start, end=end)
+    found = list()
+    with pool_cls(max_workers=max_workers) as pool:
+        futs = [pool.submit(pair_encounters, a, b, t0, t1, distance,
+                            separation, step=step, max_gap=max_gap,
+                            kwargs=kwargs)
+                for a, b, t0, t1 in pairs]
+        for fut in as_completed(futs):
+            found.extend(fut.result())
+    found.sort(key=lambda e: (e.start, e.flight_a, e.flight_b))
+    return found
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+from .collection import FlightCollection
+
+
+def _ns(t):
+    """Time (ISO 8601 string, datetime, etc.) as nanoseconds since epoch."""
+    t = pd.Timestamp(t)
+    if t.tzinfo is not None:
+        t = t.tz_convert(None)
+    return t.value
+
+
+class TimeCoverageIndex:
+    """Sorted-endpoint index of flights' time coverage.
+
+    Flights are sorted by start time. Because no flight is longer than the
+    longest one, every flight overlapping a time window starts within that
+    longest duration before the window's end, so queries are two binary
+    searches and a vectorized check of the flights in between.
+    """
+
+    def __init__(self, names, start, end):
+        """
+        Parameters
+        ----------
+        names : sequence of str
+            Flight domain names.
+        start, end : sequence
+            Start and end times of each flight's data (ISO 8601 strings,
+            datetime objects, or nanoseconds since 1970-01-01 UTC).
+        """
+        start = np.array([_ns(t) for t in start], dtype='<i8')
+        end = np.array([_ns(t) for t in end], dtype='<i8')
+        if start.shape != end.shape or start.size != len(names):
+            raise ValueError('Different number of flight names and times')
+        order = np.argsort(start, kind='stable')
+        self._names = np.asarray(names, dtype=object)[order]
+        self._start = start[order]
+        self._end = end[order]
+        self._max_duration = int((end - start).max()) if start.size else 0
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """Index the time coverage of all flights in a flight catalog.
+
+        Parameters
+        ----------
+        catalog : firefly.catalog.FlightCatalog
+            Flight catalog.
+        """
+        rows = catalog._db.execute(
+            'SELECT domain, time_coverage_start, time_coverage_end '
+            'FROM flights WHERE time_coverage_start IS NOT NULL '
+            'AND time_coverage_end IS NOT NULL').fetchall()
+        if not rows:
+            return cls([], [], [])
+        return cls(*zip(*rows))
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return f'<{type(self).__name__} with {len(self)} flight(s)>'
+
+    def _select(self, lo, hi, mask):
+        """Sorted names of flights in start-sorted positions [lo, hi)."""
+        return sorted(self._names[lo:hi][mask(slice(lo, hi))])
+
+    def overlapping(self, start, end):
+        """Flights with data in a time window.
+
+        Parameters
+        ----------
+        start, end : str, datetime, or int
+            Time window (inclusive), as ISO 8601 strings, datetime objects,
+            or nanoseconds since 1970-01-01 UTC.
+
+        Returns
+        -------
+        list of str
+            Sorted flight domain names.
+        """
+        start, end = _ns(start), _ns(end)
+        lo = np.searchsorted(self._start, start - self._max_duration, 'left')
+        hi = np.searchsorted(self._start, end, 'right')
+        return self._select(lo, hi, lambda s: self._end[s] >= start)
+
+    def airborne(self, t):
+        """Flights with data at one time. See :meth:`overlapping`."""
+        return self.overlapping(t, t)
+
+    def containing(self, start, end):
+        """Flights whose data cover a whole time window.
+
+        See :meth:`overlapping` for parameters and return value.
+        """
+        start, end = _ns(start), _ns(end)
+        lo = np.searchsorted(self._start, end - self._max_duration, 'left')
+        hi = np.searchsorted(self._start, start, 'right')
+        return self._select(lo, hi, lambda s: self._end[s] >= end)
+
+    def within(self, start, end):
+        """Flights with all their data in a time window.
+
+        See :meth:`overlapping` for parameters and return value.
+        """
+        start, end = _ns(start), _ns(end)
+        lo = np.searchsorted(self._start, start, 'left')
+        hi = np.searchsorted(self._start, end, 'right')
+        return self._select(lo, hi, lambda s: self._end[s] <= end)
+
+    def pairs(self, start=None, end=None):
+        """Pairs of flights with overlapping time coverage.
+
+        Parameters
+        ----------
+        start, end : str, datetime, or int, optional
+            Only pairs overlapping within this time window, see
+            :meth:`overlapping`. Default is any time.
+
+        Returns
+        -------
+        list of tuple
+            Two flight domain names and the start and end of their common
+            time coverage (nanoseconds since 1970-01-01 UTC), clipped to the
+            time window.
+        """
+        t0 = -2 ** 62 if start is None else _ns(start)
+        t1 = 2 ** 62 if end is None else _ns(end)
+        sel = (self._end >= t0) & (self._start <= t1)
+        names, st, en = self._names[sel], self._start[sel], self._end[sel]
+
+        # Flights after each one in start order that start before it ends...
+        n = st.size
+        counts = np.searchsorted(st, en, 'right') - np.arange(n) - 1
+        counts = np.maximum(counts, 0)
+        i = np.repeat(np.arange(n), counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        j = i + 1 + np.arange(i.size) - first
+        lo = np.maximum(st[j], t0)
+        hi = np.minimum(np.minimum(en[i], en[j]), t1)
+        keep = lo <= hi
+        return list(zip(names[i[keep]].tolist(), names[j[keep]].tolist(),
+                        lo[keep].tolist(), hi[keep].tolist()))
+
+    def collection(self, loc, start, end, **kwargs):
+        """Flight collection of the flights overlapping a time window.
+
+        The flights are selected with the index, without an HSDS domain
+        search, and their data are filtered to the time window.
+
+        Parameters
+        ----------
+        loc : str
+            A Kita server URI where FIREfly flight data are hosted.
+        start, end : str
+            Time window as ISO 8601 strings.
+        kwargs : dict
+            Other :class:`firefly.FlightCollection` arguments: flight data
+            filtering parameters (not ``aircraft``, ``tail``, ``query``, or
+            ``pattern``) and Kita server access information.
+
+        Returns
+        -------
+        firefly.FlightCollection
+        """
+        unused = {'aircraft', 'tail', 'query', 'pattern'} & set(kwargs)
+        if unused:
+            raise ValueError(f'{", ".join(sorted(unused))}: Cannot select '
+                             f'flights with the time coverage index')
+        return FlightCollection(loc, domains=self.overlapping(start, end),
+                                time=[start, end], **kwargs)
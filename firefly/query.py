@@ -0,0 +1,439 @@
+import numpy as np
+import pandas as pd
+
+# Root attributes of the flight filtering parameters...
+_attr_names = {'aircraft': 'aircraft_type', 'tail': 'aircraft_id'}
+
+# Summary attributes (minimum, maximum) of the data filtering parameters, in
+# the order of preference...
+_summary_attrs = {
+    'altitude': (('min_altitude',), ('max_altitude',)),
+    'latitude': (('min_latitude', 'min_lat'), ('max_latitude', 'max_lat')),
+    'longitude': (('min_longitude', 'min_lon'),
+                  ('max_longitude', 'max_lon')),
+    'speed': (('min_speed',), ('max_speed',)),
+    'time': (('time_coverage_start',), ('time_coverage_end',))}
+
+# Flight filtering parameters in the order of their domain query terms...
+_param_order = ('aircraft', 'tail', 'altitude', 'latitude', 'longitude',
+                'speed', 'time')
+
+
+def _ns(t):
+    """Time (ISO 8601 string, datetime, etc.) as nanoseconds since epoch."""
+    t = pd.Timestamp(t)
+    if t.tzinfo is not None:
+        t = t.tz_convert(None)
+    return t.value
+
+
+class Predicate:
+    """Base class of flight filtering predicates.
+
+    A predicate knows how to express itself as an HSDS domain query on the
+    flights' root attributes and, when it constrains flight data, how to
+    test the data of one flight.
+    """
+
+    #: Flight filtering parameter of the predicate.
+    param = None
+
+    def domain_expr(self):
+        """HSDS domain query term, or ``None``."""
+        return None
+
+    def data_expr(self):
+        """Data filter condition in the pandas ``query`` syntax, or
+        ``None`` if the predicate does not constrain flight data."""
+        return None
+
+
+class AttrEquals(Predicate):
+    """Flight root attribute equal to one of several strings.
+
+    Parameters
+    ----------
+    param : {'aircraft', 'tail'}
+        Flight filtering parameter.
+    values : str or list/tuple of str
+        Accepted attribute values.
+    """
+
+    def __init__(self, param, values):
+        if param not in _attr_names:
+            raise ValueError(f'{param}: Not a flight attribute parameter')
+        if isinstance(values, str):
+            self._single = True
+            values = (values,)
+        elif isinstance(values, (list, tuple)):
+            self._single = False
+        else:
+            raise TypeError(f'{type(values)}: Invalid {param} value type')
+        self.param = param
+        self.attr = _attr_names[param]
+        self.values = tuple(values)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.param!r}, {self.values!r})'
+
+    def domain_expr(self):
+        terms = [f'{self.attr} == {v!r}' for v in self.values]
+        if self._single:
+            return terms[0]
+        return '(' + ' OR '.join(terms) + ')'
+
+
+class Range(Predicate):
+    """Flight data value in an interval.
+
+    Parameters
+    ----------
+    param : str
+        Flight data filtering parameter, an aircraft INS field name.
+    bounds : list or tuple
+        Minimal and maximal value, either can be ``None``. A list is a
+        closed interval, a tuple an open interval. ``time`` bounds are ISO
+        8601 strings.
+    """
+
+    def __init__(self, param, bounds):
+        if param not in _summary_attrs:
+            raise ValueError(f'{param}: Not a flight data parameter')
+        if isinstance(bounds, list):
+            self.closed = True
+        elif isinstance(bounds, tuple):
+            self.closed = False
+        else:
+            raise TypeError(f'{type(bounds)}: Invalid {param} value type')
+        lo, hi = (list(bounds) + [None, None])[:2]
+        if param != 'time':
+            lo = None if lo is None else float(lo)
+            hi = None if hi is None else float(hi)
+        if lo is None and hi is None:
+            raise ValueError(f'{param}: No interval bounds')
+        self.param = param
+        self.lo = lo
+        self.hi = hi
+
+    def __repr__(self):
+        bounds = [self.lo, self.hi] if self.closed else (self.lo, self.hi)
+        return f'{type(self).__name__}({self.param!r}, {bounds!r})'
+
+    def _terms(self, name_lo, name_hi):
+        """Comparison terms of the lower and upper bound."""
+        ops = ('>=', '<=') if self.closed else ('>', '<')
+        terms = list()
+        for name, op, val in zip((name_lo, name_hi), ops, (self.lo, self.hi)):
+            if val is None:
+                continue
+            val = repr(val) if self.param == 'time' else val
+            terms.append(f'{name} {op} {val}')
+        return terms
+
+    def domain_expr(self):
+        # Flights reaching above the lower bound and below the upper bound...
+        mins, maxs = _summary_attrs[self.param]
+        terms = self._terms(maxs[0], mins[0])
+        if len(terms) > 1:
+            return '(' + ' AND '.join(terms) + ')'
+        return terms[0]
+
+    def data_expr(self):
+        terms = self._terms(self.param, self.param)
+        if len(terms) > 1:
+            return '(' + ' and '.join(terms) + ')'
+        return terms[0]
+
+    @property
+    def limits(self):
+        """Interval bounds as numbers (nanoseconds for ``time``)."""
+        if self.param == 'time':
+            return tuple(None if v is None else _ns(v)
+                         for v in (self.lo, self.hi))
+        return self.lo, self.hi
+
+    def summary(self, attrs):
+        """Flight's minimal and maximal value from its summary attributes.
+
+        Returns
+        -------
+        tuple
+            The two values as numbers, ``None`` when not available.
+        """
+        found = list()
+        for names in _summary_attrs[self.param]:
+            val = next((attrs[n] for n in names if n in attrs), None)
+            try:
+                if self.param == 'time':
+                    val = None if val is None else _ns(val)
+                else:
+                    val = None if val is None else float(val)
+            except (TypeError, ValueError):
+                val = None
+            found.append(val)
+        return tuple(found)
+
+    def selectivity(self, attrs):
+        """Estimated fraction of a flight's data in the interval.
+
+        The flight's values are assumed uniformly distributed between its
+        summary minimum and maximum.
+
+        Parameters
+        ----------
+        attrs : dict
+            Flight's root attributes.
+
+        Returns
+        -------
+        float or None
+            Exactly 0 when no data can match, exactly 1 when all data match,
+            ``None`` when the summary attributes are not available.
+        """
+        vmin, vmax = self.summary(attrs)
+        if vmin is None or vmax is None:
+            return None
+        lo, hi = self.limits
+        lo = -np.inf if lo is None else lo
+        hi = np.inf if hi is None else hi
+        if self.closed:
+            if vmax < lo or vmin > hi:
+                return 0.
+            if vmin >= lo and vmax <= hi:
+                return 1.
+        else:
+            if vmax <= lo or vmin >= hi:
+                return 0.
+            if vmin > lo and vmax < hi:
+                return 1.
+        if vmax == vmin:
+            return 1.
+        overlap = min(hi, vmax) - max(lo, vmin)
+        return float(np.clip(overlap / (vmax - vmin), 0., 1.))
+
+    def values(self, frame):
+        """Flight data values tested by the predicate, as a NumPy array."""
+        if self.param == 'time':
+            return frame.index.asi8
+        return frame[self.param].to_numpy()
+
+    def test(self, values):
+        """Boolean mask of values in the interval."""
+        lo, hi = self.limits
+        if self.closed:
+            if lo is not None and hi is not None:
+                return (values >= lo) & (values <= hi)
+            return values >= lo if lo is not None else values <= hi
+        if lo is not None and hi is not None:
+            return (values > lo) & (values < hi)
+        return values > lo if lo is not None else values < hi
+
+
+class DataFilter:
+    """Per-flight part of a query plan: a conjunction of data intervals.
+
+    ``str()`` of the filter is its pandas ``query`` condition, which
+    :meth:`firefly.FlightSegment.filter` pushes down to the HSDS server.
+    Locally the filter is compiled into a NumPy mask function.
+    """
+
+    def __init__(self, predicates):
+        self.predicates = tuple(predicates)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({list(self.predicates)!r})'
+
+    def __str__(self):
+        return ' and '.join(p.data_expr() for p in self.predicates)
+
+    def __bool__(self):
+        return bool(self.predicates)
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def possible(self, attrs):
+        """Whether a flight with these root attributes can have matching
+        data, judged by its summary attributes."""
+        return all(p.selectivity(attrs) != 0 for p in self.predicates)
+
+    def compile(self, attrs=None):
+        """Compile the filter into a NumPy mask function.
+
+        With a flight's root attributes, predicates that all its data pass
+        are dropped and the others are tested from the most to the least
+        selective one, each only on the rows that passed the previous ones.
+
+        Parameters
+        ----------
+        attrs : dict, optional
+            Flight's root attributes with the summary attributes.
+
+        Returns
+        -------
+        callable
+            Takes a flight data frame (time index) and returns a boolean
+            NumPy array, ``True`` for the matching rows.
+        """
+        preds = list(self.predicates)
+        if attrs is not None:
+            est = [p.selectivity(attrs) for p in preds]
+            if any(s == 0 for s in est):
+                return lambda frame: np.zeros(len(frame), dtype=bool)
+            ranked = sorted((0.5 if s is None else s, i)
+                            for i, s in enumerate(est) if s != 1)
+            preds = [preds[i] for _, i in ranked]
+
+        def mask(frame):
+            idx = None
+            for p in preds:
+                values = p.values(frame)
+                if idx is None:
+                    idx = np.flatnonzero(p.test(values))
+                else:
+                    idx = idx[p.test(values[idx])]
+                if idx.size == 0:
+                    break
+            if idx is None:
+                return np.ones(len(frame), dtype=bool)
+            keep = np.zeros(len(frame), dtype=bool)
+            keep[idx] = True
+            return keep
+
+        return mask
+
+
+class QueryPlan:
+    """Flight query split by where each part is evaluated.
+
+    Parameters
+    ----------
+    predicates : sequence of firefly.query.Predicate
+        Predicates, all of which must hold (conjunction).
+
+    Attributes
+    ----------
+    domain_query : str
+        HSDS domain query on the flights' root attributes, also answered by
+        a :class:`firefly.catalog.FlightCatalog`.
+    data_filter : firefly.query.DataFilter
+        Per-flight data filter.
+    time_window : tuple or None
+        Time interval for a :class:`firefly.intervals.TimeCoverageIndex`.
+    bbox : tuple or None
+        Box (north, south, east, west) for a
+        :class:`firefly.spatial.BBoxIndex`.
+    """
+
+    def __init__(self, predicates):
+        # Attribute equality is the most selective domain query term and
+        # HSDS checks it first...
+        order = {p: i for i, p in enumerate(_param_order)}
+        self.predicates = sorted(predicates,
+                                 key=lambda p: order.get(p.param, 99))
+        self.domain_query = ' AND '.join(
+            filter(None, (p.domain_expr() for p in self.predicates)))
+        self.data_filter = DataFilter(
+            p for p in self.predicates if p.data_expr() is not None)
+
+        by_param = {p.param: p for p in self.predicates}
+        time = by_param.get('time')
+        self.time_window = None
+        if time is not None:
+            # Nanoseconds, far from the int64 limits when unbounded...
+            lo, hi = time.limits
+            self.time_window = (-2 ** 62 if lo is None else lo,
+                                2 ** 62 if hi is None else hi)
+        self.bbox = None
+        lat, lon = by_param.get('latitude'), by_param.get('longitude')
+        if lat is not None or lon is not None:
+            north, south = (90., -90.) if lat is None else (
+                90. if lat.hi is None else lat.hi,
+                -90. if lat.lo is None else lat.lo)
+            east, west = (180., -180.) if lon is None else (
+                180. if lon.hi is None else lon.hi,
+                -180. if lon.lo is None else lon.lo)
+            self.bbox = (north, south, east, west)
+
+    def __repr__(self):
+        return (f'<{type(self).__name__} domain: {self.domain_query!r}, '
+                f'data: {str(self.data_filter)!r}>')
+
+    def select(self, catalog=None, time_index=None, bbox_index=None,
+               pattern=None):
+        """Flight domains selected locally, without an HSDS domain search.
+
+        A fresh catalog answers the whole domain query. Otherwise the
+        indexes answer the time and location predicates when there are no
+        others. Index results can include flights without matching data
+        (bounding box or time coverage overlap), which the data filter
+        then skips.
+
+        Parameters
+        ----------
+        catalog : firefly.catalog.FlightCatalog, optional
+            Local flight catalog.
+        time_index : firefly.intervals.TimeCoverageIndex, optional
+            Flights' time coverage index.
+        bbox_index : firefly.spatial.BBoxIndex, optional
+            Flights' bounding box index.
+        pattern : str, optional
+            A Python regex for filtering FIREfly flight file names, only
+            applied by the catalog.
+
+        Returns
+        -------
+        list of str or None
+            Sorted flight domain names, or ``None`` when the domain query
+            must go to HSDS.
+        """
+        if catalog is not None and catalog.fresh:
+            names = catalog.query(self.domain_query, pattern=pattern)
+            if names is not None:
+                return names
+        if pattern:
+            return None
+
+        params = {p.param for p in self.predicates}
+        indexed = set()
+        names = None
+        if time_index is not None and self.time_window is not None:
+            indexed.add('time')
+            names = set(time_index.overlapping(*self.time_window))
+        if bbox_index is not None and self.bbox is not None:
+            indexed.update(('latitude', 'longitude'))
+            found = set(bbox_index.intersecting(*self.bbox))
+            names = found if names is None else names & found
+        if names is None or not params <= indexed:
+            return None
+        return sorted(names)
+
+
+def plan_query(qparams):
+    """Plan a flight query from flight filtering parameters.
+
+    Parameters
+    ----------
+    qparams : dict
+        Flight filtering parameters, see
+        :func:`firefly.segment.filter_builder`. Those parameters are removed
+        from the dictionary.
+
+    Returns
+    -------
+    firefly.query.QueryPlan
+    """
+    predicates = list()
+    for name in _param_order:
+        val = qparams.pop(name, None)
+        if val is None:
+            continue
+        if name in _attr_names:
+            predicates.append(AttrEquals(name, val))
+        elif not (isinstance(val, (list, tuple))
+                  and all(v is None for v in val)):
+            predicates.append(Range(name, val))
+    return QueryPlan(predicates)
@@ -1,21 +1,37 @@
 ##!/usr/bin/env python3
+import ast
+import threading
+import weakref
+from collections import OrderedDict
 from pathlib import Path
-from urllib.request import urlopen
-from hashlib import sha256
 import numpy as np
 import h5pyd
-from h5pyd._apps.utillib import load_file
+try:
+    from h5pyd._hl.h5type import createDataType
+except ImportError:
+    # Newer h5pyd versions...
+    from h5json.hdf5dtype import createDataType
 import h5py
 import pandas as pd
 from ipyleaflet import (Map, Polyline, basemaps, basemap_to_tiles,
                         FullScreenControl, LayersControl)
 import hvplot.pandas  # noqa
 from .irig106 import PacketType
+from .download import ranged_download, copy_domain
+from .query import DataFilter, plan_query
+from .util import (track_significance, mil1553_words, decode_1553,
+                   ts_video_pts, pts_offsets)
 try:
     from IPython.display import display
     display_map = True
 except ImportError:
     display_map = False
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    have_arrow = True
+except ImportError:
+    have_arrow = False
 
 
 class FlightSegment:
@@ -89,7 +105,7 @@ class FlightSegment:
         else:
             raise ValueError(f'{packet_type}: Unsupported Ch10 packet type')
 
-    def __init__(self, domain, mode, **kwargs):
+    def __init__(self, domain, mode, compact=False, float32=False, **kwargs):
         """Open FIREfly HDF5 file for access.
 
         Parameters
@@ -98,6 +114,13 @@ class FlightSegment:
             HDF Kita domain endopoint.
         mode: {'a', 'r'}
             Access mode. Only allowed: read and append.
+        compact: bool, optional
+            Keep aircraft INS data as contiguous NumPy columns, shared with the
+            segments made by :meth:`filter`, instead of a pandas.DataFrame.
+            Default is ``False``.
+        float32: bool, optional
+            In compact mode, store floating-point INS columns as ``float32``.
+            Default is ``False``.
         kwargs: dict
             Any other named argument is passed to the ``h5pyd.File`` class.
         """
@@ -105,10 +128,58 @@ class FlightSegment:
             raise ValueError('mode can only be "a" or "r"')
         self._domain = h5pyd.File(domain, mode, **kwargs)
         self._other = kwargs
-        data = pd.DataFrame(self._domain['/derived/aircraft_ins'][...])
-        self._flight = data.astype({'time': 'datetime64[ns]'})
-        self._flight.set_index('time', inplace=True)
+        self._data = None
+        self._rows = None
+        self._buf = None
+        self._compact = compact
+        self._float32 = float32
         self._bbox = None
+        self._track_sig = None
+        self._meta = None
+        self._video_idx = dict()
+
+    @classmethod
+    def _from_data(cls, domain, mode, flight, meta=None, rows=None, buf=None,
+                   compact=False, float32=False, **kwargs):
+        """Open FIREfly HDF5 file with already loaded aircraft INS data.
+
+        Parameters
+        ----------
+        domain: str
+            HDF Kita domain endopoint.
+        mode: {'a', 'r'}
+            Access mode.
+        flight: pandas.DataFrame or dict
+            Time-indexed aircraft INS data of the flight segment, or its
+            columns (including ``time``) in compact mode.
+        meta: dict, optional
+            Metadata snapshot of the flight, if already available.
+        rows: tuple, optional
+            First and one past the last row of the flight segment in the
+            aircraft INS dataset. Default is all rows.
+        buf: object, optional
+            Memory budget token of a data buffer shared with other segments.
+        compact: bool, optional
+            Data are in compact mode.
+        float32: bool, optional
+            Compact mode data are downcast to ``float32``.
+        kwargs: dict
+            Any other named argument is passed to the ``h5pyd.File`` class.
+        """
+        seg = cls.__new__(cls)
+        seg._domain = h5pyd.File(domain, mode, **kwargs)
+        seg._other = kwargs
+        seg._data = flight
+        seg._rows = rows
+        seg._buf = None
+        seg._compact = compact
+        seg._float32 = float32
+        seg._bbox = None
+        seg._track_sig = None
+        seg._meta = meta
+        seg._video_idx = dict()
+        _memory.add(seg, buf)
+        return seg
 
     def __enter__(self):
         return self
@@ -128,6 +199,45 @@ class FlightSegment:
         """Close FIREfly file."""
         self._domain.close()
 
+    @property
+    def _flight(self):
+        """Aircraft INS data frame, read from the file on first use.
+
+        Data evicted to stay within the memory budget are read again.
+        """
+        data = self._data
+        if data is None:
+            dset = self._domain['/derived/aircraft_ins']
+            if self._rows is None:
+                recs = dset[...]
+            else:
+                recs = dset[slice(*self._rows)]
+            if self._compact:
+                data = _compact_columns(recs, self._float32)
+            else:
+                data = _records_frame(recs)
+            self._data = data
+            _memory.add(self)
+        else:
+            _memory.touch(self._buf)
+        if self._compact:
+            return _columns_frame(data)
+        return data
+
+    def _unload(self):
+        """Drop the flight segment's data from memory."""
+        self._data = None
+        self._buf = None
+
+    @property
+    def nbytes(self):
+        """Memory used by the flight segment's loaded data, in bytes.
+
+        Data shared with other flight segments are counted in full. Zero when
+        the data are not in memory.
+        """
+        return _data_nbytes(self._data)
+
     @property
     def uri(self):
         """Flight segment's Kita URI."""
@@ -136,17 +246,17 @@ class FlightSegment:
     @property
     def aircraft_type(self):
         """Type of the aircraft."""
-        return self._domain.attrs['aircraft_type']
+        return self.metadata['global']['aircraft_type']
 
     @property
     def aircraft_id(self):
         """Aircraft tail number."""
-        return self._domain.attrs['aircraft_id']
+        return self.metadata['global']['aircraft_id']
 
     @property
     def ch10_file(self):
         """Flight's Chapter 10 file."""
-        return self._domain.attrs['ch10_file']
+        return self.metadata['global']['ch10_file']
 
     @property
     def start_time(self):
@@ -192,10 +302,11 @@ class FlightSegment:
             ``east_lon``, ``west_lon``.
         """
         if self._bbox is None:
-            north_lat = self._flight['latitude'].max()
-            south_lat = self._flight['latitude'].min()
-            east_lon = self._flight['longitude'].max()
-            west_lon = self._flight['longitude'].min()
+            flight = self._flight
+            north_lat = flight['latitude'].max()
+            south_lat = flight['latitude'].min()
+            east_lon = flight['longitude'].max()
+            west_lon = flight['longitude'].min()
             self._bbox = np.rec.array(
                 (north_lat, south_lat, east_lon, west_lon),
                 dtype=[('north_lat', north_lat.dtype),
@@ -204,25 +315,43 @@ class FlightSegment:
                        ('west_lon', west_lon.dtype)])
         return self._bbox
 
+    @property
+    def metadata(self):
+        """Snapshot of the flight's metadata.
+
+        Root group attributes, TMATS attributes, and the description of
+        datasets in the ``/derived`` group are fetched with as few server
+        requests as possible on the first access and then served from memory.
+        Flight segments made by :meth:`filter` share the snapshot.
+
+        Returns
+        -------
+        dict
+            ``global`` (dict of root group attributes), ``tmats`` (dict of
+            TMATS attributes), and ``derived`` (list of dataset descriptions).
+        """
+        if self._meta is None:
+            self._meta = _metadata_snapshot(self._domain)
+        return self._meta
+
+    def refresh_metadata(self):
+        """Discard the metadata snapshot so it is fetched again when needed."""
+        self._meta = None
+
     @property
     def tmats(self):
         """A dictionary with TMATS attributes. Empty if no attributes."""
-        tmats_h5path = '/derived/TMATS'
-        tmats = dict()
-        if tmats_h5path in self._domain:
-            for n, v in self._domain[tmats_h5path].attrs.items():
-                tmats[n] = v
-        return tmats
+        return dict(self.metadata['tmats'])
 
     @property
     def takeoff(self):
         """Takeoff airport."""
-        return self._domain.attrs['takeoff_location']
+        return self.metadata['global']['takeoff_location']
 
     @property
     def landing(self):
         """Landing airport."""
-        return self._domain.attrs['landing_location']
+        return self.metadata['global']['landing_location']
 
     def info(self, pprint=False):
         """Overview of the flight's file content.
@@ -238,41 +367,16 @@ class FlightSegment:
             Overview information as a dictionary.
         """
         info = dict()
+        meta = self.metadata
 
         # Root group (global) attributes...
-        info['global'] = list()
-        for n, v in self._domain['/'].attrs.items():
-            info['global'].append((n, v))
-
-        # # Summary group attributes...
-        # info['summary'] = list()
-        # for n, v in self._domain['/summary'].attrs.items():
-        #     info['summary'].append((n, v))
+        info['global'] = list(meta['global'].items())
 
         # TMATS attributes...
-        tmats = self.tmats
-        info['TMATS'] = f'{len(tmats)} attributes'
+        info['TMATS'] = f'{len(meta["tmats"])} attributes'
 
         # Info on derived parameters...
-        derived = self._domain['/derived']
-        info['derived'] = list()
-
-        def dset_info(name, obj):
-            """A callable for collecting information about HDF5 datasets."""
-            if not isinstance(obj, h5pyd.Dataset):
-                return
-            if obj.dtype.fields is None:
-                d = {'shape': obj.shape,
-                     'location': obj.name,
-                     'datatype': str(obj.dtype)}
-            else:
-                d = {'shape': obj.shape,
-                     'location': obj.name,
-                     'fields': [(n, str(t[0])) for n, t in
-                                obj.dtype.fields.items()]}
-            info['derived'].append(d)
-
-        derived.visititems(dset_info)
+        info['derived'] = [dict(d) for d in meta['derived']]
 
         if pprint:
             print(f'{self._domain.filename!r} overview:\n')
@@ -316,7 +420,38 @@ class FlightSegment:
             padding=0.02).cols(2)
         display(qv)
 
-    def flight_map(self, center=None, basemap=None, zoom=8):
+    def flight_track(self, zoom=None, tolerance=1.):
+        """Flight path simplified for display at a web map zoom level.
+
+        Track points that would not be visible at the given zoom level are
+        removed with the Douglas-Peucker algorithm. The ranking of track points
+        is computed once per flight segment so the track for any zoom level is
+        available quickly.
+
+        Parameters
+        ----------
+        zoom : int, optional
+            Web map zoom level. The default returns all track points.
+        tolerance : float, optional
+            Largest allowed deviation of the simplified track from the flight
+            path in screen pixels at the zoom level. Default is 1.
+
+        Returns
+        -------
+        numpy array
+            Track's (latitude, longitude) values as a two-column array.
+        """
+        lat = self._flight['latitude'].values
+        lon = self._flight['longitude'].values
+        if zoom is None:
+            return np.column_stack((lat, lon))
+        if self._track_sig is None:
+            self._track_sig = track_significance(
+                lat, lon, min_tolerance=_pixel_degrees(_MAX_ZOOM))
+        keep = self._track_sig > tolerance * _pixel_degrees(zoom)
+        return np.column_stack((lat[keep], lon[keep]))
+
+    def flight_map(self, center=None, basemap=None, zoom=8, tolerance=1.):
         """Display interactive map of the flight path. (Jupyter notebook only.)
 
         Parameters
@@ -329,6 +464,10 @@ class FlightSegment:
             ``('Esri.WorldImagery', 'OpenTopoMap')``.
         zoom: int, optional
             Map zoom level. Default is 8.
+        tolerance: float, optional
+            Largest allowed deviation of the displayed flight path from the
+            actual one in screen pixels. The displayed path is updated when the
+            map is zoomed. Default is 1.
         """
         if not display_map:
             raise RuntimeError('Cannot display map')
@@ -353,9 +492,17 @@ class FlightSegment:
         if center is None:
             center = (flight_lat.mean(), flight_lon.mean())
         flight_path = Polyline(
-            locations=[np.column_stack((flight_lat, flight_lon)).tolist()],
+            locations=[self.flight_track(int(zoom), tolerance).tolist()],
             color='blue', fill=False, name='Flight path')
         flight_map = Map(center=center, zoom=int(zoom))
+
+        def update_path(change):
+            """Match flight path's level of detail to the new zoom level."""
+            flight_path.locations = [
+                self.flight_track(int(round(change['new'])),
+                                  tolerance).tolist()]
+
+        flight_map.observe(update_path, names='zoom')
         for _ in base_layers:
             flight_map.add_layer(_)
         flight_map.add_layer(flight_path)
@@ -363,45 +510,325 @@ class FlightSegment:
         flight_map.add_control(LayersControl())
         display(flight_map)
 
-    def to_csv(self, outfile, loc, **kwargs):
-        """Export specified data to CSV.
+    def mil1553(self, ch, rt, sa, tr='T', to_rt=None, to_sa=None,
+                decoder=None, nwords=None, errors=False):
+        """Read one 1553 message stream within the flight segment's time.
+
+        Parameters
+        ----------
+        ch : int
+            1553 channel.
+        rt : int
+            Remote terminal address.
+        sa : int
+            Subaddress.
+        tr : {'T', 'R'}, optional
+            Remote terminal transmits (``'T'``, the default) or receives
+            (``'R'``) the messages.
+        to_rt : int, optional
+            Receiving remote terminal address of RT-to-RT messages. Default is
+            messages to/from the bus controller.
+        to_sa : int, optional
+            Receiving remote terminal subaddress of RT-to-RT messages.
+        decoder : str, optional
+            Name of a registered 1553 message decoder (see
+            :func:`firefly.util.register_1553_decoder`) to convert the data
+            words into engineering units.
+        nwords : int, optional
+            Number of data words per message. Default is the length of the
+            longest message.
+        errors : bool, optional
+            Keep messages with the message error flag set. Default is
+            ``False``.
+
+        Returns
+        -------
+        tuple or numpy structured array
+            Without ``decoder``: a tuple with message times
+            (``numpy.datetime64[ns]``) and their data words as a 2D ``uint16``
+            array, one message per row. With ``decoder``: a structured array
+            with the ``time`` and the decoder's parameter fields. Messages are
+            sorted by time.
+        """
+        if tr == 'T':
+            path = self.chapter11_location(
+                PacketType.MIL1553_FMT_1, ch=ch, from_rt=rt, from_sa=sa,
+                to_rt=('BC' if to_rt is None else to_rt), to_sa=to_sa)
+        elif tr == 'R':
+            if to_rt is not None:
+                raise ValueError('RT-to-RT messages are stored with the '
+                                 'transmitting RT, use tr="T"')
+            path = self.chapter11_location(PacketType.MIL1553_FMT_1, ch=ch,
+                                           to_rt=rt, to_sa=sa)
+        else:
+            raise ValueError(f'{tr}: tr must be "T" or "R"')
+        path += '/data'
+        if path not in self._domain:
+            raise ValueError(f'{path}: No data')
+        dset = self._domain[path]
+
+        # Read only the rows within the flight segment's time...
+        t = dset['time']
+        in_seg = (t >= self.start_time.value) & (t <= self.end_time.value)
+        rows = np.flatnonzero(in_seg)
+        if rows.size:
+            data = dset[rows[0]:rows[-1] + 1]
+            data = data[in_seg[rows[0]:rows[-1] + 1]]
+        else:
+            data = np.empty((0,), dtype=_MIL1553_DTYPE)
+        if not errors:
+            data = data[data['msg_error'] == 0]
+        data = data[np.argsort(data['time'], kind='stable')]
+
+        time = data['time'].astype('datetime64[ns]')
+        words = mil1553_words(data['messages'], nwords=nwords)
+        if decoder is None:
+            return time, words
+        return decode_1553(words, decoder, time=time)
+
+    def video_index(self, ch, rebuild=False, chunk_size=100_000):
+        """Time index of a Video Format 0 channel's transport stream packets.
+
+        The index is read from the ``time_index`` dataset next to the video
+        ``data`` dataset, written during conversion with one entry per Ch10
+        video packet. If there is no such dataset, the index is built with one
+        entry per transport stream packet starting a video PES packet, timed
+        with its presentation time stamp (PTS) counted from the file's
+        ``time_coverage_start``, and stored in the file when it is open for
+        writing.
+
+        Parameters
+        ----------
+        ch : int
+            Video channel.
+        rebuild : bool, optional
+            Build the index from the PTS values even if the file has one.
+            Default is ``False``.
+        chunk_size : int, optional
+            Number of transport stream packets to read at once when building
+            the index. Default is 100,000 (18.8 MB).
+
+        Returns
+        -------
+        numpy structured array
+            Index entries with fields ``time`` (nanoseconds since 1970-01-01
+            UTC) and ``row`` (transport stream packet position in the video
+            dataset), sorted by time.
+        """
+        path = self.chapter11_location(PacketType.VIDEO_FMT_0, ch=ch)
+        if path + '/data' not in self._domain:
+            raise ValueError(f'{path}/data: No data')
+        if not rebuild and ch in self._video_idx:
+            return self._video_idx[ch]
+        if not rebuild and path + '/time_index' in self._domain:
+            self._video_idx[ch] = self._domain[path + '/time_index'][...]
+            return self._video_idx[ch]
+
+        dset = self._domain[path + '/data']
+        rows = list()
+        pts = list()
+        for i in range(0, dset.shape[0], chunk_size):
+            r, p = ts_video_pts(dset[i:i + chunk_size])
+            rows.append(r + i)
+            pts.append(p)
+        rows = np.concatenate(rows) if rows else np.empty((0,), dtype='<i8')
+        t0 = pd.Timestamp(self.metadata['global']['time_coverage_start'])
+        if t0.tzinfo is not None:
+            t0 = t0.tz_convert(None)
+        time = t0.value + pts_offsets(np.concatenate(pts) if pts else [])
+
+        # Reordered frames go back in time, keep the index sorted...
+        idx = np.empty((rows.size,), dtype=_VIDEO_INDEX_DTYPE)
+        idx['time'] = np.maximum.accumulate(time) if time.size else time
+        idx['row'] = rows
+        if self._domain.mode != 'r':
+            if path + '/time_index' in self._domain:
+                del self._domain[path + '/time_index']
+            self._domain[path].create_dataset('time_index', data=idx)
+        self._video_idx[ch] = idx
+        return idx
+
+    def _video_rows(self, ch, start, end):
+        """Video dataset rows between index entries around a time window."""
+        idx = self.video_index(ch)
+        nrows = self._domain[
+            self.chapter11_location(PacketType.VIDEO_FMT_0, ch=ch)
+            + '/data'].shape[0]
+        if start is None:
+            first = 0
+        else:
+            # Start at the last playback point at or before start time...
+            i = np.searchsorted(idx['time'], pd.Timestamp(start).value,
+                                side='right') - 1
+            first = int(idx['row'][i]) if i >= 0 else 0
+        if end is None:
+            last = nrows
+        else:
+            i = np.searchsorted(idx['time'], pd.Timestamp(end).value,
+                                side='right')
+            last = int(idx['row'][i]) if i < idx.size else nrows
+        return first, max(first, last)
+
+    def stream_video(self, ch, out, start='segment', end='segment',
+                     chunk_size=50_000):
+        """Write a Video Format 0 channel's transport stream.
+
+        Only the video packets in the time window are read, located with the
+        channel's :meth:`video_index`. The output starts at the last index
+        entry at or before ``start`` and ends before the first one after
+        ``end``.
+
+        Parameters
+        ----------
+        ch : int
+            Video channel.
+        out : str, pathlib.Path, or file object
+            Output file path name, or a file object opened for binary writing
+            (e.g. a pipe to a video player or ``sys.stdout.buffer``).
+        start : str, pandas.Timestamp, or None, optional
+            Start time. ``'segment'`` (the default) is the flight segment's
+            start time, ``None`` is the start of the video.
+        end : str, pandas.Timestamp, or None, optional
+            End time. ``'segment'`` (the default) is the flight segment's end
+            time, ``None`` is the end of the video.
+        chunk_size : int, optional
+            Number of transport stream packets to read and write at once.
+            Default is 50,000 (9.4 MB).
+
+        Returns
+        -------
+        int
+            Number of written transport stream packets.
+        """
+        if isinstance(out, (str, Path)):
+            with open(out, 'wb') as f:
+                return self.stream_video(ch, f, start=start, end=end,
+                                         chunk_size=chunk_size)
+
+        if isinstance(start, str) and start == 'segment':
+            start = self.start_time
+        if isinstance(end, str) and end == 'segment':
+            end = self.end_time
+        first, last = self._video_rows(ch, start, end)
+        dset = self._domain[
+            self.chapter11_location(PacketType.VIDEO_FMT_0, ch=ch) + '/data']
+        for i in range(first, last, chunk_size):
+            out.write(dset[i:min(i + chunk_size, last)].tobytes())
+        out.flush()
+        return last - first
+
+    def _export_data(self, loc, chunk_size, **kwargs):
+        """Locate flight segment data to export and iterate over its blocks.
 
         Parameters
         ----------
-        outfile :  str
-            Output CSV file path.
         loc : str or int
             Location of the flight segment data object to export. If a ``str``,
             it is treated as an HDF5 path name. If an ``int``, it is assumed to
             be an IRIG106 packet type identifier.
+        chunk_size : int
+            Maximal number of records in one data block.
         kwargs : dict
             Optional arguments depending on the IRIG106 packet type.
+
+        Returns
+        -------
+        tuple
+            HDF5 path name of the data, NumPy structured datatype of its
+            records, and an iterator over consecutive blocks of records.
         """
+        if int(chunk_size) < 1:
+            raise ValueError(f'{chunk_size}: Invalid chunk size')
+        chunk_size = int(chunk_size)
+
         if isinstance(loc, str):
             # HDF5 path name...
             if loc != '/derived/aircraft_ins':
                 raise ValueError(f'{loc}: No data')
             data = self._flight
+
+            def ins_blocks():
+                for i in range(0, len(data), chunk_size):
+                    yield _ins_records(data.iloc[i:i + chunk_size])
+
+            return loc, _ins_records(data.iloc[:0]).dtype, ins_blocks()
         elif isinstance(loc, int):
             # IRIG106 packet type...
             ch11_path = self.chapter11_location(loc, **kwargs)
             if ch11_path not in self._domain:
-                raise ValueError(f'{ch11_path}/: Not found')
+                raise ValueError(f'{ch11_path}: No data')
             grp = self._domain[ch11_path]
             if 'data' not in grp:
                 raise ValueError(f'{ch11_path + "/data"}: No data')
-            data = pd.DataFrame(grp['data'][...])
-            data = data.astype({'time': 'datetime64[ns]'})
-            data.set_index('time', inplace=True)
-            data = data.loc[self.start_time:self.end_time]
+            dset = grp['data']
+            tstart = self.start_time.value
+            tend = self.end_time.value
+            # 1553 messages are exported with their own record layout, any
+            # other packet data as stored...
+            if loc == PacketType.MIL1553_FMT_1:
+                dtype = _MIL1553_DTYPE
+            else:
+                dtype = dset.dtype
+
+            def packet_blocks():
+                # Read one hyperslab at a time and keep only the packets
+                # within the flight segment's time coverage...
+                for i in range(0, dset.shape[0], chunk_size):
+                    block = dset[i:i + chunk_size]
+                    t = block['time']
+                    block = block[(t >= tstart) & (t <= tend)]
+                    if block.size == 0:
+                        continue
+                    if dtype is dset.dtype:
+                        yield block
+                        continue
+                    recs = np.empty(block.shape, dtype=dtype)
+                    for n in dtype.names:
+                        recs[n] = block[n]
+                    yield recs
+
+            return f'{grp.name}/data', dtype, packet_blocks()
         else:
             raise TypeError(f'{loc}: Unsupported flight data specifier')
 
-        data.to_csv(outfile, mode='w', header=True, index=True)
+    def to_csv(self, outfile, loc, chunk_size=100_000, **kwargs):
+        """Export specified data to CSV.
+
+        Data are read, converted, and written in blocks so memory use does not
+        depend on the amount of exported data.
 
-    def to_hdf5(self, outfile, loc, **kwargs):
+        Parameters
+        ----------
+        outfile :  str
+            Output CSV file path.
+        loc : str or int
+            Location of the flight segment data object to export. If a ``str``,
+            it is treated as an HDF5 path name. If an ``int``, it is assumed to
+            be an IRIG106 packet type identifier.
+        chunk_size : int, optional
+            Number of data records to process at a time. Default is 100,000.
+        kwargs : dict
+            Optional arguments depending on the IRIG106 packet type.
+        """
+        _, dtype, blocks = self._export_data(loc, chunk_size, **kwargs)
+        with open(outfile, mode='w', newline='') as f:
+            header = True
+            for recs in blocks:
+                _records_frame(recs).to_csv(f, header=header, index=True)
+                header = False
+            if header:
+                # No data so write just the header...
+                _records_frame(np.empty((0,), dtype=dtype)).to_csv(
+                    f, header=True, index=True)
+
+    def to_hdf5(self, outfile, loc, chunk_size=100_000, chunks=True,
+                compression=None, compression_opts=None, **kwargs):
         """Export specified flight segment data to HDF5.
 
+        The output HDF5 dataset is extendable and the data are appended to it
+        in blocks so memory use does not depend on the amount of exported
+        data.
+
         Parameters
         ----------
         outfile :  str
@@ -410,69 +837,127 @@ class FlightSegment:
             Location of the flight segment data object to export. If a ``str``,
             it is treated as an HDF5 path name. If an ``int``, it is assumed to
             be an IRIG106 packet type identifier.
+        chunk_size : int, optional
+            Number of data records to process at a time. Default is 100,000.
+        chunks : True or tuple, optional
+            Chunk shape of the output HDF5 dataset. Default (``True``) lets
+            h5py pick the chunk shape.
+        compression : str or int, optional
+            Compression filter of the output HDF5 dataset, e.g. ``'gzip'``.
+            Default is no compression.
+        compression_opts : optional
+            Compression filter settings, e.g. gzip compression level.
         kwargs : dict
             Optional arguments depending on the IRIG106 packet type.
         """
-        if isinstance(loc, str):
-            # HDF5 path name...
-            if loc != '/derived/aircraft_ins':
-                raise ValueError(f'{loc}: No data')
-            data = self._flight
-            path = loc
-        elif isinstance(loc, int):
-            # IRIG106 packet type...
-            ch11_path = self.chapter11_location(loc, **kwargs)
-            if ch11_path not in self._domain:
-                raise ValueError(f'{ch11_path}: No data')
-            grp = self._domain[ch11_path]
-            if 'data' not in grp:
-                raise ValueError(f'{ch11_path + "/data"}: No data')
-            if loc == PacketType.MIL1553_FMT_1:
-                path = f'{grp.name}/data'
-                data = pd.DataFrame(grp['data'][...])
-                data = data.astype({'time': 'datetime64[ns]'})
-                data.set_index('time', inplace=True)
-                data = data.loc[self.start_time:self.end_time]
-                dtype_1553 = np.dtype(
-                    [('time', '<i8'),
-                     ('timestamp', 'S30'),
-                     ('msg_error', '|u1'),
-                     ('ttb', '|u1'),
-                     ('word_error', '|u1'),
-                     ('sync_error', '|u1'),
-                     ('word_count_error', '|u1'),
-                     ('rsp_tout', '|u1'),
-                     ('format_error', '|u1'),
-                     ('bus_id', 'S1'),
-                     ('packet_version', '|u1'),
-                     ('messages', h5py.special_dtype(vlen=np.dtype('<u2')))])
-                new_data = np.empty(len(data), dtype=dtype_1553)
-                new_data['time'] = data.index.values
-                for name, col_data in data.iteritems():
-                    new_data[name] = col_data.values
-                data = new_data
-                new_data = None
-            else:
-                raise RuntimeError(f'{loc}: Packet type not supported')
-        else:
-            raise TypeError(f'{loc}: Unsupported flight data specifier')
+        if isinstance(loc, int) and loc != PacketType.MIL1553_FMT_1:
+            raise RuntimeError(f'{loc}: Packet type not supported')
+        path, dtype, blocks = self._export_data(loc, chunk_size, **kwargs)
 
         with h5py.File(outfile, mode='w') as h5f:
             for n in ('aircraft_type', 'aircraft_id', 'ch10_file',
                       'ch10_file_checksum', 'takeoff_location',
                       'landing_location'):
-                h5f.attrs[n] = self._domain.attrs[n]
+                h5f.attrs[n] = self.metadata['global'][n]
             h5f.attrs['source'] = self.uri
             h5f.attrs['time_coverage_start'] = self.start_time.isoformat() + 'Z'
             h5f.attrs['time_coverage_end'] = self.end_time.isoformat() + 'Z'
-            h5f.create_dataset(path, data=data)
+            dset = h5f.create_dataset(path, shape=(0,), maxshape=(None,),
+                                      dtype=dtype, chunks=chunks,
+                                      compression=compression,
+                                      compression_opts=compression_opts)
+            for recs in blocks:
+                nrows = dset.shape[0]
+                dset.resize((nrows + recs.shape[0],))
+                dset[nrows:] = recs
             now = str(np.datetime64('now', 's')) + 'Z'
             h5f.attrs['date_created'] = now
             h5f.attrs['date_modified'] = now
 
-    def download_ch10(self, outfile, verify=True):
+    def to_parquet(self, outdir, loc, row_group_size=1_000_000,
+                   compression='snappy', **kwargs):
+        """Export specified flight segment data to Parquet.
+
+        The output file is placed in a Hive-style partitioned folder
+        structure::
+
+            outdir/<table>/aircraft_type=<type>/date=<YYYY-MM-DD>/<file>.parquet
+
+        where ``<table>`` is ``aircraft_ins`` for the aircraft INS data or the
+        1553 stream location with ``/`` replaced by ``_`` (e.g.
+        ``1553_Ch_11_RT_6_SA_29_T_BC``). The partition date is the segment's
+        start (UTC) date. ``<file>`` is the flight's name followed by the
+        segment's start and end times (``YYYYmmddTHHMMSSffffff``), so every
+        segment of a flight has its own file. Data are written one row group
+        at a time. 1553 message words are stored as a list of ``uint16``
+        values.
+
+        Parameters
+        ----------
+        outdir :  str
+            Top folder of the partitioned Parquet output.
+        loc : str or int
+            Location of the flight segment data object to export. If a ``str``,
+            it is treated as an HDF5 path name. If an ``int``, it is assumed to
+            be an IRIG106 packet type identifier.
+        row_group_size : int, optional
+            Maximal number of rows in one Parquet row group. Default is
+            1,000,000.
+        compression : str, optional
+            Parquet compression codec. Default is ``'snappy'``.
+        kwargs : dict
+            Optional arguments depending on the IRIG106 packet type.
+
+        Returns
+        -------
+        pathlib.Path
+            Path name of the output Parquet file.
+        """
+        if not have_arrow:
+            raise RuntimeError('Parquet export requires the pyarrow package')
+        if isinstance(loc, int) and loc != PacketType.MIL1553_FMT_1:
+            raise RuntimeError(f'{loc}: Packet type not supported')
+        path, dtype, blocks = self._export_data(loc, row_group_size, **kwargs)
+        if path == '/derived/aircraft_ins':
+            # Data columns are contiguous in memory so Arrow arrays can be
+            # made from them without copying...
+            table = 'aircraft_ins'
+            data = self._flight
+            if self._compact:
+                columns = self._data
+            else:
+                columns = {'time': data.index.values,
+                           **{n: data[n].values for n in data.columns}}
+            blocks = ({n: c[i:i + row_group_size]
+                       for n, c in columns.items()}
+                      for i in range(0, len(data), row_group_size))
+        else:
+            table = '_'.join(path.split('/')[2:-1]).replace(' ', '_')
+
+        # Segments of the same flight need their own files...
+        tfmt = '%Y%m%dT%H%M%S%f'
+        of = Path(outdir).joinpath(
+            table, f'aircraft_type={self.aircraft_type}',
+            f'date={self.start_time.strftime("%Y-%m-%d")}',
+            f'{Path(self._domain.filename).stem}_'
+            f'{self.start_time.strftime(tfmt)}_'
+            f'{self.end_time.strftime(tfmt)}.parquet')
+        of.parent.mkdir(parents=True, exist_ok=True)
+        schema = _arrow_batch(np.empty((0,), dtype=dtype), dtype.names).schema
+        with pq.ParquetWriter(str(of), schema,
+                              compression=compression) as writer:
+            for cols in blocks:
+                batch = _arrow_batch(cols, dtype.names)
+                writer.write_table(pa.Table.from_batches([batch]))
+        return of
+
+    def download_ch10(self, outfile, verify=True, max_workers=8):
         """Download flight Chapter 10 file.
 
+        The file is downloaded with concurrent byte range requests and an
+        interrupted download is resumed on the next call with the same output
+        file.
+
         Parameters
         ----------
         outfile : str
@@ -482,58 +967,87 @@ class FlightSegment:
         verify : {True, False}, optional
             Verify downloaded file against its SHA-256 checksum. Default is
             ``True``.
+        max_workers : int, optional
+            Maximal number of concurrent byte range requests. Default is 8.
         """
-        ch10_file = self._domain.attrs['ch10_file']
+        ch10_file = self.ch10_file
         of = Path(outfile)
         if of.is_dir():
             of = of.joinpath(ch10_file)
 
-        endpoint = \
-            f'https://firefly-chap10.s3-us-west-2.amazonaws.com/{ch10_file}'
-        with urlopen(endpoint) as ch10, of.open('wb') as f:
-            while True:
-                chunk = ch10.read(10_000_000)
-                if not chunk:
-                    break
-                else:
-                    f.write(chunk)
-
+        cksum = None
         if verify:
-            cksum = self._domain.attrs['ch10_file_checksum']
+            cksum = self.metadata['global']['ch10_file_checksum']
             if not cksum.startswith('SHA-256:'):
                 raise ValueError(f'Ch10 file checksum is not SHA-256: {cksum}')
+            cksum = cksum[8:]
 
-            new_cksum = sha256()
-            with of.open('rb') as f:
-                for chunk in iter(lambda: f.read(10_000_000), b''):
-                    new_cksum.update(chunk)
-            if cksum[8:] != new_cksum.hexdigest():
-                raise IOError(
-                    f'{str(of)}: Different SHA-256 checksum than {cksum[8:]}')
+        endpoint = \
+            f'https://firefly-chap10.s3-us-west-2.amazonaws.com/{ch10_file}'
+        ranged_download(endpoint, of, checksum=cksum, max_workers=max_workers)
 
-    def download_hdf5(self, outfile):
+    def download_hdf5(self, outfile, max_workers=8, progress=False):
         """Download FIREfly HDF5 file.
 
+        Dataset chunks are downloaded concurrently and stored with the same
+        chunk shape and filters as in the FIREfly HDF5 file.
+
         Parameters
         ----------
         outfile : str
             File path name for the downloaded FIREfly HDF5 file. If it's an
             existing folder, the downloaded file will have the same name as the
             original file in that folder.
+        max_workers : int, optional
+            Maximal number of concurrent chunk downloads. Default is 8.
+        progress : bool or callable, optional
+            Print download progress and throughput. If a callable, it is called
+            instead with the number of downloaded chunks, the total number of
+            chunks, the number of downloaded bytes, and elapsed seconds.
+            Default is ``False``.
+
+        Returns
+        -------
+        dict
+            Download statistics: ``chunks``, ``bytes``, ``seconds``, and
+            ``MB/s``.
         """
         of = Path(outfile)
         if of.is_dir():
             of = of.joinpath(Path(self._domain.filename).name)
+        if progress is True:
+            progress = _print_progress
+        elif not progress:
+            progress = None
+
+        def opener():
+            return h5pyd.File(self._domain.filename, 'r', **self._other)
+
         with h5py.File(str(of), 'w') as h5f:
-            load_file(self._domain, h5f)
+            stats = copy_domain(self._domain, h5f, opener,
+                                max_workers=max_workers, progress=progress)
+        if progress is _print_progress:
+            print()
+        return stats
 
-    def filter(self, cond):
+    def filter(self, cond, pushdown=True):
         """Filter flight segment data into new segments.
 
+        When the flight segment's data have not been read yet and the server
+        can evaluate the condition, only the matching data are transferred.
+        In compact mode the new segments' data are views of one shared buffer.
+
+        A :class:`firefly.query.DataFilter` is first checked against the
+        flight's summary attributes, so flights without matching data are not
+        read, and is evaluated locally as a compiled NumPy mask.
+
         Parameters
         ----------
-        cond : str
+        cond : str or firefly.query.DataFilter
             Condition (expression) for filtering flight segment data.
+        pushdown : bool, optional
+            Let the HSDS server evaluate the condition when possible. Default
+            is ``True``.
 
         Returns
         -------
@@ -541,140 +1055,524 @@ class FlightSegment:
             A list of new flight segments with the data that matched filtering
             condition.
         """
-        # Filter the data...
-        data = self._flight.query(cond, inplace=False)
+        attrs = None
+        if isinstance(cond, DataFilter):
+            attrs = self.metadata['global']
+            if not cond.possible(attrs):
+                return list()
+
+        row_idx = None
+        if pushdown and self._data is None and self._rows is None:
+            row_idx, recs = _hsds_where(self._domain, '/derived/aircraft_ins',
+                                        str(cond))
+        if row_idx is not None:
+            # Only the matching rows were read, as one new buffer...
+            data = (_compact_columns(recs, self._float32) if self._compact
+                    else _records_frame(recs))
+            buf = None
+            pos = np.arange(row_idx.size)
+            offset = 0
+        else:
+            # Filter the data...
+            flight = self._flight
+            data, buf = self._data, self._buf
+            if isinstance(cond, DataFilter):
+                mask = cond.compile(attrs)(flight)
+            else:
+                mask = np.asarray(flight.eval(cond), dtype=bool)
+            row_idx = np.flatnonzero(mask)
+            pos = row_idx
+            offset = self._rows[0] if self._rows else 0
+            if not self._compact:
+                data, pos = flight.iloc[row_idx], np.arange(row_idx.size)
 
         # Separate filtered data into continuous segments...
-        row_idx = np.where(np.in1d(self._flight.index, data.index))[0]
+        if row_idx.size == 0:
+            return list()
         seg_start = np.nonzero(np.diff(row_idx, prepend=row_idx[0]) > 1)[0]
-        if seg_start.size == 0:
-            new_seg = self.__new__(type(self))
-            new_seg._domain = h5pyd.File(self._domain.filename,
-                                         self._domain.mode,
-                                         **self._other)
-            new_seg._other = self._other
-            new_seg._flight = data
-            new_seg._bbox = None
-            return list(new_seg)
-        else:
-            from_idx = 0
-            segments = list()
-            for start in seg_start.tolist():
-                new_seg = self.__new__(type(self))
-                new_seg._domain = h5pyd.File(self._domain.filename,
-                                             self._domain.mode,
-                                             **self._other)
-                new_seg._other = self._other
-                new_seg._flight = data.iloc[from_idx:start]
-                new_seg._bbox = None
-                segments.append(new_seg)
-                from_idx = start
-            new_seg = self.__new__(type(self))
-            new_seg._domain = h5pyd.File(self._domain.filename,
-                                         self._domain.mode,
-                                         **self._other)
-            new_seg._other = self._other
-            new_seg._flight = data.iloc[from_idx:]
-            new_seg._bbox = None
-            segments.append(new_seg)
-            return segments
-
-
-def _make_expr_str(param_name, param_val):
-    """Generate query expression from a string flight property."""
-    if param_val is None:
-        return
-
-    attr_name = {'aircraft': 'aircraft_type',
-                 'tail': 'aircraft_id'}
-    attr = attr_name[param_name]
-
-    if isinstance(param_val, str):
-        flight_expr = f'{attr} == {param_val!r}'
-    elif isinstance(param_val, (list, tuple)):
-        temp = [f'{attr} == {a!r}' for a in param_val]
-        flight_expr = '(' + ' OR '.join(temp) + ')'
-    else:
-        raise TypeError(
-            f'{type(param_val)}: Invalid {param_name} value type')
+        bounds = [0] + seg_start.tolist() + [row_idx.size]
+        if self._compact and buf is None:
+            buf = _memory.token(data)
+        segs = list()
+        for i, j in zip(bounds[:-1], bounds[1:]):
+            first, last = int(pos[i]), int(pos[j - 1]) + 1
+            rows = (offset + int(row_idx[i]), offset + int(row_idx[j - 1]) + 1)
+            if self._compact:
+                # Columns are views of the shared buffer...
+                part = {n: c[first:last] for n, c in data.items()}
+            else:
+                part = data.iloc[first:last]
+            segs.append(self._from_data(
+                self._domain.filename, self._domain.mode, part,
+                meta=self._meta, rows=rows,
+                buf=(buf if self._compact else None), compact=self._compact,
+                float32=self._float32, **self._other))
+        return segs
 
-    return flight_expr
 
+# Comparison operators in data filter conditions the server can evaluate...
+_query_ops = {ast.Gt: '>', ast.GtE: '>=', ast.Lt: '<', ast.LtE: '<=',
+              ast.Eq: '==', ast.NotEq: '!='}
+_query_flip = {'>': '<', '>=': '<=', '<': '>', '<=': '>=', '==': '==',
+               '!=': '!='}
 
-def _make_expr_float(param_name, param_val):
-    """Generate query expression for a numeric flight parameter."""
-    if param_val is None:
-        return None, None
 
-    # Summary attributes for each parameter...
-    smmry_attr = {'altitude': ('min_altitude', 'max_altitude'),
-                  'latitude': ('min_latitude', 'max_latitude'),
-                  'longitude': ('min_longitude', 'max_longitude'),
-                  'speed': ('min_speed', 'max_speed')}
+def _pushdown_query(cond, fields):
+    """Translate a data filter condition into an HSDS dataset query.
 
-    attr_min, attr_max = smmry_attr[param_name]
+    Only comparisons of fields with numbers (or ISO 8601 strings for the
+    ``time`` field) joined with ``and``/``or``/``&``/``|`` are supported.
 
-    if isinstance(param_val, list):
-        oper = ('>=', '<=')
-    elif isinstance(param_val, tuple):
-        oper = ('>', '<')
-    else:
-        raise TypeError(
-            f'{type(param_val)}: Invalid {param_name} value type')
-
-    flight_expr = list()
-    data_expr = list()
-    for a, op, val in zip((attr_max, attr_min), oper, param_val):
-        if val is None:
-            continue
+    Parameters
+    ----------
+    cond : str
+        Data filter condition in the pandas ``query`` syntax.
+    fields : sequence of str
+        Field names of the queried dataset.
+
+    Returns
+    -------
+    str or None
+        HSDS query string or ``None`` if the condition cannot be translated.
+    """
+    def value(node, field):
+        try:
+            v = ast.literal_eval(node)
+        except ValueError:
+            return None
+        if field == 'time' and isinstance(v, str):
+            return pd.Timestamp(v).value
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            return v
+        return None
+
+    def compare(left, op, right):
+        oper = _query_ops.get(type(op))
+        if oper is None:
+            return None
+        if isinstance(right, ast.Name) and not isinstance(left, ast.Name):
+            left, right, oper = right, left, _query_flip[oper]
+        if not isinstance(left, ast.Name) or left.id not in fields:
+            return None
+        v = value(right, left.id)
+        if v is None:
+            return None
+        return f'({left.id} {oper} {v!r})'
+
+    def translate(node):
+        if isinstance(node, ast.BoolOp):
+            join = ' & ' if isinstance(node.op, ast.And) else ' | '
+            parts = [translate(v) for v in node.values]
+        elif (isinstance(node, ast.BinOp) and
+              isinstance(node.op, (ast.BitAnd, ast.BitOr))):
+            join = ' & ' if isinstance(node.op, ast.BitAnd) else ' | '
+            parts = [translate(node.left), translate(node.right)]
+        elif isinstance(node, ast.Compare):
+            join = ' & '
+            operands = [node.left] + node.comparators
+            parts = [compare(a, op, b) for a, op, b in
+                     zip(operands[:-1], node.ops, operands[1:])]
         else:
-            val = float(val)
-        data_expr.append(f'{param_name} {op} {val}')
-        flight_expr.append(f'{a} {op} {val}')
+            return None
+        if any(p is None for p in parts):
+            return None
+        return parts[0] if len(parts) == 1 else '(' + join.join(parts) + ')'
+
+    try:
+        tree = ast.parse(cond.strip(), mode='eval')
+    except (SyntaxError, AttributeError):
+        return None
+    try:
+        return translate(tree.body)
+    except ValueError:
+        # Invalid time string...
+        return None
 
-    if len(flight_expr) > 1:
-        flight_expr = '(' + ' AND '.join(filter(bool, flight_expr)) + ')'
-        data_expr = '(' + ' and '.join(filter(bool, data_expr)) + ')'
-    else:
-        flight_expr = flight_expr[0]
-        data_expr = data_expr[0]
 
-    return (flight_expr, data_expr)
+def _hsds_where(domain, path, cond):
+    """Rows of an HSDS dataset that match a data filter condition.
 
+    The condition is evaluated by the HSDS server so only the matching rows
+    are transferred.
 
-def _make_expr_time(param_name, param_val):
-    """Generate query expression for a time-valued flight parameter."""
-    if param_val is None:
+    Returns
+    -------
+    tuple
+        Matching row indices and their data (numpy arrays), or
+        ``(None, None)`` if the condition could not be evaluated on the
+        server or the response lacks the row indices.
+    """
+    if not isinstance(domain, h5pyd.File):
+        return None, None
+    try:
+        dset = domain[path]
+        query = _pushdown_query(cond, dset.dtype.names)
+        if query is None:
+            return None, None
+        rsp = _hsds_get(domain, f'/datasets/{dset.id.uuid}/value',
+                        query=query)
+    except (IOError, KeyError, AttributeError):
         return None, None
+    index = np.asarray(rsp.get('index', []), dtype='i8')
+    recs = np.array([tuple(v) for v in rsp.get('value', [])],
+                    dtype=dset.dtype)
+    if index.shape[0] != recs.shape[0]:
+        # Rows without their indices cannot become segments, so filter on
+        # the client...
+        return None, None
+    order = np.argsort(index, kind='stable')
+    return index[order], recs[order]
 
-    # Summary attributes for each parameter...
-    smmry_attr = {'time': ('time_coverage_start', 'time_coverage_end')}
-    attr_min, attr_max = smmry_attr[param_name]
 
-    if isinstance(param_val, list):
-        oper = ('>=', '<=')
-    elif isinstance(param_val, tuple):
-        oper = ('>', '<')
-    else:
-        raise TypeError(
-            f'{type(param_val)}: Invalid {param_name} value type')
-
-    flight_expr = list()
-    data_expr = list()
-    for a, op, val in zip((attr_max, attr_min), oper, param_val):
-        if val is None:
-            continue
-        data_expr.append(f'{param_name} {op} {val!r}')
-        flight_expr.append(f'{a} {op} {val!r}')
-
-    if len(flight_expr) > 1:
-        flight_expr = '(' + ' AND '.join(filter(bool, flight_expr)) + ')'
-        data_expr = '(' + ' and '.join(filter(bool, data_expr)) + ')'
+def _dset_info(name, shape, dtype):
+    """Description of an HDF5 dataset for the flight's overview."""
+    if dtype.fields is None:
+        return {'shape': shape,
+                'location': name,
+                'datatype': str(dtype)}
     else:
-        flight_expr = flight_expr[0]
-        data_expr = data_expr[0]
+        return {'shape': shape,
+                'location': name,
+                'fields': [(n, str(t[0])) for n, t in dtype.fields.items()]}
+
+
+def _hsds_get(domain, req, **params):
+    """Send one HSDS REST GET request for the domain. Returns response JSON."""
+    rsp = domain.id.http_conn.GET(req, params=params)
+    if rsp.status_code != 200:
+        raise IOError(f'{req}: HSDS request failed with status '
+                      f'{rsp.status_code}')
+    return rsp.json()
+
+
+def _hsds_value(item):
+    """Convert HSDS JSON attribute or dataset description to value/dtype."""
+    dtype = createDataType(item['type'])
+    shape = item['shape']
+    if shape['class'] == 'H5S_NULL':
+        return h5py.Empty(dtype)
+    value = item['value']
+    if dtype.names is not None:
+        if shape['class'] == 'H5S_SCALAR':
+            value = tuple(value)
+        else:
+            value = [tuple(v) for v in value]
+    arr = np.asarray(value, dtype=dtype)
+    if shape['class'] == 'H5S_SCALAR':
+        return arr[()]
+    return arr.reshape(shape['dims'])
+
+
+def _hsds_attributes(domain, collection, obj_id):
+    """All attributes of one HSDS object, with their values, in one request."""
+    rsp = _hsds_get(domain, f'/{collection}/{obj_id}/attributes',
+                    IncludeData=1)
+    return {a['name']: _hsds_value(a) for a in rsp['attributes']}
+
+
+def _root_attributes(domain):
+    """Flight's root attributes, in one request from HSDS when possible."""
+    if isinstance(domain, h5pyd.File):
+        try:
+            return _hsds_attributes(domain, 'groups', domain.id.uuid)
+        except (IOError, KeyError, ValueError, TypeError, AttributeError):
+            # Not an HSDS server this code understands...
+            pass
+    return dict(domain['/'].attrs.items())
+
+
+def _hsds_snapshot(domain):
+    """Flight metadata snapshot from HSDS with few REST requests."""
+    def attributes(collection, obj_id):
+        return _hsds_attributes(domain, collection, obj_id)
+
+    def links(grp_id):
+        rsp = _hsds_get(domain, f'/groups/{grp_id}/links')
+        return [lnk for lnk in rsp['links'] if lnk['class'] == 'H5L_TYPE_HARD']
+
+    meta = {'global': attributes('groups', domain.id.uuid),
+            'tmats': dict(),
+            'derived': list()}
+    derived = [lnk for lnk in links(domain.id.uuid)
+               if lnk['title'] == 'derived']
+    if not derived:
+        return meta
+
+    # Walk /derived hierarchy, one request per group and dataset...
+    todo = [('/derived', derived[0]['id'])]
+    while todo:
+        path, grp_id = todo.pop(0)
+        for lnk in links(grp_id):
+            name = f'{path}/{lnk["title"]}'
+            if lnk['collection'] == 'groups':
+                if name == '/derived/TMATS':
+                    meta['tmats'] = attributes('groups', lnk['id'])
+                todo.append((name, lnk['id']))
+            elif lnk['collection'] == 'datasets':
+                rsp = _hsds_get(domain, f'/datasets/{lnk["id"]}')
+                shape = rsp['shape']
+                if shape['class'] == 'H5S_NULL':
+                    shape = None
+                else:
+                    shape = tuple(shape.get('dims', ()))
+                meta['derived'].append(
+                    _dset_info(name, shape, createDataType(rsp['type'])))
+    return meta
+
+
+def _metadata_snapshot(domain):
+    """Collect flight's root attributes, TMATS attributes, and datasets info.
+
+    HSDS domains are read with bulk REST requests. Any other (e.g. local)
+    HDF5 file is read with the usual h5py API.
+    """
+    if isinstance(domain, h5pyd.File):
+        try:
+            return _hsds_snapshot(domain)
+        except (IOError, KeyError, ValueError, TypeError, AttributeError):
+            # Not an HSDS server this code understands...
+            pass
+
+    meta = {'global': dict(domain['/'].attrs.items()),
+            'tmats': dict(),
+            'derived': list()}
+    if '/derived/TMATS' in domain:
+        meta['tmats'] = dict(domain['/derived/TMATS'].attrs.items())
+    if '/derived' in domain:
+        def dset_info(name, obj):
+            """A callable for collecting information about HDF5 datasets."""
+            if isinstance(obj, (h5pyd.Dataset, h5py.Dataset)):
+                meta['derived'].append(
+                    _dset_info(obj.name, obj.shape, obj.dtype))
+
+        domain['/derived'].visititems(dset_info)
+    return meta
+
+
+_MIL1553_DTYPE = np.dtype(
+    [('time', '<i8'),
+     ('timestamp', 'S30'),
+     ('msg_error', '|u1'),
+     ('ttb', '|u1'),
+     ('word_error', '|u1'),
+     ('sync_error', '|u1'),
+     ('word_count_error', '|u1'),
+     ('rsp_tout', '|u1'),
+     ('format_error', '|u1'),
+     ('bus_id', 'S1'),
+     ('packet_version', '|u1'),
+     ('messages', h5py.special_dtype(vlen=np.dtype('<u2')))])
+
+
+# Time index of Video Format 0 transport stream packets...
+_VIDEO_INDEX_DTYPE = np.dtype([('time', '<i8'), ('row', '<i8')])
+
+
+def _ins_records(data):
+    """Convert aircraft INS data frame into a NumPy structured array.
+
+    The array has the same layout as the ``/derived/aircraft_ins`` dataset.
+    """
+    dtype = [('time', '<i8')] + [(n, data[n].dtype.str) for n in data.columns]
+    recs = np.empty((len(data),), dtype=dtype)
+    recs['time'] = data.index.values.astype('<i8')
+    for n in data.columns:
+        recs[n] = data[n].values
+    return recs
+
+
+def _records_frame(recs):
+    """Convert a NumPy structured array into a time-indexed data frame."""
+    data = pd.DataFrame(recs)
+    data = data.astype({'time': 'datetime64[ns]'})
+    data.set_index('time', inplace=True)
+    return data
+
+
+def _compact_columns(recs, float32=False):
+    """Copy a NumPy structured array into contiguous columns.
+
+    Floating-point columns are downcast to ``float32`` if ``float32`` is
+    ``True``.
+    """
+    cols = dict()
+    for n in recs.dtype.names:
+        dtype = recs.dtype[n]
+        if float32 and n != 'time' and dtype.kind == 'f':
+            dtype = np.dtype('<f4')
+        cols[n] = np.ascontiguousarray(recs[n], dtype=dtype)
+    return cols
+
+
+def _columns_frame(cols):
+    """Time-indexed data frame backed by compact columns (no copies)."""
+    index = pd.DatetimeIndex(cols['time'].view('datetime64[ns]'), name='time',
+                             copy=False)
+    return pd.DataFrame({n: c for n, c in cols.items() if n != 'time'},
+                        index=index, copy=False)
+
+
+def _data_nbytes(data):
+    """Memory used by flight segment data in either representation."""
+    if data is None:
+        return 0
+    elif isinstance(data, dict):
+        return sum(c.nbytes for c in data.values())
+    return int(data.memory_usage(index=True, deep=False).sum())
 
-    return (flight_expr, data_expr)
+
+class _Buffer:
+    """Memory budget token of one flight data buffer."""
+
+    __slots__ = ('nbytes', '__weakref__')
+
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+class _MemoryBudget:
+    """Flight segment data in memory, least recently used first.
+
+    Data are tracked per buffer. A buffer is shared by the compact mode
+    segments made from one another with ``filter``; its memory is counted
+    once and evicting it drops the data of all those segments.
+    """
+
+    def __init__(self):
+        self.limit = None
+        self._buffers = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def token(data):
+        """New buffer token for loaded data."""
+        return _Buffer(_data_nbytes(data))
+
+    def add(self, seg, buf=None):
+        """Track segment's data, in the given or a new buffer."""
+        if seg._data is None:
+            return
+        if buf is None:
+            buf = self.token(seg._data)
+        with self._lock:
+            self._buffers.setdefault(buf, weakref.WeakSet()).add(seg)
+            self._buffers.move_to_end(buf)
+            seg._buf = buf
+            self._evict(buf)
+
+    def touch(self, buf):
+        """Mark buffer as most recently used."""
+        with self._lock:
+            if buf in self._buffers:
+                self._buffers.move_to_end(buf)
+
+    def _prune(self):
+        """Forget buffers no longer used by any segment."""
+        for buf, segs in list(self._buffers.items()):
+            if not any(s._buf is buf for s in segs):
+                del self._buffers[buf]
+
+    def usage(self):
+        """Bytes of flight segment data in memory."""
+        with self._lock:
+            self._prune()
+            return sum(buf.nbytes for buf in self._buffers)
+
+    def _evict(self, keep):
+        """Drop least recently used buffers until within the limit."""
+        self._prune()
+        if self.limit is None:
+            return
+        used = sum(buf.nbytes for buf in self._buffers)
+        for buf in list(self._buffers):
+            if used <= self.limit:
+                break
+            if buf is keep:
+                continue
+            for seg in list(self._buffers.pop(buf)):
+                if seg._buf is buf:
+                    seg._unload()
+            used -= buf.nbytes
+
+
+_memory = _MemoryBudget()
+
+
+def set_memory_budget(nbytes):
+    """Limit memory of flight segment data in this process.
+
+    When loading flight segment data goes over the limit, the least recently
+    used data of other flight segments are dropped. Dropped data are read from
+    the FIREfly HDF5 file again when needed.
+
+    Parameters
+    ----------
+    nbytes : int or None
+        Memory limit in bytes. ``None`` means no limit (the default).
+    """
+    if nbytes is not None and nbytes < 0:
+        raise ValueError(f'{nbytes}: Invalid memory budget')
+    with _memory._lock:
+        _memory.limit = nbytes
+        _memory._evict(None)
+
+
+def memory_usage():
+    """Bytes of flight segment data currently in memory."""
+    return _memory.usage()
+
+
+# Highest web map zoom level for flight track simplification...
+_MAX_ZOOM = 20
+
+
+def _pixel_degrees(zoom):
+    """Size in degrees of one web map (256-pixel tiles) pixel at the equator."""
+    return 360. / (256 * 2 ** zoom)
+
+
+def _print_progress(nchunks, total, nbytes, seconds):
+    """Print chunk download progress and throughput on one line."""
+    rate = nbytes / 1e6 / seconds if seconds > 0 else 0.
+    print(f'\rDownloaded {nchunks}/{total} chunks, {nbytes / 1e6:.1f} MB '
+          f'({rate:.1f} MB/s)', end='', flush=True)
+
+
+def _arrow_batch(cols, names):
+    """Make an Arrow record batch from NumPy arrays.
+
+    Parameters
+    ----------
+    cols : numpy structured array or dict
+        Column data, accessed by column name.
+    names : sequence of str
+        Column names in their output order.
+
+    Returns
+    -------
+    pyarrow.RecordBatch
+        ``time`` column becomes UTC timestamps, fixed-length byte strings
+        become strings, and variable-length arrays become lists.
+    """
+    arrays = list()
+    for n in names:
+        col = np.ascontiguousarray(cols[n])
+        if n == 'time':
+            arr = pa.array(col.view('datetime64[ns]'),
+                           type=pa.timestamp('ns', tz='UTC'))
+        elif col.dtype.kind == 'S':
+            arr = pa.array(np.char.decode(col, 'ascii'), type=pa.string())
+        elif col.dtype.kind == 'O':
+            # Variable-length data: one flat values buffer plus offsets...
+            offsets = np.zeros((col.shape[0] + 1,), dtype='<i4')
+            np.cumsum([v.shape[0] for v in col], out=offsets[1:])
+            values = (np.concatenate(col) if col.shape[0]
+                      else np.empty((0,), dtype='<u2'))
+            arr = pa.ListArray.from_arrays(pa.array(offsets), pa.array(values))
+        else:
+            arr = pa.array(col)
+        arrays.append(arr)
+    return pa.RecordBatch.from_arrays(arrays, names=list(names))
 
 
 def filter_builder(qparams):
@@ -726,23 +1624,10 @@ def filter_builder(qparams):
     -------
     tuple
         A tuple with the domain and data filter statements as strings.
+
+    See Also
+    --------
+    firefly.query.plan_query : The query plan behind the statements.
     """
-    domain_query = ''
-    data_query = ''
-    for arg_name in ('aircraft', 'tail'):
-        dom_expr = _make_expr_str(arg_name, qparams.pop(arg_name, None))
-        domain_query = ' AND '.join(filter(bool, [domain_query, dom_expr]))
-
-    for arg_name in ('altitude', 'latitude', 'longitude', 'speed'):
-        dom_expr, data_expr = _make_expr_float(arg_name,
-                                               qparams.pop(arg_name, None))
-        domain_query = ' AND '.join(filter(bool, [domain_query, dom_expr]))
-        data_query = ' and '.join(filter(bool, [data_query, data_expr]))
-
-    for arg_name in ('time',):
-        dom_expr, data_expr = _make_expr_time(arg_name,
-                                              qparams.pop(arg_name, None))
-        domain_query = ' AND '.join(filter(bool, [domain_query, dom_expr]))
-        data_query = ' and '.join(filter(bool, [data_query, data_expr]))
-
-    return domain_query, data_query
+    plan = plan_query(qparams)
+    return plan.domain_query, str(plan.data_filter)
@@ -0,0 +1,350 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .segment import FlightSegment
+from .util import great_circle_distance
+
+# Great circle kilometers in one degree (Earth radius 6371 km)...
+_KM_PER_DEGREE = 6371. * np.pi / 180.
+
+
+def point_in_polygon(lat, lon, poly_lat, poly_lon):
+    """Test which points are inside a polygon (even-odd rule).
+
+    Parameters
+    ----------
+    lat, lon : numpy array
+        Point coordinates in degrees.
+    poly_lat, poly_lon : sequence of float
+        Polygon vertices in degrees. The polygon is closed automatically.
+
+    Returns
+    -------
+    numpy array
+        Boolean array, ``True`` for points inside the polygon.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    py = np.asarray(poly_lat, dtype=float)
+    px = np.asarray(poly_lon, dtype=float)
+    inside = np.zeros(lat.shape, dtype=bool)
+    for y0, x0, y1, x1 in zip(py, px, np.roll(py, -1), np.roll(px, -1)):
+        # Edges crossing the point's latitude, left of the point...
+        crosses = (y0 > lat) != (y1 > lat)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = x0 + (lat - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= crosses & (lon < x)
+    return inside
+
+
+def _segments_cross(ay0, ax0, ay1, ax1, by0, bx0, by1, bx1):
+    """Test whether line segments ``a`` cross segments ``b`` (broadcast)."""
+    def side(py, px, qy, qx, ry, rx):
+        return np.sign((qx - px) * (ry - py) - (qy - py) * (rx - px))
+
+    return ((side(ay0, ax0, ay1, ax1, by0, bx0)
+             != side(ay0, ax0, ay1, ax1, by1, bx1))
+            & (side(by0, bx0, by1, bx1, ay0, ax0)
+               != side(by0, bx0, by1, bx1, ay1, ax1)))
+
+
+def _str_order(boxes, node_size):
+    """Sort-Tile-Recursive order of boxes (north, south, east, west)."""
+    n = len(boxes)
+    nslices = int(np.ceil(np.sqrt(np.ceil(n / node_size))))
+    lon = 0.5 * (boxes[:, 2] + boxes[:, 3])
+    lat = 0.5 * (boxes[:, 0] + boxes[:, 1])
+    by_lon = np.argsort(lon, kind='stable')
+    slice_no = np.empty(n, dtype=np.int64)
+    slice_no[by_lon] = np.arange(n) // (nslices * node_size)
+    return np.lexsort((lat, slice_no))
+
+
+class BBoxIndex:
+    """R-tree of flight bounding boxes for spatial flight queries.
+
+    The tree is packed with the Sort-Tile-Recursive algorithm and searched
+    one level at a time with vectorized box tests. Longitudes are assumed
+    not to cross the antimeridian.
+    """
+
+    def __init__(self, names, north, south, east, west, node_size=16):
+        """
+        Parameters
+        ----------
+        names : sequence of str
+            Flight domain names.
+        north, south, east, west : sequence of float
+            Bounding box of each flight in degrees.
+        node_size : int, optional
+            Maximal number of children of a tree node. Default is 16.
+        """
+        if node_size < 2:
+            raise ValueError(f'{node_size}: Invalid node size')
+        boxes = np.column_stack([np.asarray(v, dtype=float).reshape(-1)
+                                 for v in (north, south, east, west)])
+        keep = np.all(np.isfinite(boxes), axis=1)
+        self._names = np.asarray(names, dtype=object)[keep]
+        boxes = boxes[keep]
+        self._node_size = node_size
+        self._leaf_of = None
+
+        # Leaves, then parent levels up to the root...
+        order = _str_order(boxes, node_size) if len(boxes) else np.empty(
+            (0,), dtype=np.int64)
+        self._ids = order
+        self._levels = [(boxes[order], None)]
+        while len(self._levels[-1][0]) > node_size:
+            below = self._levels[-1][0]
+            starts = np.arange(0, len(below), node_size)
+            parents = np.column_stack(
+                [np.maximum.reduceat(below[:, 0], starts),
+                 np.minimum.reduceat(below[:, 1], starts),
+                 np.maximum.reduceat(below[:, 2], starts),
+                 np.minimum.reduceat(below[:, 3], starts)])
+            order = _str_order(parents, node_size)
+            self._levels.append((parents[order], starts[order]))
+
+    @classmethod
+    def from_catalog(cls, catalog, **kwargs):
+        """Index the bounding boxes of all flights in a flight catalog.
+
+        The boxes come from the ``max_lat``/``min_lat``/``max_lon``/
+        ``min_lon`` (or ``max_latitude``, etc.) summary attributes.
+
+        Parameters
+        ----------
+        catalog : firefly.catalog.FlightCatalog
+            Flight catalog.
+        kwargs : dict
+            Other arguments for the class constructor.
+        """
+        rows = catalog._db.execute(
+            'SELECT domain, '
+            'COALESCE(max_lat, max_latitude), '
+            'COALESCE(min_lat, min_latitude), '
+            'COALESCE(max_lon, max_longitude), '
+            'COALESCE(min_lon, min_longitude) FROM flights').fetchall()
+        if not rows:
+            return cls([], [], [], [], [], **kwargs)
+        names, n, s, e, w = zip(*rows)
+        to_float = [np.array(v, dtype=float) for v in (n, s, e, w)]
+        return cls(names, *to_float, **kwargs)
+
+    @classmethod
+    def from_segments(cls, segments, **kwargs):
+        """Index the bounding boxes of flight segments.
+
+        Parameters
+        ----------
+        segments : sequence of firefly.FlightSegment
+            Flight segments, named by their domain.
+        kwargs : dict
+            Other arguments for the class constructor.
+        """
+        names = list()
+        boxes = list()
+        for seg in segments:
+            names.append(seg._domain.filename)
+            bbox = seg.bbox
+            boxes.append((bbox.north_lat, bbox.south_lat, bbox.east_lon,
+                          bbox.west_lon))
+        boxes = np.array(boxes, dtype=float).reshape(-1, 4)
+        return cls(names, *boxes.T, **kwargs)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return (f'<{type(self).__name__} with {len(self)} flight(s), '
+                f'{len(self._levels)} level(s) at 0x{id(self):x}>')
+
+    def bounds(self, names):
+        """Bounding boxes of flights.
+
+        Parameters
+        ----------
+        names : sequence of str
+            Flight domain names.
+
+        Returns
+        -------
+        numpy array
+            Shape ``(len(names), 4)``: north, south, east, west in degrees,
+            NaN for flights not in the index.
+        """
+        if self._leaf_of is None:
+            self._leaf_of = dict(zip(self._names[self._ids].tolist(),
+                                     range(len(self._ids))))
+        boxes = np.vstack([self._levels[0][0],
+                           np.full((1, 4), np.nan)])
+        leaves = [self._leaf_of.get(n, -1) for n in names]
+        return boxes[np.asarray(leaves, dtype=np.int64).reshape(-1)]
+
+    def _search(self, north, south, east, west):
+        """Positions in the leaf level of boxes intersecting a box."""
+        def hits(boxes, nodes):
+            b = boxes[nodes]
+            return nodes[(b[:, 1] <= north) & (b[:, 0] >= south)
+                         & (b[:, 3] <= east) & (b[:, 2] >= west)]
+
+        boxes, starts = self._levels[-1]
+        nodes = hits(boxes, np.arange(len(boxes)))
+        for level in range(len(self._levels) - 1, 0, -1):
+            nbelow = len(self._levels[level - 1][0])
+            first = starts[nodes]
+            # Children of the hit nodes...
+            child = (first[:, np.newaxis]
+                     + np.arange(self._node_size)).reshape(-1)
+            child = child[child < nbelow]
+            boxes, starts = self._levels[level - 1]
+            nodes = hits(boxes, child)
+        return nodes
+
+    def intersecting(self, north, south, east, west):
+        """Flights whose bounding box intersects a box.
+
+        Parameters
+        ----------
+        north, south, east, west : float
+            Box edges in degrees.
+
+        Returns
+        -------
+        list of str
+            Sorted flight domain names.
+        """
+        return sorted(self._names[self._ids[
+            self._search(north, south, east, west)]])
+
+    def in_polygon(self, lat, lon):
+        """Flights whose bounding box intersects a polygon.
+
+        Parameters
+        ----------
+        lat, lon : sequence of float
+            Polygon vertices in degrees.
+
+        Returns
+        -------
+        list of str
+            Sorted flight domain names.
+        """
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        leaves = self._search(lat.max(), lat.min(), lon.max(), lon.min())
+        b = self._levels[0][0][leaves]
+        n, s, e, w = (b[:, i, np.newaxis] for i in range(4))
+
+        # Polygon vertex in a box, box corner in the polygon, or crossing
+        # edges...
+        hit = np.any((lat >= s) & (lat <= n) & (lon >= w) & (lon <= e),
+                     axis=1)
+        corners = np.column_stack([point_in_polygon(y, x, lat, lon)
+                                   for y, x in ((b[:, 0], b[:, 2]),
+                                                (b[:, 0], b[:, 3]),
+                                                (b[:, 1], b[:, 2]),
+                                                (b[:, 1], b[:, 3]))])
+        hit |= corners.any(axis=1)
+        lat1, lon1 = np.roll(lat, -1), np.roll(lon, -1)
+        for y0, x0, y1, x1 in ((n, w, n, e), (s, w, s, e), (s, w, n, w),
+                               (s, e, n, e)):
+            hit |= np.any(_segments_cross(y0, x0, y1, x1, lat, lon, lat1,
+                                          lon1), axis=1)
+        return sorted(self._names[self._ids[leaves[hit]]])
+
+    def near(self, lat, lon, km):
+        """Flights whose bounding box comes within a distance of a point.
+
+        Parameters
+        ----------
+        lat, lon : float
+            Point location in degrees.
+        km : float
+            Distance in kilometers.
+
+        Returns
+        -------
+        list of str
+            Sorted flight domain names.
+        """
+        dlat = km / _KM_PER_DEGREE
+        # Longitude degrees are shortest at the highest latitude in reach...
+        coslat = np.cos(np.radians(min(abs(lat) + dlat, 90.)))
+        dlon = 180. if coslat < 1e-9 else min(dlat / coslat, 180.)
+        return self.intersecting(lat + dlat, lat - dlat, lon + dlon,
+                                 lon - dlon)
+
+
+def track_in_polygon(segment, lat, lon):
+    """Test whether a flight segment's track enters a polygon.
+
+    Parameters
+    ----------
+    segment : firefly.FlightSegment
+        Flight segment.
+    lat, lon : sequence of float
+        Polygon vertices in degrees.
+
+    Returns
+    -------
+    bool
+    """
+    flight = segment._flight
+    return bool(point_in_polygon(flight['latitude'].values,
+                                 flight['longitude'].values, lat, lon).any())
+
+
+def track_near(segment, lat, lon, km):
+    """Test whether a flight segment's track comes within a distance of a
+    point.
+
+    Parameters
+    ----------
+    segment : firefly.FlightSegment
+        Flight segment.
+    lat, lon : float
+        Point location in degrees.
+    km : float
+        Distance in kilometers.
+
+    Returns
+    -------
+    bool
+    """
+    flight = segment._flight
+    dist = great_circle_distance(flight['latitude'].values,
+                                 flight['longitude'].values, lat, lon)
+    return bool(np.any(dist <= km))
+
+
+def refine(domains, test, *args, max_workers=8, **kwargs):
+    """Keep the flights whose track passes a test.
+
+    Use it to drop the false positives of bounding box queries, e.g.
+    ``refine(index.near(35, -117, 50), track_near, 35, -117, 50)``.
+
+    Parameters
+    ----------
+    domains : sequence of str
+        Flight domain names.
+    test : callable
+        Called with a :class:`firefly.FlightSegment` and ``args``, e.g.
+        :func:`track_in_polygon` or :func:`track_near`.
+    args : tuple
+        Other arguments for ``test``.
+    max_workers : int, optional
+        Number of flights read concurrently. Default is 8.
+    kwargs : dict
+        Any other named argument is passed to the ``h5pyd.File`` class.
+
+    Returns
+    -------
+    list of str
+        Flight domain names that passed the test, in the input order.
+    """
+    def passes(domain):
+        with FlightSegment(domain, 'r', **kwargs) as flight:
+            return test(flight, *args)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return [d for d, ok in zip(domains, pool.map(passes, domains)) if ok]
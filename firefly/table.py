@@ -0,0 +1,273 @@
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import h5pyd
+
+lggr = logging.getLogger(__name__)
+
+
+def _read_rows(dset, sel, names):
+    """Read rows of a compound dataset, only the named fields if possible."""
+    if names is None:
+        return dset[sel]
+    if hasattr(dset, 'fields'):
+        # Read only the projected fields...
+        return dset.fields(list(names))[sel]
+    return dset[sel][list(names)]
+
+
+class FlightTable:
+    """One logical table of a dataset from many flights, read on demand.
+
+    Rows of all flights follow each other in flight order. An offset table
+    of the flights' first rows maps table row numbers to flight rows, so
+    rows are read from the flights only when asked for. The ``flight``
+    column is categorical with the flight domain names as categories.
+    """
+
+    def __init__(self, domains, path='/derived/aircraft_ins', columns=None,
+                 max_workers=8, max_open=16, **kwargs):
+        """
+        Parameters
+        ----------
+        domains : sequence of str
+            Flight domain names.
+        path : str, optional
+            HDF5 path name of the compound dataset in every flight. Default
+            is ``'/derived/aircraft_ins'``.
+        columns : sequence of str, optional
+            Dataset fields to read. Default is all fields.
+        max_workers : int, optional
+            Number of concurrent requests for the flights' dataset sizes.
+            Default is 8.
+        max_open : int, optional
+            Number of flight domains kept open for row access. Default is 16.
+        kwargs : dict
+            Any other named argument is passed to the ``h5pyd.File`` class.
+        """
+        self._domains = list(domains)
+        self._path = path
+        self._kwargs = kwargs
+        self._max_open = max_open
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+        def size(domain):
+            try:
+                with h5pyd.File(domain, 'r', **kwargs) as f:
+                    dset = f[path]
+                    return dset.shape[0], dset.dtype
+            except (IOError, KeyError) as e:
+                lggr.warning(f'{domain}: No {path} dataset: {e}')
+                return 0, None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            sizes = list(pool.map(size, self._domains))
+        dtype = next((dt for _, dt in sizes if dt is not None), None)
+        self._offsets = np.concatenate(
+            [[0], np.cumsum([n for n, _ in sizes], dtype=np.int64)])
+        fields = list(dtype.names) if dtype is not None else list()
+        if columns is not None:
+            unknown = set(columns) - set(fields)
+            if unknown and fields:
+                raise KeyError(f'{", ".join(sorted(unknown))}: Not in '
+                               f'{path}')
+        self._fields = fields
+        self._columns = None if columns is None else list(columns)
+
+    @classmethod
+    def _view(cls, table, columns):
+        """Table sharing another table's offsets, with other columns."""
+        view = cls.__new__(cls)
+        view.__dict__.update(table.__dict__)
+        view._columns = list(columns)
+        view._open = OrderedDict()
+        view._lock = threading.Lock()
+        return view
+
+    def __repr__(self):
+        return (f'<{type(self).__name__} {len(self)} row(s) x '
+                f'{len(self.columns)} column(s) from {len(self._domains)} '
+                f'flight(s) at 0x{id(self):x}>')
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the open flight domains."""
+        with self._lock:
+            for f in self._open.values():
+                f.close()
+            self._open.clear()
+
+    @property
+    def flights(self):
+        """Flight domain names, the ``flight`` column categories."""
+        return list(self._domains)
+
+    @property
+    def offsets(self):
+        """Table row number of each flight's first row, and the number of
+        rows at the end."""
+        return self._offsets.copy()
+
+    @property
+    def columns(self):
+        """Column names, without ``flight``."""
+        return list(self._fields if self._columns is None else self._columns)
+
+    def __getitem__(self, key):
+        """Column projection with a column name or list of names, rows with
+        an integer, slice, or integer array."""
+        if isinstance(key, str):
+            key = [key]
+        if (isinstance(key, (list, tuple)) and key
+                and all(isinstance(k, str) for k in key)):
+            unknown = set(key) - set(self._fields)
+            if unknown:
+                raise KeyError(f'{", ".join(sorted(unknown))}: No such '
+                               f'column')
+            return self._view(self, key)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self.read(start, stop)
+            return self.take(np.arange(start, stop, step))
+        if np.ndim(key) == 0:
+            i = int(key)
+            if i < 0:
+                i += len(self)
+            return self.take([i]).iloc[0]
+        return self.take(key)
+
+    def _dset(self, flight):
+        """Dataset of a flight, from the pool of open flight domains."""
+        with self._lock:
+            f = self._open.pop(flight, None)
+            if f is None:
+                f = h5pyd.File(self._domains[flight], 'r', **self._kwargs)
+            self._open[flight] = f
+            while len(self._open) > self._max_open:
+                self._open.popitem(last=False)[1].close()
+        return f[self._path]
+
+    def _frame(self, flight, recs):
+        """Data frame of one flight's records, with the ``flight`` column."""
+        data = {'flight': pd.Categorical.from_codes(
+            np.full(len(recs), flight, dtype=np.int32),
+            categories=self._domains)}
+        for name in recs.dtype.names:
+            col = recs[name]
+            if name == 'time':
+                col = col.astype('datetime64[ns]')
+            data[name] = col
+        return pd.DataFrame(data)
+
+    def _empty(self):
+        cols = {'flight': pd.Categorical([], categories=self._domains)}
+        cols.update((c, []) for c in self.columns)
+        return pd.DataFrame(cols)
+
+    def _locate(self, rows):
+        """Flight numbers and flight rows of table rows."""
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        if rows.size and (rows.min() < 0 or rows.max() >= len(self)):
+            raise IndexError('Table row number out of range')
+        flight = np.searchsorted(self._offsets, rows, 'right') - 1
+        return flight, rows - self._offsets[flight]
+
+    def read(self, start=0, stop=None):
+        """Read consecutive table rows into a data frame.
+
+        Parameters
+        ----------
+        start, stop : int, optional
+            Table row range. Default is the whole table.
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        if stop <= start:
+            return self._empty()
+        frames = list()
+        first = np.searchsorted(self._offsets, start, 'right') - 1
+        last = np.searchsorted(self._offsets, stop - 1, 'right') - 1
+        for i in range(first, last + 1):
+            lo = max(start, self._offsets[i]) - self._offsets[i]
+            hi = min(stop, self._offsets[i + 1]) - self._offsets[i]
+            if hi > lo:
+                recs = _read_rows(self._dset(i), slice(int(lo), int(hi)),
+                                  self._columns)
+                frames.append(self._frame(i, recs))
+        return pd.concat(frames, ignore_index=True)
+
+    def take(self, rows):
+        """Read table rows in any order into a data frame.
+
+        Rows are grouped by flight and each flight is read with one point
+        selection.
+
+        Parameters
+        ----------
+        rows : sequence of int
+            Table row numbers.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Rows in the requested order, with a default index.
+        """
+        flight, local = self._locate(rows)
+        if flight.size == 0:
+            return self._empty()
+        frames = list()
+        positions = list()
+        for i in np.unique(flight):
+            pos = np.flatnonzero(flight == i)
+            uniq, inverse = np.unique(local[pos], return_inverse=True)
+            recs = _read_rows(self._dset(int(i)), uniq.tolist(),
+                              self._columns)
+            frames.append(self._frame(int(i), recs[inverse]))
+            positions.append(pos)
+        data = pd.concat(frames, ignore_index=True)
+        order = np.argsort(np.concatenate(positions), kind='stable')
+        return data.iloc[order].reset_index(drop=True)
+
+    def iter_chunks(self, chunk_rows=100_000):
+        """Iterate over the table in chunks of rows.
+
+        Chunks do not span flights, so memory use is bounded by
+        ``chunk_rows`` regardless of the number of flights.
+
+        Parameters
+        ----------
+        chunk_rows : int, optional
+            Maximal number of rows per chunk. Default is 100,000.
+
+        Yields
+        ------
+        pandas.DataFrame
+        """
+        if chunk_rows < 1:
+            raise ValueError(f'{chunk_rows}: Invalid chunk size')
+        for i in range(len(self._domains)):
+            nrows = int(self._offsets[i + 1] - self._offsets[i])
+            if not nrows:
+                continue
+            dset = self._dset(i)
+            for lo in range(0, nrows, chunk_rows):
+                recs = _read_rows(dset, slice(lo, min(lo + chunk_rows,
+                                                      nrows)),
+                                  self._columns)
+                yield self._frame(i, recs)
@@ -40,6 +40,92 @@ def great_circle_distance(from_lat, from_lon, to_lat, to_lon):
     return dist
 
 
+def track_significance(lat, lon, min_tolerance=0.):
+    """Rank flight track points for Douglas-Peucker line simplification.
+
+    The Douglas-Peucker algorithm is run once, with all track segments at the
+    same recursion depth processed together. Each point gets the largest
+    simplification tolerance at which Douglas-Peucker would still keep it, so
+    the simplified track for any tolerance is just ``significance >
+    tolerance``. Distances are computed in the equirectangular projection
+    centered on the track's mean latitude.
+
+    Parameters
+    ----------
+    lat : numpy array
+        Track latitude in degrees.
+    lon : numpy array
+        Track longitude in degrees. Must be the same shape as ``lat``.
+    min_tolerance : float, optional
+        Segments are not split further when no point deviates more than this
+        many degrees from them. Their inner points get zero significance.
+        Default is 0.
+
+    Returns
+    -------
+    numpy array
+        Significance of each track point in degrees. The first and last points
+        and points with a non-finite latitude or longitude are always
+        ``inf``; the other points are ranked without them.
+    """
+    lat = np.asarray(lat, dtype='f8')
+    lon = np.asarray(lon, dtype='f8')
+    finite = np.isfinite(lat) & np.isfinite(lon)
+    if not finite.all():
+        sig = np.full(lat.shape, np.inf)
+        sig[finite] = track_significance(lat[finite], lon[finite],
+                                         min_tolerance=min_tolerance)
+        return sig
+    n = lat.shape[0]
+    sig = np.zeros((n,), dtype='f8')
+    if n == 0:
+        return sig
+    sig[[0, -1]] = np.inf
+    x = (lon - lon[0]) * np.cos(np.radians(np.nanmean(lat)))
+    y = lat
+
+    # Track segments to split with their ancestors' smallest deviation...
+    start = np.array([0])
+    end = np.array([n - 1])
+    parent = np.array([np.inf])
+    while start.size:
+        inner = end - start - 1
+        m = inner > 0
+        start, end, parent, inner = start[m], end[m], parent[m], inner[m]
+        if start.size == 0:
+            break
+
+        # Distance of all inner points from their segment's chord...
+        seg = np.repeat(np.arange(start.size), inner)
+        first = np.cumsum(inner) - inner
+        idx = np.repeat(start + 1, inner) + np.arange(inner.sum()) - first[seg]
+        x0 = x[start][seg]
+        y0 = y[start][seg]
+        dx = x[end][seg] - x0
+        dy = y[end][seg] - y0
+        px = x[idx] - x0
+        py = y[idx] - y0
+        norm = np.hypot(dx, dy)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dist = np.where(norm > 0, np.abs(dy * px - dx * py) / norm,
+                            np.hypot(px, py))
+
+        # Farthest point of each segment...
+        dmax = np.maximum.reduceat(dist, first)
+        at_max = np.flatnonzero(dist == dmax[seg])
+        _, pos = np.unique(seg[at_max], return_index=True)
+        far = idx[at_max[pos]]
+
+        split = dmax > min_tolerance
+        far = far[split]
+        level = np.minimum(dmax[split], parent[split])
+        sig[far] = level
+        start, end = (np.concatenate((start[split], far)),
+                      np.concatenate((far, end[split])))
+        parent = np.concatenate((level, level))
+    return sig
+
+
 def nearest_airport(speed, lat, lon):
     """Find nearest takeoff and landing military airports based on flight data.
 
@@ -82,23 +168,106 @@ def nearest_airport(speed, lat, lon):
         'landing': f"{landing_loc['SITE_NAME']}, {landing_loc['STATE_TERR']}"}
 
 
-def aircraft_6dof(ch11_data):
-    """Compute aircraft location, 6DoF, and related parameters.
+# Registered 1553 message decoders: name -> (word layout dtype, converter)...
+MIL1553_DECODERS = dict()
+
+
+def register_1553_decoder(name, word_dtype, convert):
+    """Register a decoder of 1553 message data words into engineering units.
 
     Parameters
     ----------
-    ch11_data : numpy structured array
-        Numpy structured array with input Chapter 11 data. The assumption is
-        that any bad packet messages were removed prior to calling this
-        function.
+    name : str
+        Decoder name.
+    word_dtype : numpy.dtype
+        NumPy structured datatype describing the layout of one message's data
+        words. Its size must be a multiple of two bytes.
+    convert : callable
+        Called with a NumPy array of ``word_dtype`` elements and must return a
+        dict of parameter names and their engineering unit values as NumPy
+        arrays, computed for all messages at once.
+    """
+    word_dtype = np.dtype(word_dtype)
+    if word_dtype.itemsize % 2:
+        raise ValueError(f'{name}: 1553 word layout must be whole words long')
+    MIL1553_DECODERS[name] = (word_dtype, convert)
+
+
+def mil1553_words(messages, nwords=None):
+    """Flatten 1553 message data words into a two-dimensional array.
+
+    Parameters
+    ----------
+    messages : numpy array
+        One-dimensional object array of ``uint16`` arrays, e.g. the
+        ``messages`` field of 1553 Chapter 11 data.
+    nwords : int, optional
+        Number of array columns. Default is the length of the longest message.
+        Longer messages are truncated.
+
+    Returns
+    -------
+    numpy array
+        A ``uint16`` array with one message per row. Messages shorter than
+        ``nwords`` are padded with zeros.
+    """
+    n = messages.shape[0]
+    lengths = np.fromiter(map(len, messages), dtype='i8', count=n)
+    flat = (np.concatenate(messages).astype('<u2', copy=False) if n
+            else np.empty((0,), dtype='<u2'))
+    maxlen = int(lengths.max()) if n else 0
+    if nwords is None:
+        nwords = maxlen
+    if n and lengths.min() == maxlen == nwords:
+        # All messages have the same length...
+        return flat.reshape(n, nwords)
+    cols = np.arange(max(maxlen, nwords))
+    words = np.zeros((n, cols.size), dtype='<u2')
+    words[cols < lengths[:, np.newaxis]] = flat
+    return words[:, :nwords]
+
+
+def decode_1553(words, decoder, time=None):
+    """Convert 1553 message data words into engineering units.
+
+    Parameters
+    ----------
+    words : numpy array
+        Two-dimensional ``uint16`` array with one message per row.
+    decoder : str
+        Name of a registered decoder. See :func:`register_1553_decoder`.
+    time : numpy array, optional
+        Message times. If given, stored in the output ``time`` field.
 
     Returns
     -------
     numpy structured array
-        The array fields are the computed parameters.
+        One element per message with the decoder's parameters as fields.
     """
-    # Define a NumPy structured array datatype for 6-DOF 1553 message words...
-    ins_dt = np.dtype([('status', '<u2'),
+    word_dtype, convert = MIL1553_DECODERS[decoder]
+    nwords = word_dtype.itemsize // 2
+    if words.shape[0] == 0:
+        # No messages, so no message length to check...
+        words = np.empty((0, nwords), dtype='<u2')
+    if words.shape[1] < nwords:
+        raise ValueError(f'{decoder}: Messages shorter than {nwords} words')
+    msgs = np.ascontiguousarray(words[:, :nwords], dtype='<u2')
+    eu = convert(msgs.view(word_dtype).reshape(words.shape[0]))
+
+    fields = list()
+    if time is not None:
+        fields.append(('time', time.dtype))
+    fields.extend((n, v.dtype) for n, v in eu.items())
+    param = np.empty((words.shape[0],), dtype=fields)
+    if time is not None:
+        param['time'] = time
+    for n, v in eu.items():
+        param[n] = v
+    return param
+
+
+# NumPy structured array datatype for 6-DOF 1553 message words...
+_INS_DTYPE = np.dtype([('status', '<u2'),
                        ('time_tag', '<u2'),
                        ('vx_msw', '<i2'),
                        ('vx_lsw', '<u2'),
@@ -127,18 +296,11 @@ def aircraft_6dof(ch11_data):
                        ('tiltx', '<i2'),
                        ('tilty', '<i2'),
                        ('TBD', '<i2', (4,))])
-    assert ins_dt.itemsize == 64, '6-DOF numpy dtype must be 64 bytes long'
-
-    # Sort input Ch11 array based on message time...
-    idx = np.argsort(ch11_data['time'])
-    sort_data = ch11_data[idx]
+assert _INS_DTYPE.itemsize == 64, '6-DOF numpy dtype must be 64 bytes long'
 
-    # Concatenate all 1553 message words into one buffer then convert it into a
-    # NumPy structured array...
-    ins = np.frombuffer(b''.join([m.tobytes() for m in sort_data['messages']]),
-                        dtype=ins_dt)
 
-    # Convert to engineering units...
+def _ins_6dof(ins):
+    """Convert 6-DOF 1553 message words to engineering units."""
     lat = np.rad2deg(
         np.arcsin(
             np.bitwise_or(
@@ -169,25 +331,111 @@ def aircraft_6dof(ch11_data):
     speed = (900. / 6080.) * np.sqrt(np.square(ins['vx_msw'], dtype='f4') +
                                      np.square(ins['vy_msw'], dtype='f4'))
 
-    # Output Numpy structured array for computed parameters...
-    param_dt = np.dtype([('time', sort_data['time'].dtype),
-                         ('latitude', lat.dtype),
-                         ('longitude', lon.dtype),
-                         ('altitude', alt.dtype),
-                         ('speed', speed.dtype),
-                         ('heading', true_heading.dtype),
-                         ('roll', roll.dtype),
-                         ('pitch', pitch.dtype),
-                         ('g-force', acc.dtype)])
-    param = np.empty(sort_data['time'].shape, dtype=param_dt)
-    param['time'] = sort_data['time']
-    param['latitude'] = lat
-    param['longitude'] = lon
-    param['altitude'] = alt
-    param['speed'] = speed
-    param['heading'] = true_heading
-    param['roll'] = roll
-    param['pitch'] = pitch
-    param['g-force'] = acc
+    return {'latitude': lat,
+            'longitude': lon,
+            'altitude': alt,
+            'speed': speed,
+            'heading': true_heading,
+            'roll': roll,
+            'pitch': pitch,
+            'g-force': acc}
 
-    return param
+
+register_1553_decoder('ins_6dof', _INS_DTYPE, _ins_6dof)
+
+
+def aircraft_6dof(ch11_data):
+    """Compute aircraft location, 6DoF, and related parameters.
+
+    Parameters
+    ----------
+    ch11_data : numpy structured array
+        Numpy structured array with input Chapter 11 data. The assumption is
+        that any bad packet messages were removed prior to calling this
+        function.
+
+    Returns
+    -------
+    numpy structured array
+        The array fields are the computed parameters.
+    """
+    # Sort input Ch11 array based on message time...
+    idx = np.argsort(ch11_data['time'])
+    sort_data = ch11_data[idx]
+
+    # Concatenate all 1553 message words into one array then convert them
+    # into engineering units...
+    words = mil1553_words(sort_data['messages'])
+    return decode_1553(words, 'ins_6dof', time=sort_data['time'])
+
+
+# MPEG-2 transport stream constants...
+TS_PACKET_SIZE = 188
+_TS_SYNC_BYTE = 0x47
+_PTS_CLOCK = 90_000
+_PTS_WRAP = 2 ** 33
+
+
+def ts_video_pts(packets):
+    """Find video PES packet starts and their presentation time stamps.
+
+    Parameters
+    ----------
+    packets : numpy array
+        One-dimensional array of 188-byte MPEG-2 transport stream packets,
+        e.g. the opaque ``|V188`` elements of a Video Format 0 dataset.
+
+    Returns
+    -------
+    tuple
+        Positions in ``packets`` of transport stream packets starting a video
+        PES packet with a PTS, and their PTS values (90 kHz clock ticks, not
+        unwrapped) as ``int64`` arrays.
+    """
+    ts = np.frombuffer(np.ascontiguousarray(packets).tobytes(),
+                       dtype=np.uint8).reshape(-1, TS_PACKET_SIZE)
+    pusi = (ts[:, 0] == _TS_SYNC_BYTE) & (ts[:, 1] & 0x40 != 0)
+    afc = (ts[:, 3] >> 4) & 0x3
+    pusi &= afc & 0x1 != 0
+
+    # Payload starts after the adaptation field, when there is one...
+    start = np.where(afc & 0x2 != 0, 5 + ts[:, 4].astype(np.int64), 4)
+    pusi &= start + 14 <= TS_PACKET_SIZE
+    rows = np.flatnonzero(pusi)
+    start = start[rows]
+    pes = ts[rows[:, np.newaxis], start[:, np.newaxis] + np.arange(14)]
+
+    # PES start code, video stream ID, and the PTS flag...
+    is_video = ((pes[:, 0] == 0) & (pes[:, 1] == 0) & (pes[:, 2] == 1)
+                & (pes[:, 3] & 0xf0 == 0xe0) & (pes[:, 7] & 0x80 != 0))
+    rows = rows[is_video]
+    p = pes[is_video, 9:14].astype(np.int64)
+    pts = (((p[:, 0] >> 1) & 0x7) << 30 | p[:, 1] << 22 | (p[:, 2] >> 1) << 15
+           | p[:, 3] << 7 | p[:, 4] >> 1)
+    return rows.astype(np.int64), pts
+
+
+def pts_offsets(pts):
+    """Convert PTS values into nanoseconds since the first one.
+
+    The 33-bit PTS counter wraps around about every 26.5 hours; each wrap is
+    undone before conversion.
+
+    Parameters
+    ----------
+    pts : numpy array
+        PTS values in 90 kHz clock ticks, in stream order.
+
+    Returns
+    -------
+    numpy array
+        ``int64`` nanosecond offsets from the first PTS value.
+    """
+    pts = np.asarray(pts, dtype=np.int64)
+    if pts.size == 0:
+        return pts
+    step = np.diff(pts)
+    # Steps backwards by more than half the counter range are wraps...
+    step[step < -_PTS_WRAP // 2] += _PTS_WRAP
+    ticks = np.concatenate(([0], np.cumsum(step)))
+    return ticks * 1_000_000_000 // _PTS_CLOCK
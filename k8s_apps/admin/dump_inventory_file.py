@@ -1,4 +1,5 @@
 import h5pyd
+import time
 from datetime import datetime
 import tzlocal
 
@@ -24,5 +25,19 @@ for row in table:
         stop = formatTime(row[2])
     else:
         stop = 0
-    print(f"{filename}\t{start}\t{stop}")
+    if "lease" not in table.dtype.names:
+        # inventory without lease columns
+        print(f"{filename}\t{start}\t{stop}")
+        continue
+    if row["failed"]:
+        state = f"failed {formatTime(row['failed'])}"
+    elif row["done"]:
+        state = "done"
+    elif row["lease"] > time.time():
+        state = f"leased until {formatTime(row['lease'])}"
+    elif row["retry_at"] > time.time():
+        state = f"retry at {formatTime(row['retry_at'])}"
+    else:
+        state = "waiting"
+    print(f"{filename}\t{start}\t{stop}\t{row['attempts']}\t{state}")
 print(f"{table.nrows} rows")
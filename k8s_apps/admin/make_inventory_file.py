@@ -11,7 +11,13 @@ if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
 firefly_admin_pwd=sys.argv[1]
 
 f = h5pyd.File(inventory_domain, "x", username="firefly_admin", password=firefly_admin_pwd, bucket=HSDS_BUCKET)
-dt=[("filename", "S64"), ("start", "i8"), ("done", "i8")]
+# start/done: claim and completion times; lease: time the claiming pod's
+# lease expires; lease_id: claim token for renewing the lease; attempts:
+# number of claims; retry_at: earliest time for the next claim after a
+# failure; failed: time the file was given up on
+dt=[("filename", "S64"), ("start", "i8"), ("done", "i8"), ("lease", "i8"),
+    ("lease_id", "i8"), ("attempts", "i4"), ("retry_at", "i8"),
+    ("failed", "i8")]
 table = f.create_table("inventory", dtype=dt)
 
 # make public read, and get acl
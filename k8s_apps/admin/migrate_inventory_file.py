@@ -0,0 +1,39 @@
+import sys
+import numpy as np
+import h5pyd
+
+HSDS_BUCKET="firefly-hsds"
+inventory_domain = "/FIREfly/inventory.h5"
+
+# copy an inventory without lease columns into a new inventory table with
+# them; stop the ch10convert and ch10watchdog pods first
+
+if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
+    print("usage: python migrate_inventory_file.py <firefly_admin_password>")
+    sys.exit()
+
+firefly_admin_pwd=sys.argv[1]
+
+f = h5pyd.File(inventory_domain, "a", username="firefly_admin", password=firefly_admin_pwd, bucket=HSDS_BUCKET)
+old = f["inventory"]
+if "lease" in old.dtype.names:
+    print("inventory already has lease columns")
+    sys.exit()
+
+dt=[("filename", "S64"), ("start", "i8"), ("done", "i8"), ("lease", "i8"),
+    ("lease_id", "i8"), ("attempts", "i4"), ("retry_at", "i8"),
+    ("failed", "i8")]
+rows = old[:]
+arr = np.zeros(len(rows), dtype=dt)
+for name in ("filename", "start", "done"):
+    arr[name] = rows[name]
+# files claimed but not done were abandoned by the old converter
+arr["attempts"] = (arr["start"] != 0) & (arr["done"] == 0)
+
+f.move("inventory", "inventory_old")
+table = f.create_table("inventory", dtype=dt)
+if len(arr):
+    table.append(arr)
+f.close()
+
+print(f"migrated {len(arr)} rows, old rows kept in inventory_old")
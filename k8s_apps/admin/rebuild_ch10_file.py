@@ -22,6 +22,7 @@ if len(arr) == 0:
 
 row = arr[0]
 print(f"updating row: {row}")
-update_val = {"start": 0, "done": 0}
+update_val = {"start": 0, "done": 0, "lease": 0, "lease_id": 0,
+              "attempts": 0, "retry_at": 0, "failed": 0}
 table.update_where(condition, update_val, limit=1)
 print("table updated")
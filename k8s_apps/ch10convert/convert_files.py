@@ -1,8 +1,18 @@
+import h5py
 import h5pyd
+import importlib.util
 import logging
 import time
-import subprocess
 import os
+import random
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+import boto3
+from firefly.download import copy_domain
 
 HSDS_BUCKET="firefly-hsds"
 CH10_BUCKET="firefly-chap10"
@@ -10,106 +20,378 @@ CH10_BUCKET="firefly-chap10"
 inventory_domain = "/FIREfly/inventory.h5"
 output_folder = "/FIREfly/h5/"
 
+loglevel = logging.ERROR
 
-def convert_file(ch10_filename):
-    print("convert_file:", ch10_filename)
+# seconds a claimed file is leased to this pod; leases are renewed every
+# third of that while the file is converted and expired leases are reclaimed
+# by any pod
+lease_seconds = int(os.environ.get("LEASE_SECONDS", "900"))
+
+# conversion attempts before a file is marked as failed (poison file), and
+# the retry delay after the first failed attempt, doubled for every attempt
+max_attempts = int(os.environ.get("MAX_ATTEMPTS", "5"))
+retry_backoff = int(os.environ.get("RETRY_BACKOFF", "300"))
+max_retry_backoff = 6 * 3600
+
+# folder with the ch10-to-h5.py and derive-6dof.py scripts
+script_folder = os.environ.get("FIREFLY_SCRIPTS", "/usr/local/bin")
+
+# number of files converted concurrently, each in its own process
+max_workers = int(os.environ.get("CONVERT_WORKERS", os.cpu_count() or 1))
+
+# bytes of Ch10 files on local disk and estimated bytes of in-memory HDF5
+# files, summed over the files being converted; a file larger than the
+# limits is converted alone
+max_disk = int(os.environ.get(
+    "CONVERT_MAX_DISK", shutil.disk_usage(tempfile.gettempdir()).free // 2))
+max_memory = int(os.environ.get(
+    "CONVERT_MAX_MEMORY",
+    os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2))
+
+# in-memory HDF5 file size estimate per Ch10 file byte
+memory_factor = float(os.environ.get("CONVERT_MEMORY_FACTOR", "2"))
+
+# permissions of the default user on converted domains
+public_read_acl = {"userName": "default", "create": False, "read": True,
+                   "update": False, "delete": False, "readACL": False,
+                   "updateACL": False}
 
-    # extract aircraft type and tail number from filename
+
+def claim_condition(now):
+    """Query for files not done, not failed, and not leased, whose retry
+    time has come."""
+    return (f"(done == 0) & (failed == 0) & (lease < {now}) & "
+            f"(retry_at <= {now})")
+
+
+def load_script(name):
+    """Import a conversion script (file name with hyphens) as a module."""
+    path = os.path.join(script_folder, name + ".py")
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"),
+                                                  path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextmanager
+def stage(timings, name):
+    """Record the seconds spent in a conversion stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+def parse_filename(ch10_filename):
+    """Aircraft type and tail number from a Ch10 file name, or None."""
     base_name = ch10_filename[:-5]
     parts = base_name.split("-")
     if len(parts) < 3:
         print(f"unexpected filename (expected at least two hyphens): {ch10_filename}")
-        return False
-    aircraft_id = None
-    aircraft_type = None
-    if len(parts) >= 3:
-        aircraft_id = parts[-2]
-        aircraft_type = parts[0]
-        if len(parts) > 3:
-            # some type codes have a hyphen
-            aircraft_type += "-"
-            aircraft_type += parts[1]
-
-    # convert to hdf5
-    hdf5_filename = base_name + ".h5"
-    print(f"converting to hdf5 file: {hdf5_filename} with aircraft_type: {aircraft_type} and aircraft_id: {aircraft_id}")
-    convert_args = ["python", "/usr/local/bin/ch10-to-h5.py", "--outfile", hdf5_filename, "--aircraft-type", aircraft_type, "--aircraft-id", aircraft_id, ch10_filename ]
-    # remove if more verbose logging is desired
-    convert_args.append("--loglevel")
-    convert_args.append("warning")
-    rc = subprocess.run(convert_args)
-    if rc.returncode > 0:
-        print(f"ch10-to-h5 convert error for {ch10_filename}")
-        return False
+        return None
+    aircraft_id = parts[-2]
+    aircraft_type = parts[0]
+    if len(parts) > 3:
+        # some type codes have a hyphen
+        aircraft_type += "-"
+        aircraft_type += parts[1]
+    return aircraft_type, aircraft_id
 
-    # update with derived data
-    derive_args = ["python", "/usr/local/bin/derive-6dof.py", hdf5_filename]
-    rc = subprocess.run(derive_args)
-    if rc.returncode > 0:
-        print(f"derive-6dof error for {hdf5_filename}")
-        return False
 
-    # upload to hsds
+def convert_file(ch10_filename, timings):
+    """Download, convert, derive, and upload one Ch10 file in-process.
+
+    The Ch10 file is the only file written to disk (Py106 reads files). The
+    HDF5 file is built in memory and copied into its HSDS domain.
+    """
+    print("convert_file:", ch10_filename)
+    aircraft = parse_filename(ch10_filename)
+    if aircraft is None:
+        return False
+    aircraft_type, aircraft_id = aircraft
+    hdf5_filename = ch10_filename[:-5] + ".h5"
     domain_name = output_folder + hdf5_filename
-    rc = subprocess.run(["hsload", "--bucket", HSDS_BUCKET, hdf5_filename, domain_name])
-    if rc.returncode > 0:
-        print(f"unable to load to hsds for {hdf5_filename}")
 
-    # make the domain public read
-    rc = subprocess.run(["hsacl", "--bucket", HSDS_BUCKET, domain_name, "+r", "default"])
-    if rc.returncode > 0:
-        print(f"unable to make public read for {domain_name}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # download ch10 file from s3
+        ch10_path = os.path.join(tmpdir, ch10_filename)
+        try:
+            with stage(timings, "download"):
+                s3.download_file(CH10_BUCKET, ch10_filename, ch10_path)
+        except Exception as e:
+            print(f"unable to copy s3://{CH10_BUCKET}/{ch10_filename}: {e}")
+            return False
 
-    # clean up the file
-    os.remove(hdf5_filename)
-    if rc.returncode == 0:
-        return True
-    else:
+        print(f"converting to hdf5 file: {hdf5_filename} with aircraft_type: {aircraft_type} and aircraft_id: {aircraft_id}")
+        with h5py.File(hdf5_filename, "w", driver="core",
+                       backing_store=False) as h5f:
+            try:
+                with stage(timings, "convert"):
+                    ch10_to_h5.convert_ch10(ch10_path, h5f, aircraft_type,
+                                            aircraft_id)
+            except Exception as e:
+                print(f"ch10-to-h5 convert error for {ch10_filename}: {e}")
+                return False
+
+            # update with derived data
+            try:
+                with stage(timings, "derive"):
+                    derive_6dof.derive_6dof(h5f)
+            except Exception as e:
+                print(f"derive-6dof error for {hdf5_filename}: {e}")
+                return False
+
+            # upload to hsds
+            try:
+                with stage(timings, "upload"):
+                    with h5pyd.File(domain_name, "w",
+                                    bucket=HSDS_BUCKET) as dom:
+                        copy_domain(h5f, dom, lambda: h5f, max_workers=1)
+            except Exception as e:
+                print(f"unable to load to hsds for {hdf5_filename}: {e}")
+                return False
+
+    # make the domain public read
+    try:
+        with stage(timings, "acl"):
+            with h5pyd.File(domain_name, "a", bucket=HSDS_BUCKET) as dom:
+                dom.putACL(public_read_acl)
+    except Exception as e:
+        print(f"unable to make public read for {domain_name}: {e}")
         return False
+    return True
 
-### main
 
-loglevel = logging.ERROR
-logging.basicConfig(format='%(asctime)s %(message)s', level=loglevel)
+def init_worker():
+    """Import the conversion steps once per worker process."""
+    global ch10_to_h5, derive_6dof, s3
+    logging.basicConfig(format='%(asctime)s %(message)s', level=loglevel)
+    ch10_to_h5 = load_script("ch10-to-h5")
+    derive_6dof = load_script("derive-6dof")
+    s3 = boto3.client("s3")
 
-f = h5pyd.File(inventory_domain, "a", use_cache=False, bucket=HSDS_BUCKET)
 
-table = f["inventory"]
+def run_conversion(ch10_filename):
+    """Convert one file in a worker process. Returns success and timings."""
+    timings = dict()
+    with stage(timings, "total"):
+        try:
+            ok = convert_file(ch10_filename, timings)
+        except Exception as e:
+            print(f"conversion of {ch10_filename} failed: {e}")
+            ok = False
+    return ok, timings
 
-condition = f"start == 0"  # query for files that haven't been proccessed
 
-while True:
-    now = int(time.time())
-    update_val = {"start": now}
-    # query for row with 0 start value and update it to now
-    indices = table.update_where(condition, update_val, limit=1)
+def ch10_size(s3_client, ch10_filename):
+    """Size in bytes of a Ch10 file in S3, 0 if unknown."""
+    try:
+        rsp = s3_client.head_object(Bucket=CH10_BUCKET, Key=ch10_filename)
+        return rsp["ContentLength"]
+    except Exception as e:
+        print(f"unable to get size of {ch10_filename}: {e}")
+        return 0
+
 
-    if indices:
-        index = indices[0]
+def claim_files(table, s3_client, count):
+    """Lease up to count inventory rows in one update.
+
+    All rows of one claim share a random lease id for renewing them. Every
+    claim counts as an attempt, so files whose conversion kills the worker
+    are eventually marked as failed too.
+
+    Returns
+    -------
+    tuple
+        Lease id and list of (row index, file name, bytes, attempts).
+    """
+    now = int(time.time())
+    lease_id = random.getrandbits(62) + 1
+    update_val = {"start": now, "lease": now + lease_seconds,
+                  "lease_id": lease_id}
+    indices = table.update_where(claim_condition(now), update_val,
+                                 limit=count)
+    claimed = list()
+    for index in indices or []:
         print(f"getting row: {index}")
         row = table[index]
-        ch10_filename = row[0].decode("utf-8")
-
-        if not ch10_filename.endswith(".ch10"):
+        ch10_filename = row["filename"].decode("utf-8")
+        row["attempts"] += 1
+        if row["attempts"] > max_attempts:
+            print(f"{ch10_filename} failed {max_attempts} times, giving up")
+            row["failed"] = now
+        elif not ch10_filename.endswith(".ch10"):
             print(f"unexpected filename (no ch10 extension): {ch10_filename}")
+            row["failed"] = now
+        if row["failed"]:
+            row["lease"] = 0
+            row["lease_id"] = 0
+            table[index] = row
             continue
+        table[index] = row
+        claimed.append((index, ch10_filename,
+                        ch10_size(s3_client, ch10_filename),
+                        int(row["attempts"])))
+    return lease_id, claimed
 
-        # download ch10 file from s3
-        s3_uri = f"s3://{CH10_BUCKET}/{ch10_filename}"
-        rc = subprocess.run(["aws", "s3", "cp", s3_uri, ".", "--quiet"])
-        if rc.returncode > 0:
-            print(f"unable to copy {s3_uri}")
-            continue
 
-        if convert_file(ch10_filename):
-            print(f"marking conversion of {ch10_filename} complete")
-            row[2] = int(time.time())
-            table[index] = row
+def renew_leases(table, lease_ids):
+    """Extend the leases of claimed files, one update per claim."""
+    lease = int(time.time()) + lease_seconds
+    for lease_id in lease_ids:
+        table.update_where(f"(lease_id == {lease_id}) & (done == 0)",
+                           {"lease": lease})
 
-        os.remove(ch10_filename) # remove the ch10 file from container
 
+def update_leased(table, index, ch10_filename, lease_id, update_val):
+    """Update a file's row only while this pod's claim still holds it.
+
+    A lease that expired may have been claimed by another pod, whose lease
+    must not be overwritten. The row is selected by its index since file
+    names may hold characters a condition would need escaped. Returns
+    whether the row was updated.
+    """
+    if not table.update_where(f"lease_id == {lease_id}", update_val,
+                              start=index, stop=index + 1):
+        print(f"lease of {ch10_filename} was lost, dropping the result")
+        return False
+    return True
+
+
+def finish_file(table, index, ch10_filename, lease_id, attempts, ok):
+    """Mark a file done, or release it for a retry after a backoff."""
+    now = int(time.time())
+    update_val = {"lease": 0, "lease_id": 0}
+    if ok:
+        update_val["done"] = now
     else:
-        # no available rows
-        print("sleeping")
-        time.sleep(60)   # sleep for a bit to avoid endless restarts
-print('exit')
+        delay = retry_backoff * 2 ** max(attempts - 1, 0)
+        update_val["retry_at"] = now + min(delay, max_retry_backoff)
+        if attempts >= max_attempts:
+            update_val["failed"] = now
+    return update_leased(table, index, ch10_filename, lease_id, update_val)
+
+
+def release_file(table, index, ch10_filename, lease_id, attempts):
+    """Release a file for any pod to claim now, without counting its claim
+    as an attempt, e.g. after its worker was lost with a broken process
+    pool."""
+    return update_leased(table, index, ch10_filename, lease_id,
+                         {"lease": 0, "lease_id": 0,
+                          "attempts": max(attempts - 1, 0)})
+
+
+def fits(size, running):
+    """Whether a file of this size can start within the disk and memory
+    limits."""
+    if not running:
+        return True
+    disk = sum(r[2] for r in running.values())
+    return (disk + size <= max_disk
+            and (disk + size) * memory_factor <= max_memory)
+
+
+def collect(table, fut, claim):
+    """Record the outcome of a finished conversion."""
+    index, ch10_filename, _, attempts, lease_id = claim
+    ok, timings = fut.result()
+    print(f"{ch10_filename} stage seconds: " +
+          ", ".join(f"{k}={v:.1f}" for k, v in timings.items()))
+    if finish_file(table, index, ch10_filename, lease_id, attempts, ok):
+        if ok:
+            print(f"marked conversion of {ch10_filename} complete")
+        else:
+            print(f"conversion of {ch10_filename} failed, will retry later")
+
+
+def crashed(fut):
+    """Whether a finished conversion was lost with a broken process pool."""
+    return isinstance(fut.exception(), BrokenProcessPool)
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s %(message)s', level=loglevel)
+    print(f"converting up to {max_workers} files at a time, "
+          f"{max_disk} bytes of disk, {max_memory} bytes of memory")
+    s3_client = boto3.client("s3")
+    f = h5pyd.File(inventory_domain, "a", use_cache=False,
+                   bucket=HSDS_BUCKET)
+    table = f["inventory"]
+
+    pending = deque()  # claimed files waiting for disk or memory
+    running = dict()   # future -> (row index, file name, bytes, attempts,
+                       #            lease id)
+    solo = 0           # files to convert one at a time after a pool crash
+    renewed = time.time()
+    pool = ProcessPoolExecutor(max_workers=max_workers,
+                               initializer=init_worker)
+    while True:
+        # claim a batch of files for the free workers
+        workers = 1 if solo else max_workers
+        free = workers - len(running) - len(pending)
+        if free > 0:
+            lease_id, claimed = claim_files(table, s3_client, free)
+            pending.extend(c + (lease_id,) for c in claimed)
+
+        # start claimed files while they fit
+        broken = False
+        while (pending and len(running) < workers
+               and fits(pending[0][2], running)):
+            try:
+                fut = pool.submit(run_conversion, pending[0][1])
+            except BrokenProcessPool:
+                broken = True
+                break
+            running[fut] = pending.popleft()
+
+        if not running and not broken:
+            # no available rows
+            print("sleeping")
+            time.sleep(60)   # sleep for a bit to avoid endless restarts
+            continue
+
+        # heartbeat: renew leases of running and waiting files
+        if time.time() - renewed >= lease_seconds / 3:
+            renew_leases(table, {r[-1] for r in running.values()}
+                         | {p[-1] for p in pending})
+            renewed = time.time()
+
+        if not broken:
+            done, _ = wait(running, timeout=lease_seconds / 3,
+                           return_when=FIRST_COMPLETED)
+            broken = any(crashed(fut) for fut in done)
+        if broken:
+            # a worker process died; the broken pool fails the conversions
+            # still running
+            pool.shutdown(wait=True)
+            done = set(running)
+            pool = ProcessPoolExecutor(max_workers=max_workers,
+                                       initializer=init_worker)
+        lost = [fut for fut in done if crashed(fut)]
+        for fut in done:
+            claim = running.pop(fut)
+            if fut not in lost:
+                collect(table, fut, claim)
+                solo = max(solo - 1, 0)
+                continue
+            index, ch10_filename, _, attempts, lease_id = claim
+            print(f"worker process died converting {ch10_filename}")
+            if len(lost) == 1:
+                # the only conversion running killed its worker
+                finish_file(table, index, ch10_filename, lease_id, attempts,
+                            False)
+                solo = max(solo - 1, 0)
+            else:
+                # which conversion killed the pool is unknown, so the
+                # files are released and converted one at a time next
+                release_file(table, index, ch10_filename, lease_id,
+                             attempts)
+        if len(lost) > 1:
+            solo = len(lost)
+
+
+if __name__ == "__main__":
+    main()
+    print('exit')
@@ -1,4 +1,6 @@
+import os
 import time
+import numpy as np
 import boto3
 import h5pyd
 
@@ -15,19 +17,58 @@ def keys(bucket_name, prefix='/', delimiter='/', start_after=''):
         for content in page.get('Contents', ()):
             yield content['Key']
 
+# seconds between full listings of the bucket; in between only keys after
+# the last listed key are listed, so keys sorting before it are found by the
+# next full listing
+FULL_SCAN_TIME = int(os.environ.get("FULL_SCAN_TIME", "3600"))
+
+known = set()     # filenames in the inventory
+known_rows = 0    # inventory rows loaded into known
+last_key = ""     # last key of the previous listing
+last_full_scan = 0
+
+
+def load_filenames(table):
+    """Add filenames of inventory rows appended since the last call to the
+    known set. Reloads all of them if the inventory shrank."""
+    global known_rows
+    nrows = table.nrows
+    if nrows < known_rows:
+        print("inventory shrank, reloading filenames")
+        known.clear()
+        known_rows = 0
+    if nrows > known_rows:
+        names = table.fields("filename")[known_rows:nrows]
+        known.update(name.decode("utf-8") for name in names)
+        known_rows = nrows
+
+
 def watch_bucket():
+    global last_key, last_full_scan
     print("watch_bucket")
     f = h5pyd.File(inventory_domain, "a", bucket=HSDS_BUCKET)
     table = f["inventory"]
-    for key in keys(CHAP10_BUCKET):
-        condition = f"filename == b'{key}'"
-        matches = table.read_where(condition, limit=1)
-        if len(matches) == 0:
+    load_filenames(table)
+
+    if time.time() - last_full_scan >= FULL_SCAN_TIME:
+        start_after = ""
+        last_full_scan = time.time()
+    else:
+        start_after = last_key
+    new_keys = list()
+    for key in keys(CHAP10_BUCKET, start_after=start_after):
+        last_key = max(last_key, key)
+        if key not in known:
             print(f"not found, adding filename: {key}")
-            row = (key, 0, 0)
-            table.append([row,])
-        else:
-            pass  # filename found
+            new_keys.append(key)
+
+    if new_keys:
+        rows = np.zeros(len(new_keys), dtype=table.dtype)
+        rows["filename"] = new_keys
+        table.append(rows)
+        known.update(new_keys)
+        print(f"added {len(new_keys)} filenames")
+    f.close()
 
 #
 # main
@@ -13,6 +13,8 @@ import Py106.Time
 import Py106.MsgDecode1553
 import Py106.MsgDecodeVideo
 
+lggr = logging.getLogger('ch10-to-h5')
+
 
 ################################################################################
 def derive_tmats_attrs(h5grp, tmats_buff):
@@ -98,6 +100,13 @@ def setup_output_content(top_grp, pckt_summary):
             dset = grp.create_dataset('data', shape=(nelems,),
                                       chunks=True, dtype=np.dtype('|V188'))
             dset.attrs['name'] = 'video transfer stream'
+            npckts = smmry['packets']
+            lggr.debug(f'Create HDF5 dataset time_index[{npckts}] in '
+                       f'{grp_path}')
+            dset = grp.create_dataset(
+                'time_index', shape=(npckts,), chunks=True,
+                dtype=np.dtype([('time', '<i8'), ('row', '<i8')]))
+            dset.attrs['name'] = 'Ch10 packet time and first stream row'
 
 
 def append_dset(h5dset, pos_cursor, arr, buffer=None):
@@ -162,241 +171,285 @@ def epoch_time(tstamp):
 ################################################################################
 
 
-parser = argparse.ArgumentParser(
-    description='Convert Ch10 data into an HDF5-based format',
-    epilog='Copyright (c) 2019 Akadio Inc.',
-    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-parser.add_argument('ch10', metavar='FILE', help='Ch10 input file', type=Path)
-parser.add_argument('--outfile', '-o', metavar='H5FILE', type=Path,
-                    help='Output HDF5 file. Use Ch10 file name if not given.')
-parser.add_argument('--aircraft-type', metavar='TYPE', type=str,
-                    help='Aircraft type. Required.')
-parser.add_argument('--aircraft-id', metavar='TAILID', type=str,
-                    help='Aircraft tail/serial number. Required.')
-parser.add_argument('--loglevel', default='info',
-                    choices=['debug', 'info', 'warning', 'error', 'critical'],
-                    help='Logging level. Log output goes to stderr.')
-arg = parser.parse_args()
-
-# Log to stderr
-logging.basicConfig(
-    format='%(asctime)s:%(levelname)s:%(filename)s:%(lineno)d:%(message)s',
-    level=arg.loglevel.upper(),
-    datefmt='%Y%m%dT%H%M%S')
-
-lggr = logging.getLogger('ch10-to-h5')
-
-# Show command-line options...
-lggr.debug(f'Input Ch10 file = {arg.ch10}')
-lggr.debug(f'Output HDF5 file = {arg.outfile}')
-lggr.debug(f'Aircraft type = {arg.aircraft_type}')
-lggr.debug(f'Tail/serial number = {arg.aircraft_id}')
-lggr.debug(f'Logging level = {arg.loglevel}')
-
-if not arg.aircraft_id and not arg.aircraft_type:
-    raise SystemExit('Aircraft type or tail/serial number not given')
-
-if arg.ch10.is_file():
-    outh5 = arg.outfile if arg.outfile else arg.ch10.with_suffix('.h5')
-else:
-    raise OSError(f'{str(arg.ch10)}: Does not exist or not a file')
-
-lggr.info(f'Converting Ch10 file {str(arg.ch10)} to HDF5 file {str(outh5)}')
-
-ch10 = Py106.Packet.IO()
-ch10_tmats = Py106.MsgDecodeTMATS.DecodeTMATS(ch10)
-ch10_1553 = Py106.MsgDecode1553.Decode1553F1(ch10)
-ch10_vidf0 = Py106.MsgDecodeVideo.DecodeVideoF0(ch10)
-
-lggr.info(f'Open {str(arg.ch10)} for collecting info about stored packets')
-status = ch10.open(str(arg.ch10), Py106.Packet.FileMode.READ)
-if status != Py106.Status.OK:
-    raise IOError(f'{str(arg.ch10)}: Error opening file')
-
-pckt_summary = dict()
-pcntr = 0
-lggr.info(f'Iterate over {str(arg.ch10)} packet data')
-for packet in ch10.packet_headers():
-    pcntr += 1
-    if packet.DataType == Py106.Packet.DataType.MIL1553_FMT_1:
-        lggr.debug(
-            f'Collecting info on packet #{pcntr} with MIL1553_FMT_1 data')
-        ch10.read_data()
-        msg_cntr = 0
-        for msg in ch10_1553.msgs():
+def convert_ch10(ch10_file, h5f, aircraft_type, aircraft_id):
+    """Convert Ch10 file data into the FIREfly HDF5 format.
+
+    Parameters
+    ----------
+    ch10_file : str or pathlib.Path
+        Ch10 input file.
+    h5f : h5py.File
+        Empty HDF5 file open for writing, e.g. an in-memory file with the
+        ``core`` driver.
+    aircraft_type : str
+        Aircraft type.
+    aircraft_id : str
+        Aircraft tail/serial number.
+    """
+    ch10_file = Path(ch10_file)
+    ch10 = Py106.Packet.IO()
+    ch10_tmats = Py106.MsgDecodeTMATS.DecodeTMATS(ch10)
+    ch10_1553 = Py106.MsgDecode1553.Decode1553F1(ch10)
+    ch10_vidf0 = Py106.MsgDecodeVideo.DecodeVideoF0(ch10)
+
+    lggr.info(f'Open {str(ch10_file)} for collecting info about stored '
+              f'packets')
+    status = ch10.open(str(ch10_file), Py106.Packet.FileMode.READ)
+    if status != Py106.Status.OK:
+        raise IOError(f'{str(ch10_file)}: Error opening file')
+
+    pckt_summary = dict()
+    pcntr = 0
+    lggr.info(f'Iterate over {str(ch10_file)} packet data')
+    for packet in ch10.packet_headers():
+        pcntr += 1
+        if packet.DataType == Py106.Packet.DataType.MIL1553_FMT_1:
+            lggr.debug(
+                f'Collecting info on packet #{pcntr} with MIL1553_FMT_1 data')
+            ch10.read_data()
+            msg_cntr = 0
+            for msg in ch10_1553.msgs():
+                ch = ch10.Header.ChID
+                msg_cntr += 1
+                if msg.p1553Hdr.contents.Field.BlockStatus.RT2RT:
+                    # RT-to-RT message
+                    rx_cmd = msg.pCmdWord1.contents.Field
+                    tx_cmd = msg.pCmdWord2.contents.Field
+                    if rx_cmd.TR != 0:
+                        lggr.warning(f'1553 packet #{pcntr}, message '
+                                     f'#{msg_cntr}: First command word not '
+                                     f'"Receive"')
+                    if tx_cmd.TR != 1:
+                        lggr.warning(f'1553 packet #{pcntr}, message '
+                                     f'#{msg_cntr}: Second command word not '
+                                     f'"Transmit"')
+                    rx_grp1553 = (
+                        f'1553/Ch_{ch}/RT_{rx_cmd.RTAddr}/'
+                        f'SA_{rx_cmd.SubAddr}/R/'
+                        f'RT_{tx_cmd.RTAddr}/SA_{tx_cmd.SubAddr}')
+                    tx_grp1553 = (
+                        f'1553/Ch_{ch}/RT_{tx_cmd.RTAddr}/'
+                        f'SA_{tx_cmd.SubAddr}/T/'
+                        f'RT_{rx_cmd.RTAddr}/SA_{rx_cmd.SubAddr}')
+                    lggr.debug(f'1553 packet #{pcntr}, message #{msg_cntr}: '
+                               f'{rx_grp1553} and {tx_grp1553}')
+                    pckt_summary[tx_grp1553] = pckt_summary.get(
+                        tx_grp1553,
+                        {'count': 0, 'alias': set(), 'type': 'MIL1553_FMT_1'})
+                    pckt_summary[tx_grp1553]['count'] += 1
+                    pckt_summary[tx_grp1553]['alias'].update([rx_grp1553])
+                else:
+                    # RT-to-BC or BC-to-RT message
+                    rt = msg.pCmdWord1.contents.Field.RTAddr
+                    sa = msg.pCmdWord1.contents.Field.SubAddr
+                    tr = ('R', 'T')[msg.pCmdWord1.contents.Field.TR]
+                    grp1553 = f'1553/Ch_{ch}/RT_{rt}/SA_{sa}/{tr}/BC'
+                    pckt_summary[grp1553] = pckt_summary.get(
+                        grp1553, {'count': 0, 'type': 'MIL1553_FMT_1'})
+                    pckt_summary[grp1553]['count'] += 1
+                    lggr.debug(
+                        f'1553 packet #{pcntr}, message #{msg_cntr}: {grp1553}')
+
+        elif packet.DataType == Py106.Packet.DataType.VIDEO_FMT_0:
+            lggr.debug(f'Collecting info on packet #{pcntr} with '
+                       f'VIDEO_FMT_0 data')
+            ch10.read_data()
             ch = ch10.Header.ChID
-            msg_cntr += 1
-            if msg.p1553Hdr.contents.Field.BlockStatus.RT2RT:
-                # RT-to-RT message
-                rx_cmd = msg.pCmdWord1.contents.Field
-                tx_cmd = msg.pCmdWord2.contents.Field
-                if rx_cmd.TR != 0:
-                    lggr.warning(f'1553 packet #{pcntr}, message #{msg_cntr}: '
-                                 f'First command word not "Receive"')
-                if tx_cmd.TR != 1:
-                    lggr.warning(f'1553 packet #{pcntr}, message #{msg_cntr}: '
-                                 f'Second command word not "Transmit"')
-                rx_grp1553 = (
-                    f'1553/Ch_{ch}/RT_{rx_cmd.RTAddr}/SA_{rx_cmd.SubAddr}/R/'
-                    f'RT_{tx_cmd.RTAddr}/SA_{tx_cmd.SubAddr}')
-                tx_grp1553 = (
-                    f'1553/Ch_{ch}/RT_{tx_cmd.RTAddr}/SA_{tx_cmd.SubAddr}/T/'
-                    f'RT_{rx_cmd.RTAddr}/SA_{rx_cmd.SubAddr}')
-                lggr.debug(f'1553 packet #{pcntr}, message #{msg_cntr}: '
-                           f'{rx_grp1553} and {tx_grp1553}')
-                pckt_summary[tx_grp1553] = pckt_summary.get(
-                    tx_grp1553,
-                    {'count': 0, 'alias': set(), 'type': 'MIL1553_FMT_1'})
-                pckt_summary[tx_grp1553]['count'] += 1
-                pckt_summary[tx_grp1553]['alias'].update([rx_grp1553])
-            else:
-                # RT-to-BC or BC-to-RT message
-                rt = msg.pCmdWord1.contents.Field.RTAddr
-                sa = msg.pCmdWord1.contents.Field.SubAddr
-                tr = ('R', 'T')[msg.pCmdWord1.contents.Field.TR]
-                grp1553 = f'1553/Ch_{ch}/RT_{rt}/SA_{sa}/{tr}/BC'
-                pckt_summary[grp1553] = pckt_summary.get(
-                    grp1553, {'count': 0, 'type': 'MIL1553_FMT_1'})
-                pckt_summary[grp1553]['count'] += 1
-                lggr.debug(
-                    f'1553 packet #{pcntr}, message #{msg_cntr}: {grp1553}')
-
-    elif packet.DataType == Py106.Packet.DataType.VIDEO_FMT_0:
-        lggr.debug(f'Collecting info on packet #{pcntr} with VIDEO_FMT_0 data')
-        ch10.read_data()
-        ch = ch10.Header.ChID
-        loc = f'Video Format 0/Ch_{ch}'
-        pckt_summary[loc] = pckt_summary.get(loc, {'count': 0,
-                                                   'type': 'VIDEO_FMT_0'})
-        msg_cntr = 0
-        for msg in ch10_vidf0.msgs():
-            msg_cntr += 1
-        pckt_summary[loc]['count'] += msg_cntr
-        lggr.debug(f'Video Format 0 packet #{pcntr}: {msg_cntr} streams')
-
-lggr.info(f'Finished collecting info on packets in {str(arg.ch10)}')
-ch10.close()
-lggr.debug(f'pckt_summary = {pckt_summary}')
-
-lggr.info(f'Open {str(arg.ch10)} for reading data')
-ch10 = Py106.Packet.IO()
-ch10_tmats = Py106.MsgDecodeTMATS.DecodeTMATS(ch10)
-ch10_time = Py106.Time.Time(ch10)
-ch10_1553 = Py106.MsgDecode1553.Decode1553F1(ch10)
-ch10_vidf0 = Py106.MsgDecodeVideo.DecodeVideoF0(ch10)
-status = ch10.open(str(arg.ch10), Py106.Packet.FileMode.READ)
-if status != Py106.Status.OK:
-    raise IOError(f'{str(arg.ch10)}: Error opening file')
-ch10_time.SyncTime(False, 0)
-
-lggr.info(f'Create output HDF5 file {str(outh5)} (will overwrite)')
-h5f = h5py.File(str(outh5), 'w')
-lggr.debug('Create /chapter11_data group')
-rawgrp = h5f.create_group('chapter11_data')
-lggr.debug('Create /derived group')
-paragrp = h5f.create_group('derived')
-lggr.debug('Set up content in the HDF5 file')
-setup_output_content(rawgrp, pckt_summary)
-
-lggr.info(f'Iterate over {str(arg.ch10)} packet data')
-pcntr = 0
-buffer = dict()
-
-for packet in ch10.packet_headers():
-    pcntr += 1
-    lggr.info(f'Packet #{pcntr} type: '
-              f'{Py106.Packet.DataType.TypeName(packet.DataType)}')
-    if packet.DataType == Py106.Packet.DataType.TMATS:
-        lggr.debug(f'Require {paragrp.name}/TMATS HDF5 group and store TMATS '
-                   f'attributes')
-        ch10.read_data()
-        rawgrp.attrs['rcc_version'] = ch10_tmats.ch10ver
-        derive_tmats_attrs(paragrp, ch10.Buffer.raw[4:ch10.Header.DataLen])
-        tmats_grp = rawgrp.create_group('TMATS')
-        dset = tmats_grp.create_dataset(
-            'data', shape=(),
-            data=np.void(ch10.Buffer.raw[4:ch10.Header.DataLen]))
-        dset.attrs['name'] = 'TMATS buffer'
-        lggr.info('Finished with TMATS information')
-
-    elif packet.DataType == Py106.Packet.DataType.MIL1553_FMT_1:
-        ch10.read_data()
-        # Loop over each message in the 1553 packet...
-        for msg in ch10_1553.msgs():
+            loc = f'Video Format 0/Ch_{ch}'
+            pckt_summary[loc] = pckt_summary.get(loc, {'count': 0,
+                                                       'packets': 0,
+                                                       'type': 'VIDEO_FMT_0'})
+            pckt_summary[loc]['packets'] += 1
+            msg_cntr = 0
+            for msg in ch10_vidf0.msgs():
+                msg_cntr += 1
+            pckt_summary[loc]['count'] += msg_cntr
+            lggr.debug(f'Video Format 0 packet #{pcntr}: {msg_cntr} streams')
+
+    lggr.info(f'Finished collecting info on packets in {str(ch10_file)}')
+    ch10.close()
+    lggr.debug(f'pckt_summary = {pckt_summary}')
+
+    lggr.info(f'Open {str(ch10_file)} for reading data')
+    ch10 = Py106.Packet.IO()
+    ch10_tmats = Py106.MsgDecodeTMATS.DecodeTMATS(ch10)
+    ch10_time = Py106.Time.Time(ch10)
+    ch10_1553 = Py106.MsgDecode1553.Decode1553F1(ch10)
+    ch10_vidf0 = Py106.MsgDecodeVideo.DecodeVideoF0(ch10)
+    status = ch10.open(str(ch10_file), Py106.Packet.FileMode.READ)
+    if status != Py106.Status.OK:
+        raise IOError(f'{str(ch10_file)}: Error opening file')
+    ch10_time.SyncTime(False, 0)
+
+    lggr.debug('Create /chapter11_data group')
+    rawgrp = h5f.create_group('chapter11_data')
+    lggr.debug('Create /derived group')
+    paragrp = h5f.create_group('derived')
+    lggr.debug('Set up content in the HDF5 file')
+    setup_output_content(rawgrp, pckt_summary)
+
+    lggr.info(f'Iterate over {str(ch10_file)} packet data')
+    pcntr = 0
+
+    for packet in ch10.packet_headers():
+        pcntr += 1
+        lggr.info(f'Packet #{pcntr} type: '
+                  f'{Py106.Packet.DataType.TypeName(packet.DataType)}')
+        if packet.DataType == Py106.Packet.DataType.TMATS:
+            lggr.debug(f'Require {paragrp.name}/TMATS HDF5 group and store '
+                       f'TMATS attributes')
+            ch10.read_data()
+            rawgrp.attrs['rcc_version'] = ch10_tmats.ch10ver
+            derive_tmats_attrs(paragrp, ch10.Buffer.raw[4:ch10.Header.DataLen])
+            tmats_grp = rawgrp.create_group('TMATS')
+            dset = tmats_grp.create_dataset(
+                'data', shape=(),
+                data=np.void(ch10.Buffer.raw[4:ch10.Header.DataLen]))
+            dset.attrs['name'] = 'TMATS buffer'
+            lggr.info('Finished with TMATS information')
+
+        elif packet.DataType == Py106.Packet.DataType.MIL1553_FMT_1:
+            ch10.read_data()
+            # Loop over each message in the 1553 packet...
+            for msg in ch10_1553.msgs():
+                ch = ch10.Header.ChID
+                if msg.p1553Hdr.contents.Field.BlockStatus.RT2RT:
+                    # RT-to-RT message
+                    rx_cmd = msg.pCmdWord1.contents.Field
+                    tx_cmd = msg.pCmdWord2.contents.Field
+                    grp1553 = (
+                        f'1553/Ch_{ch}/RT_{tx_cmd.RTAddr}/'
+                        f'SA_{tx_cmd.SubAddr}/T/'
+                        f'RT_{rx_cmd.RTAddr}/SA_{rx_cmd.SubAddr}')
+                else:
+                    # RT-to-BC or BC-to-RT message
+                    rt = msg.pCmdWord1.contents.Field.RTAddr
+                    sa = msg.pCmdWord1.contents.Field.SubAddr
+                    tr = ('R', 'T')[msg.pCmdWord1.contents.Field.TR]
+                    grp1553 = f'1553/Ch_{ch}/RT_{rt}/SA_{sa}/{tr}/BC'
+                data_grp = rawgrp[grp1553]
+                lggr.debug(f'Add packet data in {data_grp.name} HDF5 group')
+                cursor = pckt_summary[grp1553]['count']
+                data = data_grp['data']
+
+                msg_err = msg.p1553Hdr.contents.Field.BlockStatus.MsgError
+                word_cnt = ch10_1553.word_cnt(msg.pCmdWord1.contents.Value)
+                messages = np.array(
+                    [msg.pData.contents[i] for i in range(word_cnt)],
+                    dtype='<u2')
+                tstamp = str(ch10_time.RelInt2IrigTime(
+                    msg.p1553Hdr.contents.Field.PktTime))
+                time = epoch_time(tstamp)
+                ttb = msg.pChanSpec.contents.TTB
+                word_error = msg.p1553Hdr.contents.Field.BlockStatus.WordError
+                sync_error = msg.p1553Hdr.contents.Field.BlockStatus.SyncError
+                word_count_error = \
+                    msg.p1553Hdr.contents.Field.BlockStatus.WordCntError
+                rsp_tout = msg.p1553Hdr.contents.Field.BlockStatus.RespTimeout
+                format_error = \
+                    msg.p1553Hdr.contents.Field.BlockStatus.FormatError
+                bus_id = ('A', 'B')[
+                    msg.p1553Hdr.contents.Field.BlockStatus.BusID]
+                packet_version = packet.DataType
+
+                append_dset(data, cursor,
+                            np.array((time, tstamp, msg_err, ttb, word_error,
+                                      sync_error, word_count_error, rsp_tout,
+                                      format_error, bus_id, packet_version,
+                                      messages),
+                                     dtype=data.dtype))
+
+                pckt_summary[grp1553]['count'] -= 1
+
+        elif packet.DataType == Py106.Packet.DataType.VIDEO_FMT_0:
+            ch10.read_data()
             ch = ch10.Header.ChID
-            if msg.p1553Hdr.contents.Field.BlockStatus.RT2RT:
-                # RT-to-RT message
-                rx_cmd = msg.pCmdWord1.contents.Field
-                tx_cmd = msg.pCmdWord2.contents.Field
-                grp1553 = (
-                    f'1553/Ch_{ch}/RT_{tx_cmd.RTAddr}/SA_{tx_cmd.SubAddr}/T/'
-                    f'RT_{rx_cmd.RTAddr}/SA_{rx_cmd.SubAddr}')
-            else:
-                # RT-to-BC or BC-to-RT message
-                rt = msg.pCmdWord1.contents.Field.RTAddr
-                sa = msg.pCmdWord1.contents.Field.SubAddr
-                tr = ('R', 'T')[msg.pCmdWord1.contents.Field.TR]
-                grp1553 = f'1553/Ch_{ch}/RT_{rt}/SA_{sa}/{tr}/BC'
-            data_grp = rawgrp[grp1553]
+            where = f'Video Format 0/Ch_{ch}'
+            data_grp = rawgrp[where]
             lggr.debug(f'Add packet data in {data_grp.name} HDF5 group')
-            cursor = pckt_summary[grp1553]['count']
-            data = data_grp['data']
-
-            msg_err = msg.p1553Hdr.contents.Field.BlockStatus.MsgError
-            word_cnt = ch10_1553.word_cnt(msg.pCmdWord1.contents.Value)
-            messages = np.array(
-                [msg.pData.contents[i] for i in range(word_cnt)],
-                dtype='<u2')
-            tstamp = str(ch10_time.RelInt2IrigTime(
-                msg.p1553Hdr.contents.Field.PktTime))
-            time = epoch_time(tstamp)
-            ttb = msg.pChanSpec.contents.TTB
-            word_error = msg.p1553Hdr.contents.Field.BlockStatus.WordError
-            sync_error = msg.p1553Hdr.contents.Field.BlockStatus.SyncError
-            word_count_error = \
-                msg.p1553Hdr.contents.Field.BlockStatus.WordCntError
-            rsp_tout = msg.p1553Hdr.contents.Field.BlockStatus.RespTimeout
-            format_error = msg.p1553Hdr.contents.Field.BlockStatus.FormatError
-            bus_id = ('A', 'B')[msg.p1553Hdr.contents.Field.BlockStatus.BusID]
-            packet_version = packet.DataType
-
-            append_dset(data, cursor,
-                        np.array((time, tstamp, msg_err, ttb, word_error,
-                                  sync_error, word_count_error, rsp_tout,
-                                  format_error, bus_id, packet_version,
-                                  messages),
-                                 dtype=data.dtype))
-
-            pckt_summary[grp1553]['count'] -= 1
-
-    elif packet.DataType == Py106.Packet.DataType.VIDEO_FMT_0:
-        ch10.read_data()
-        ch = ch10.Header.ChID
-        where = f'Video Format 0/Ch_{ch}'
-        data_grp = rawgrp[where]
-        lggr.debug(f'Add packet data in {data_grp.name} HDF5 group')
-        for msg in ch10_vidf0.msgs():
-            cursor = pckt_summary[where]['count']
-            append_dset(data_grp['data'], cursor, msg.TSData(as_bytes=True))
-            pckt_summary[where]['count'] -= 1
-
-    lggr.info(f'Packet #{pcntr} finished processing')
-
-# Store some useful metadata...
-h5f.attrs['ch10_file'] = arg.ch10.name
-h5f.attrs['ch10_file_checksum'] = f'SHA-256:{compute_sha256(arg.ch10)}'
-tstart, tend = ch10_time_coverage(ch10, ch10_time)
-h5f.attrs['time_coverage_start'] = tstart.isoformat() + 'Z'
-h5f.attrs['time_coverage_end'] = tend.isoformat() + 'Z'
-dt = datetime.utcnow().isoformat() + 'Z'
-h5f.attrs['date_created'] = dt
-h5f.attrs['date_modified'] = dt
-h5f.attrs['date_metadata_modified'] = dt
-h5f.attrs['aircraft_type'] = arg.aircraft_type
-h5f.attrs['aircraft_id'] = arg.aircraft_id
-
-lggr.debug(f'Close {h5f.filename} file')
-h5f.close()
-lggr.debug(f'Close {str(arg.ch10)} file')
-ch10.close()
-lggr.info('Done')
+
+            # Index the packet's time and its first transport stream row...
+            first_row = data_grp['data'].shape[0] - pckt_summary[where]['count']
+            tstamp = str(ch10_time.Rel2IrigTime(ch10.Header.RefTime))
+            append_dset(data_grp['time_index'], pckt_summary[where]['packets'],
+                        np.array((epoch_time(tstamp), first_row),
+                                 dtype=data_grp['time_index'].dtype))
+            pckt_summary[where]['packets'] -= 1
+
+            for msg in ch10_vidf0.msgs():
+                cursor = pckt_summary[where]['count']
+                append_dset(data_grp['data'], cursor, msg.TSData(as_bytes=True))
+                pckt_summary[where]['count'] -= 1
+
+        lggr.info(f'Packet #{pcntr} finished processing')
+
+    # Store some useful metadata...
+    h5f.attrs['ch10_file'] = ch10_file.name
+    h5f.attrs['ch10_file_checksum'] = f'SHA-256:{compute_sha256(ch10_file)}'
+    tstart, tend = ch10_time_coverage(ch10, ch10_time)
+    h5f.attrs['time_coverage_start'] = tstart.isoformat() + 'Z'
+    h5f.attrs['time_coverage_end'] = tend.isoformat() + 'Z'
+    dt = datetime.utcnow().isoformat() + 'Z'
+    h5f.attrs['date_created'] = dt
+    h5f.attrs['date_modified'] = dt
+    h5f.attrs['date_metadata_modified'] = dt
+    h5f.attrs['aircraft_type'] = aircraft_type
+    h5f.attrs['aircraft_id'] = aircraft_id
+
+    lggr.debug(f'Close {str(ch10_file)} file')
+    ch10.close()
+################################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert Ch10 data into an HDF5-based format',
+        epilog='Copyright (c) 2019 Akadio Inc.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('ch10', metavar='FILE', help='Ch10 input file',
+                        type=Path)
+    parser.add_argument(
+        '--outfile', '-o', metavar='H5FILE', type=Path,
+        help='Output HDF5 file. Use Ch10 file name if not given.')
+    parser.add_argument('--aircraft-type', metavar='TYPE', type=str,
+                        help='Aircraft type. Required.')
+    parser.add_argument('--aircraft-id', metavar='TAILID', type=str,
+                        help='Aircraft tail/serial number. Required.')
+    parser.add_argument('--loglevel', default='info',
+                        choices=['debug', 'info', 'warning', 'error',
+                                 'critical'],
+                        help='Logging level. Log output goes to stderr.')
+    arg = parser.parse_args()
+
+    # Log to stderr
+    logging.basicConfig(
+        format=('%(asctime)s:%(levelname)s:%(filename)s:%(lineno)d:'
+                '%(message)s'),
+        level=arg.loglevel.upper(),
+        datefmt='%Y%m%dT%H%M%S')
+
+    # Show command-line options...
+    lggr.debug(f'Input Ch10 file = {arg.ch10}')
+    lggr.debug(f'Output HDF5 file = {arg.outfile}')
+    lggr.debug(f'Aircraft type = {arg.aircraft_type}')
+    lggr.debug(f'Tail/serial number = {arg.aircraft_id}')
+    lggr.debug(f'Logging level = {arg.loglevel}')
+
+    if not arg.aircraft_id and not arg.aircraft_type:
+        raise SystemExit('Aircraft type or tail/serial number not given')
+
+    if arg.ch10.is_file():
+        outh5 = arg.outfile if arg.outfile else arg.ch10.with_suffix('.h5')
+    else:
+        raise OSError(f'{str(arg.ch10)}: Does not exist or not a file')
+
+    lggr.info(f'Converting Ch10 file {str(arg.ch10)} to HDF5 file '
+              f'{str(outh5)}')
+    lggr.info(f'Create output HDF5 file {str(outh5)} (will overwrite)')
+    with h5py.File(str(outh5), 'w') as h5f:
+        convert_ch10(arg.ch10, h5f, arg.aircraft_type, arg.aircraft_id)
+    lggr.info('Done')
+
+
+if __name__ == '__main__':
+    main()
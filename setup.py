@@ -18,6 +18,9 @@ setup(
         'ipyleaflet>=0.11.1',
         'hvplot>=0.4'
     ],
+    extras_require={
+        'parquet': ['pyarrow>=0.15']
+    },
     scripts=[
         'scripts/ch10-to-h5.py',
         'scripts/ch10summary.py',
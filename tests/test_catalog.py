@@ -0,0 +1,89 @@
+import time
+import pytest
+from firefly.catalog import FlightCatalog, sql_where
+from firefly.query import plan_query
+
+_FLIGHTS = {
+    '/FIREfly/h5/a.h5': dict(aircraft_type='F-16', aircraft_id='ED1',
+                             time_coverage_start='2014-05-13T16:53:20Z',
+                             time_coverage_end='2014-05-13T18:00:00Z',
+                             min_altitude=0., max_altitude=30000.,
+                             min_speed=0., max_speed=450.),
+    '/FIREfly/h5/b.h5': dict(aircraft_type='T-38', aircraft_id='ED2',
+                             time_coverage_start='2015-01-02T10:00:00Z',
+                             time_coverage_end='2015-01-02T11:30:00Z',
+                             min_altitude=0., max_altitude=12000.,
+                             min_speed=0., max_speed=300.),
+    '/FIREfly/h5/c.h5': dict(aircraft_type='F-16', aircraft_id='ED3',
+                             time_coverage_start='2016-07-04T08:00:00Z',
+                             time_coverage_end='2016-07-04T09:00:00Z',
+                             min_altitude=500., max_altitude=42000.,
+                             min_speed=150., max_speed=600.,
+                             landing_location="O'Hare")}
+
+
+@pytest.fixture
+def catalog():
+    """In-memory catalog of the test flights, synchronized now."""
+    cat = FlightCatalog(':memory:', '/FIREfly/h5/')
+    rows = [cat._row(d, attrs) for d, attrs in _FLIGHTS.items()]
+    with cat._db:
+        cat._db.executemany(
+            f'INSERT INTO flights VALUES ({", ".join("?" * len(rows[0]))})',
+            rows)
+        cat._db.execute('INSERT INTO sync VALUES (?, ?)',
+                        ('/FIREfly/h5/', time.time()))
+    yield cat
+    cat.close()
+
+
+def test_sql_where():
+    assert sql_where("aircraft_type == 'F-16' AND max_altitude >= 30000.0") \
+        == ('"aircraft_type" = ? AND "max_altitude" >= ?', ['F-16', 30000.])
+    assert sql_where(
+        "(aircraft_type == 'F-16' OR aircraft_type == \"T-38\") AND "
+        "(max_speed > 1e2 AND min_speed < -.5)") == (
+        '( "aircraft_type" = ? OR "aircraft_type" = ? ) AND '
+        '( "max_speed" > ? AND "min_speed" < ? )',
+        ['F-16', 'T-38', 100., -0.5])
+    assert sql_where("landing_location != 'x OR 1 == 1'") == (
+        '"landing_location" != ?', ['x OR 1 == 1'])
+
+
+@pytest.mark.parametrize('query', [
+    "tail_number == 'ED1'",
+    "aircraft_type == 'F-16' AND flights == 1",
+    "domain == 'a.h5'",
+    "max_altitude >= 1; DROP TABLE flights",
+    "max_altitude >= 'unterminated"])
+def test_sql_where_unsupported(query):
+    assert sql_where(query) == (None, None)
+
+
+def test_query(catalog):
+    assert len(catalog) == 3
+    assert catalog.fresh
+    assert catalog.query() == sorted(_FLIGHTS)
+    assert catalog.query("aircraft_type == 'F-16'") == [
+        '/FIREfly/h5/a.h5', '/FIREfly/h5/c.h5']
+    assert catalog.query("landing_location == \"O'Hare\"") == [
+        '/FIREfly/h5/c.h5']
+    assert catalog.query("aircraft_type == 'F-16'", pattern='^a') == [
+        '/FIREfly/h5/a.h5']
+    assert catalog.query("tail_number == 'ED1'") is None
+    assert catalog.attributes('/FIREfly/h5/b.h5')['aircraft_id'] == 'ED2'
+
+
+def test_filter(catalog):
+    assert catalog.filter(aircraft=['F-16', 'T-38'],
+                          altitude=[20000, None]) == [
+        '/FIREfly/h5/a.h5', '/FIREfly/h5/c.h5']
+    assert catalog.filter(time=['2015-01-01T00:00:00Z', None]) == [
+        '/FIREfly/h5/b.h5', '/FIREfly/h5/c.h5']
+    assert catalog.filter(speed=(None, 100),
+                          time=['2015-01-01T00:00:00Z', None]) == [
+        '/FIREfly/h5/b.h5']
+    assert catalog.filter(tail='ED2', speed=[500, None]) == list()
+
+    plan = plan_query(dict(aircraft='F-16', speed=[500, None]))
+    assert plan.select(catalog=catalog) == ['/FIREfly/h5/c.h5']
@@ -0,0 +1,117 @@
+import json
+import threading
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pytest
+import firefly.download as download
+from firefly.download import ranged_download
+
+_DATA = np.random.default_rng(106).integers(
+    0, 256, 100_003, dtype=np.uint8).tobytes()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serve ``_DATA`` with or without byte range support."""
+
+    ranges = True
+    requests = list()
+
+    def log_message(self, *args):
+        pass
+
+    def _headers(self, status, length):
+        self.send_response(status)
+        self.send_header('Content-Length', str(length))
+        self.send_header('ETag', '"data-1"')
+        if self.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers(200, len(_DATA))
+
+    def do_GET(self):
+        rng = self.headers.get('Range')
+        self.requests.append(rng)
+        if rng is None or not self.ranges:
+            self._headers(200, len(_DATA))
+            self.wfile.write(_DATA)
+            return
+        start, end = (int(v) for v in rng[len('bytes='):].split('-'))
+        end = min(end, len(_DATA) - 1)
+        self._headers(206, end - start + 1)
+        self.wfile.write(_DATA[start:end + 1])
+
+
+@pytest.fixture
+def server():
+    """URL of a local HTTP server and its request handler class."""
+    handler = type('Handler', (_Handler,), {'requests': list()})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}/file.ch10', handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_ranged_download(server, tmp_path):
+    url, handler = server
+    of = tmp_path / 'file.ch10'
+    digest = ranged_download(url, of, checksum=sha256(_DATA).hexdigest(),
+                             part_size=10_000, max_workers=4)
+    assert digest == sha256(_DATA).hexdigest()
+    assert of.read_bytes() == _DATA
+    assert len(handler.requests) == 11
+    assert all(r.startswith('bytes=') for r in handler.requests)
+    assert not (tmp_path / 'file.ch10.download').exists()
+
+
+def test_ranged_download_checksum_mismatch(server, tmp_path):
+    url, _ = server
+    with pytest.raises(IOError):
+        ranged_download(url, tmp_path / 'file.ch10', checksum='0' * 64,
+                        part_size=10_000)
+
+
+def test_ranged_download_resume(server, tmp_path):
+    url, handler = server
+    part_size = 10_000
+    of = tmp_path / 'file.ch10'
+    # Interrupted download with parts 0, 1, and 5 written...
+    done = [0, 1, 5]
+    partial = bytearray(len(_DATA))
+    for i in done:
+        partial[i * part_size:(i + 1) * part_size] = \
+            _DATA[i * part_size:(i + 1) * part_size]
+    of.write_bytes(bytes(partial))
+    (tmp_path / 'file.ch10.download').write_text(json.dumps(
+        {'url': url, 'size': len(_DATA), 'etag': '"data-1"',
+         'part_size': part_size, 'done': done}))
+
+    digest = ranged_download(url, of, part_size=part_size, max_workers=2)
+    assert digest == sha256(_DATA).hexdigest()
+    assert of.read_bytes() == _DATA
+    fetched = sorted(int(r[len('bytes='):].split('-')[0]) // part_size
+                     for r in handler.requests)
+    assert fetched == [i for i in range(11) if i not in done]
+
+
+def test_ranged_download_without_ranges(server, tmp_path, monkeypatch):
+    url, handler = server
+    handler.ranges = False
+    calls = list()
+
+    def stream_download(*args):
+        calls.append(args)
+        return _stream_download(*args)
+
+    _stream_download = download._stream_download
+    monkeypatch.setattr(download, '_stream_download', stream_download)
+    of = tmp_path / 'file.ch10'
+    digest = ranged_download(url, of, part_size=10_000)
+    assert len(calls) == 1
+    assert handler.requests == [None]
+    assert digest == sha256(_DATA).hexdigest()
+    assert of.read_bytes() == _DATA
@@ -0,0 +1,87 @@
+import itertools
+import numpy as np
+import pytest
+from firefly.intervals import TimeCoverageIndex
+
+
+def _flights(n=200, seed=42):
+    # Small integer times (ns) so flights often share or touch endpoints...
+    rng = np.random.default_rng(seed)
+    start = rng.integers(0, 1000, n)
+    end = start + rng.integers(0, 100, n)
+    names = [f'/FIREfly/h5/f{i:03d}.h5' for i in range(n)]
+    return names, start, end
+
+
+def _windows(start, end, seed=0):
+    rng = np.random.default_rng(seed)
+    # Random windows, and windows on the flights' own endpoints...
+    windows = [tuple(np.sort(rng.integers(-50, 1150, 2)))
+               for _ in range(100)]
+    windows += [(s, e) for s, e in zip(start[:50], end[:50])]
+    windows += [(e, e) for e in end[50:80]] + [(s, s) for s in start[80:110]]
+    return windows
+
+
+@pytest.fixture(scope='module')
+def flights():
+    names, start, end = _flights()
+    return TimeCoverageIndex(names, start, end), names, start, end
+
+
+def test_queries(flights):
+    index, names, start, end = flights
+    for t0, t1 in _windows(start, end):
+        t0, t1 = int(t0), int(t1)
+        assert index.overlapping(t0, t1) == sorted(
+            n for n, s, e in zip(names, start, end) if s <= t1 and e >= t0)
+        assert index.containing(t0, t1) == sorted(
+            n for n, s, e in zip(names, start, end) if s <= t0 and e >= t1)
+        assert index.within(t0, t1) == sorted(
+            n for n, s, e in zip(names, start, end) if s >= t0 and e <= t1)
+        assert index.airborne(t0) == index.overlapping(t0, t0)
+
+
+def _brute_pairs(names, start, end, t0, t1):
+    found = set()
+    for a, b in itertools.combinations(range(len(names)), 2):
+        lo = max(start[a], start[b], t0)
+        hi = min(end[a], end[b], t1)
+        if lo <= hi:
+            found.add((frozenset((names[a], names[b])), lo, hi))
+    return found
+
+
+@pytest.mark.parametrize('window', [(None, None), (300, 600), (500, 500),
+                                    (-100, 0), (1098, 2000)])
+def test_pairs(flights, window):
+    index, names, start, end = flights
+    t0 = -2 ** 62 if window[0] is None else window[0]
+    t1 = 2 ** 62 if window[1] is None else window[1]
+    pairs = index.pairs(*window)
+    assert len(pairs) == len({frozenset(p[:2]) for p in pairs})
+    assert {(frozenset((a, b)), lo, hi) for a, b, lo, hi in pairs} == \
+        _brute_pairs(names, start, end, t0, t1)
+
+
+def test_touching():
+    index = TimeCoverageIndex(['a', 'b', 'c', 'd'], [0, 10, 10, 30],
+                              [10, 20, 10, 40])
+    assert index.overlapping(20, 30) == ['b', 'd']
+    assert index.airborne(10) == ['a', 'b', 'c']
+    assert index.containing(10, 10) == ['a', 'b', 'c']
+    assert index.within(10, 20) == ['b', 'c']
+    assert sorted(index.pairs()) == [('a', 'b', 10, 10), ('a', 'c', 10, 10),
+                                     ('b', 'c', 10, 10)]
+
+
+def test_times():
+    index = TimeCoverageIndex(
+        ['a', 'b'], ['2014-05-13T16:00:00Z', '2014-05-13T17:00:00'],
+        ['2014-05-13T17:00:00Z', '2014-05-13T18:00:00'])
+    assert index.airborne('2014-05-13T17:00:00') == ['a', 'b']
+    assert index.within('2014-05-13T16:30:00Z', '2014-05-13T19:00:00Z') == [
+        'b']
+    assert TimeCoverageIndex([], [], []).overlapping(0, 1) == list()
+    with pytest.raises(ValueError):
+        TimeCoverageIndex(['a'], [0, 1], [1, 2])
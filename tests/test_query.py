@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pytest
+from firefly.query import DataFilter, Range, plan_query
+from firefly.segment import filter_builder
+
+
+def _frame(n=1000):
+    rng = np.random.default_rng(43)
+    t = pd.date_range('2014-05-13T16:50:00', periods=n, freq='50ms',
+                      name='time', unit='ns')
+    return pd.DataFrame({'altitude': rng.uniform(0., 30000., n),
+                         'latitude': rng.uniform(34., 36., n),
+                         'longitude': rng.uniform(-118., -116., n),
+                         'speed': rng.uniform(0., 500., n)}, index=t)
+
+
+def _attrs(frame):
+    attrs = {'time_coverage_start': frame.index[0].isoformat(),
+             'time_coverage_end': frame.index[-1].isoformat()}
+    for c in frame.columns:
+        attrs[f'min_{c}'] = frame[c].min()
+        attrs[f'max_{c}'] = frame[c].max()
+    return attrs
+
+
+def test_filter_builder():
+    q = dict(aircraft='F-16', altitude=[10000, None],
+             time=['2014-05-13T16:54:00', '2014-05-13T16:56:00Z'])
+    assert filter_builder(q) == (
+        "aircraft_type == 'F-16' AND max_altitude >= 10000.0 AND "
+        "(time_coverage_end >= '2014-05-13T16:54:00' AND "
+        "time_coverage_start <= '2014-05-13T16:56:00Z')",
+        "altitude >= 10000.0 and (time >= '2014-05-13T16:54:00' and "
+        "time <= '2014-05-13T16:56:00Z')")
+    assert q == dict()
+
+    q = dict(aircraft=['F-16', 'T-38'], tail='x', latitude=(35.1, 35.5),
+             speed=[None, 200], longitude=[1, 2])
+    assert filter_builder(q) == (
+        "(aircraft_type == 'F-16' OR aircraft_type == 'T-38') AND "
+        "aircraft_id == 'x' AND (max_latitude > 35.1 AND "
+        "min_latitude < 35.5) AND (max_longitude >= 1.0 AND "
+        "min_longitude <= 2.0) AND min_speed <= 200.0",
+        "(latitude > 35.1 and latitude < 35.5) and (longitude >= 1.0 and "
+        "longitude <= 2.0) and speed <= 200.0")
+
+
+@pytest.mark.parametrize('q', [
+    dict(altitude=[10000, 20000], latitude=(34.5, 35.5),
+         speed=[None, 300]),
+    dict(altitude=[None, 5000]),
+    dict(altitude=(25000, None)),
+    dict(longitude=(None, -117.), speed=[250, None]),
+    dict(time=['2014-05-13T16:50:10', '2014-05-13T16:50:40'],
+         altitude=[100, None]),
+    dict(time=(None, '2014-05-13T16:50:20'))])
+def test_compile_matches_query(q):
+    frame = _frame()
+    # Rows matching the data filter statement, as pushed down to HSDS...
+    _, data_cond = filter_builder(dict(q))
+    expected = frame.eval(data_cond).to_numpy()
+
+    data_filter = plan_query(dict(q)).data_filter
+    np.testing.assert_array_equal(data_filter.compile()(frame), expected)
+    np.testing.assert_array_equal(
+        data_filter.compile(_attrs(frame))(frame), expected)
+
+
+def test_range_bounds():
+    values = np.array([1., 2., 3., 4.])
+    np.testing.assert_array_equal(Range('speed', [None, 2]).test(values),
+                                  [True, True, False, False])
+    np.testing.assert_array_equal(Range('speed', (None, 2)).test(values),
+                                  [True, False, False, False])
+    np.testing.assert_array_equal(Range('speed', [3, None]).test(values),
+                                  [False, False, True, True])
+    np.testing.assert_array_equal(Range('speed', (3, None)).test(values),
+                                  [False, False, False, True])
+    np.testing.assert_array_equal(Range('speed', [2, 3]).test(values),
+                                  [False, True, True, False])
+    with pytest.raises(ValueError):
+        Range('speed', [None, None])
+    assert not plan_query(dict(speed=[None, None])).data_filter
+
+
+def test_selectivity():
+    attrs = {'min_altitude': 0., 'max_altitude': 1000.}
+    assert Range('altitude', [None, 250]).selectivity(attrs) == 0.25
+    assert Range('altitude', [2000, None]).selectivity(attrs) == 0.
+    assert Range('altitude', (None, 1000)).selectivity(attrs) == 1.
+    assert Range('altitude', [None, 1000]).selectivity(attrs) == 1.
+    assert Range('altitude', (None, 0)).selectivity(attrs) == 0.
+    assert Range('speed', [0, 1]).selectivity(attrs) is None
+
+
+class _Logged(Range):
+    """Range predicate recording the order it is tested in."""
+
+    log = list()
+
+    def test(self, values):
+        self.log.append(self.param)
+        return super().test(values)
+
+
+def test_compile_order():
+    frame = _frame()
+    attrs = _attrs(frame)
+    data_filter = DataFilter([
+        _Logged('altitude', [None, 27000.]),     # about 90% of the rows
+        _Logged('latitude', [None, 34.2]),       # about 10%
+        _Logged('speed', [None, 250.]),          # about 50%
+        _Logged('longitude', [-120., -110.])])   # all rows
+    expected = data_filter.compile()(frame)
+
+    _Logged.log.clear()
+    np.testing.assert_array_equal(data_filter.compile(attrs)(frame),
+                                  expected)
+    assert _Logged.log == ['latitude', 'speed', 'altitude']
+
+    # No flight data can match...
+    _Logged.log.clear()
+    data_filter = DataFilter([_Logged('speed', [600., None])])
+    assert not data_filter.compile(attrs)(frame).any()
+    assert _Logged.log == list()
@@ -0,0 +1,123 @@
+import math
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import pytest
+from firefly.spatial import BBoxIndex, point_in_polygon, track_near
+
+
+def _boxes(n=300, seed=41):
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(-70., 70., n)
+    lon = rng.uniform(-170., 170., n)
+    size = rng.uniform(0., 8., (n, 2))
+    boxes = np.column_stack([lat + size[:, 0], lat, lon + size[:, 1], lon])
+    names = [f'/FIREfly/h5/f{i:03d}.h5' for i in range(n)]
+    return names, boxes
+
+
+def _brute_intersecting(names, boxes, north, south, east, west):
+    return sorted(name for name, (n, s, e, w) in zip(names, boxes)
+                  if s <= north and n >= south and w <= east and e >= west)
+
+
+def _km(lat0, lon0, lat1, lon1):
+    """Haversine distance on a 6371 km sphere."""
+    p0, p1 = math.radians(lat0), math.radians(lat1)
+    h = (math.sin((p1 - p0) / 2) ** 2 + math.cos(p0) * math.cos(p1)
+         * math.sin(math.radians(lon1 - lon0) / 2) ** 2)
+    return 2 * 6371. * math.asin(math.sqrt(h))
+
+
+@pytest.mark.parametrize('node_size', [2, 4, 16, 1000])
+def test_intersecting(node_size):
+    names, boxes = _boxes()
+    index = BBoxIndex(names, *boxes.T, node_size=node_size)
+    assert len(index) == len(names)
+    rng = np.random.default_rng(node_size)
+    for _ in range(100):
+        lat = np.sort(rng.uniform(-80., 80., 2))
+        lon = np.sort(rng.uniform(-180., 180., 2))
+        query = (lat[1], lat[0], lon[1], lon[0])
+        assert index.intersecting(*query) == _brute_intersecting(
+            names, boxes, *query)
+
+    # Touching edges intersect...
+    n, s, e, w = boxes[7]
+    assert names[7] in index.intersecting(s, s - 1., w, w - 1.)
+    assert names[7] in index.intersecting(n + 1., n, e + 1., e)
+    np.testing.assert_array_equal(index.bounds([names[7], 'x']),
+                                  [boxes[7], [np.nan] * 4])
+
+
+def test_intersecting_nan():
+    names, boxes = _boxes(50)
+    boxes[[3, 10], 0] = np.nan
+    index = BBoxIndex(names, *boxes.T, node_size=4)
+    assert len(index) == 48
+    found = index.intersecting(90., -90., 180., -180.)
+    assert found == sorted(set(names) - {names[3], names[10]})
+    assert BBoxIndex([], [], [], [], []).intersecting(90, -90, 180, -180) \
+        == list()
+
+
+def test_near():
+    names, boxes = _boxes()
+    index = BBoxIndex(names, *boxes.T, node_size=4)
+    rng = np.random.default_rng(7)
+    for _ in range(50):
+        lat, lon = rng.uniform(-60., 60.), rng.uniform(-160., 160.)
+        km = rng.uniform(10., 1000.)
+        found = set(index.near(lat, lon, km))
+
+        # Flights with a box point (the point clamped into the box) within
+        # the distance are always found...
+        for name, (n, s, e, w) in zip(names, boxes):
+            if _km(lat, lon, min(max(lat, s), n),
+                   min(max(lon, w), e)) <= km:
+                assert name in found
+
+        # ... and none of the found boxes is farther than the distance in
+        # latitude...
+        dlat = km / (6371. * math.pi / 180.)
+        for name in found:
+            n, s, _, _ = boxes[names.index(name)]
+            assert s <= lat + dlat and n >= lat - dlat
+
+
+def test_point_in_polygon():
+    rng = np.random.default_rng(5)
+    lat = rng.uniform(-1., 11., 2000)
+    lon = rng.uniform(-1., 11., 2000)
+
+    # Square...
+    inside = point_in_polygon(lat, lon, [0, 0, 10, 10], [0, 10, 10, 0])
+    np.testing.assert_array_equal(
+        inside, (lat > 0) & (lat < 10) & (lon > 0) & (lon < 10))
+
+    # L shape, concave, vertices in both orientations...
+    poly_lat = [0, 0, 4, 4, 10, 10]
+    poly_lon = [0, 10, 10, 4, 4, 0]
+    expected = (((lat > 0) & (lat < 4) & (lon > 0) & (lon < 10))
+                | ((lat > 0) & (lat < 10) & (lon > 0) & (lon < 4)))
+    np.testing.assert_array_equal(
+        point_in_polygon(lat, lon, poly_lat, poly_lon), expected)
+    np.testing.assert_array_equal(
+        point_in_polygon(lat, lon, poly_lat[::-1], poly_lon[::-1]),
+        expected)
+
+
+def test_track_near():
+    rng = np.random.default_rng(3)
+    t = pd.date_range('2014-05-13', periods=500, freq='s', name='time')
+    flight = pd.DataFrame({'latitude': 35. + np.cumsum(
+                               rng.normal(0., 0.01, 500)),
+                           'longitude': -117. + np.cumsum(
+                               rng.normal(0., 0.01, 500))}, index=t)
+    segment = SimpleNamespace(_flight=flight)
+    for _ in range(50):
+        lat, lon = rng.uniform(34., 36.), rng.uniform(-118., -116.)
+        km = rng.uniform(1., 100.)
+        nearest = min(_km(lat, lon, y, x) for y, x in
+                      zip(flight['latitude'], flight['longitude']))
+        assert track_near(segment, lat, lon, km) == (nearest <= km)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from firefly.segment import _MIL1553_DTYPE
+from firefly.util import track_significance, decode_1553, aircraft_6dof
+
+
+def _track(n=200):
+    lat = 35. + np.sin(np.arange(n) / 20.)
+    lon = -117. + np.arange(n) / 100.
+    return lat, lon
+
+
+def test_track_significance_ends():
+    lat, lon = _track()
+    sig = track_significance(lat, lon)
+    assert sig.shape == lat.shape
+    assert np.isinf(sig[[0, -1]]).all()
+    assert np.isfinite(sig[1:-1]).all()
+
+
+def test_track_significance_nan():
+    lat, lon = _track()
+    lat[50] = np.nan
+    lon[120] = np.inf
+    sig = track_significance(lat, lon)
+    assert np.isinf(sig[[50, 120]]).all()
+
+    # The finite points are ranked as if the others were not there...
+    finite = np.isfinite(lat) & np.isfinite(lon)
+    np.testing.assert_array_equal(
+        sig[finite], track_significance(lat[finite], lon[finite]))
+
+
+def test_aircraft_6dof_empty():
+    data = np.zeros((0,), dtype=_MIL1553_DTYPE)
+    params = aircraft_6dof(data)
+    assert params.shape == (0,)
+    assert {'time', 'latitude', 'longitude', 'altitude'} <= set(
+        params.dtype.names)
+
+
+def test_decode_1553_short_messages():
+    with pytest.raises(ValueError):
+        decode_1553(np.zeros((3, 4), dtype='<u2'), 'ins_6dof')